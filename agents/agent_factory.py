@@ -1,16 +1,31 @@
-from agents.analyzer_agent import AnalyzerAgent
-from agents.documentation_agent import DocumentationAgent
-from agents.transformation_agent import TransformationAgent
+import importlib
 
-def create_agent(agent_type, config):
+# Mode name -> (module, class). Modules are imported only when their agent is
+# created, so a run pays for one agent's dependencies and `--help` for none.
+AGENT_REGISTRY = {
+    "analyze": ("agents.analyzer_agent", "AnalyzerAgent"),
+    "document": ("agents.documentation_agent", "DocumentationAgent"),
+    "transform": ("agents.transformation_agent", "TransformationAgent"),
+    "plan": ("agents.planning_agent", "PlanningAgent"),
+    "dependency": ("agents.dependency_agent", "DependencyAgent"),
+    "pipeline": ("agents.pipeline_agent", "PipelineAgent"),
+    "site": ("agents.site_agent", "SiteAgent"),
+    "convert": ("agents.convert_agent", "ConvertAgent")
+}
+
+def agent_types():
+    """Names accepted by create_agent"""
+    return list(AGENT_REGISTRY)
+
+def create_agent(agent_type, config, **services):
     """
     Factory function to create the appropriate agent based on type
+    
+    services are passed on to BaseAgent (llm, retriever, sources) so several
+    agents can share one LLM client and knowledge base.
     """
-    if agent_type == 'analyze':
-        return AnalyzerAgent(config)
-    elif agent_type == 'document':
-        return DocumentationAgent(config)
-    elif agent_type == 'transform':
-        return TransformationAgent(config)
-    else:
+    if agent_type not in AGENT_REGISTRY:
         raise ValueError(f"Unknown agent type: {agent_type}")
+    module_name, class_name = AGENT_REGISTRY[agent_type]
+    agent_class = getattr(importlib.import_module(module_name), class_name)
+    return agent_class(config, **services)
@@ -1,16 +1,23 @@
 from agents.base_agent import BaseAgent
 import os
 import json
+from utils.jsonl import JsonlIndex, JsonlWriter, compact_jsonl
+from utils.manifest import hash_text
+from utils.metrics import metrics
 
 class AnalyzerAgent(BaseAgent):
     """Agent for analyzing mainframe code and applications"""
     
-    def __init__(self, config):
-        super().__init__(config)
+    def __init__(self, config, **services):
+        super().__init__(config, **services)
         agent_config = config["agents"].get("analyze", {})
         self.prompt_template = self._load_prompt_template(
             agent_config.get("prompt_template", "analyze_template.txt")
         )
+        # "json" writes one document at the end, "jsonl" streams one record
+        # per file; "auto" picks jsonl when the output ends in .jsonl
+        self.output_format = agent_config.get("output_format", "auto")
+        self.flush_every = agent_config.get("flush_every", 10)
     
     def process(self, source, output=None):
         """Analyze mainframe code and produce an analysis report"""
@@ -18,52 +25,137 @@ class AnalyzerAgent(BaseAgent):
             return {"error": f"Source file or directory not found: {source}"}
         
         code_files = self._gather_files(source)
-        analysis_results = []
         
-        for file_path in code_files:
-            with open(file_path, 'r') as f:
-                code = f.read()
-            
-            # Get relevant context from the knowledge base
-            context = self.retriever.get_relevant_context(code)
-            
-            # Prepare prompt with the code and context
-            prompt = self.prompt_template.format(
-                code=code,
-                context=context
-            )
-            
-            # Get analysis from LLM
-            analysis = self.llm.generate(prompt)
-            
-            analysis_results.append({
-                "file": file_path,
-                "analysis": analysis
-            })
+        if output and self._is_streaming(output):
+            return self._process_streaming(code_files, output)
+        
+        # Unchanged files reuse their record from the previous run's output.
+        # The manifest is only saved once the output has been written.
+        manifest = self._open_manifest(os.path.dirname(output), "analyze", autosave=False) if output else None
+        previous = self._load_previous_results(output) if manifest else {}
+        
+        analysis_results = []
+        for record, fingerprint in self._iter_analyses(code_files, output, manifest, previous):
+            analysis_results.append(record)
+            if fingerprint:
+                manifest.record(record["file"], *fingerprint, [output])
         
         # Save results if output is specified
         if output:
-            with open(output, 'w') as f:
-                json.dump(analysis_results, f, indent=2)
+            with metrics.span("write", file=output):
+                # Queue jobs write into directories main.py did not create
+                os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+                with open(output, 'w') as f:
+                    json.dump(analysis_results, f, indent=2)
+        if manifest:
+            manifest.save()
         
         return {
             "status": "success",
             "files_analyzed": len(analysis_results),
+            "files_skipped": manifest.skipped if manifest else 0,
             "output": output if output else "Results not saved to file"
         }
     
-    def _gather_files(self, source):
-        """Gather all relevant files from the source path"""
-        if os.path.isfile(source):
-            return [source]
+    def queue_tasks(self, source, output=None):
+        """
+        One job per file, each writing its own report
+        
+        The reports go under a directory named after output (analysis.json ->
+        analysis/<file>.json) instead of into one shared file.
+        """
+        if not os.path.isdir(source):
+            return [(source, output, 0, {})]
+        directory = os.path.splitext(output)[0] if output else f"{source.rstrip(os.sep)}_analysis"
+        return [(file_path, os.path.join(directory, os.path.relpath(file_path, source) + ".json"), 0, {})
+                for file_path in self._gather_files(source)]
+    
+    def _process_streaming(self, code_files, output):
+        """
+        Append one JSONL record per file as soon as it is analyzed
+        
+        Records already in the output for unchanged files are kept rather than
+        rewritten. Each file is added to the manifest only after its record
+        has been written, so an interrupted run resumes where it stopped.
+        """
+        manifest = self._open_manifest(os.path.dirname(output), "analyze")
+        previous = JsonlIndex(output) if manifest else {}
+        processed = []
+        
+        with JsonlWriter(output, flush_every=self.flush_every, append=bool(manifest)) as writer:
+            for record, fingerprint in self._iter_analyses(code_files, output, manifest, previous):
+                processed.append(record["file"])
+                if fingerprint:
+                    with metrics.span("write", file=output):
+                        writer.write(record)
+                    if manifest:
+                        manifest.record(record["file"], *fingerprint, [output])
+        
+        if manifest:
+            # Drop superseded records and records of files no longer present
+            compact_jsonl(output, processed)
+            manifest.save()
+        
+        return {
+            "status": "success",
+            "files_analyzed": len(processed),
+            "files_skipped": manifest.skipped if manifest else 0,
+            "output": output
+        }
+    
+    def _iter_analyses(self, code_files, output=None, manifest=None, previous=None):
+        """Yield (record, fingerprint) for every file, in order"""
+        for results in self._map_requests(
+            lambda file_paths: self._prepare_analysis(file_paths, output, manifest, previous),
+            self._pack_files(code_files)
+        ):
+            yield from results
+    
+    def _prepare_analysis(self, file_paths, output=None, manifest=None, previous=None):
+        """
+        Read a single file, or a pack of small files, for analysis
         
-        relevant_extensions = ['.cbl', '.cob', '.jcl', '.asm', '.pli', '.cobol']
-        result = []
+        Returns (entries, finish) for _map_requests. finish takes the LLM
+        analyses of entries and returns [(record, fingerprint)] in input
+        order. The fingerprint is the (source hash, inputs) pair to record in
+        the manifest, or None when the previous record was reused.
+        """
+        results = [None] * len(file_paths)
+        pending = []
+        for position, file_path in enumerate(file_paths):
+            code = self._read_source(file_path)
+            
+            fingerprint = None
+            if manifest:
+                fingerprint = (hash_text(code), self._manifest_inputs())
+                if file_path in previous and manifest.is_current(file_path, *fingerprint, [output]):
+                    results[position] = (previous[file_path], None)
+                    continue
+            pending.append((position, file_path, code, fingerprint))
         
-        for root, _, files in os.walk(source):
-            for file in files:
-                ext = os.path.splitext(file)[1].lower()
-                if ext in relevant_extensions:
-                    result.append(os.path.join(root, file))
+        def finish(analyses):
+            for (position, file_path, _, fingerprint), analysis in zip(pending, analyses):
+                record = {
+                    "file": file_path,
+                    "analysis": analysis
+                }
+                results[position] = (record, fingerprint)
+            return results
         
-        return result
+        # Retrieval and prompting happen per chunk for sources too large for
+        # a single request, and per pack for small ones
+        return [(file_path, code) for _, file_path, code, _ in pending], finish
+    
+    def _is_streaming(self, output):
+        """Whether results should be streamed as JSONL"""
+        if self.output_format == "auto":
+            return output.endswith(".jsonl")
+        return self.output_format == "jsonl"
+    
+    def _load_previous_results(self, output):
+        """Index the records of an earlier analysis output by file path"""
+        try:
+            with open(output, 'r') as f:
+                return {record["file"]: record for record in json.load(f)}
+        except (FileNotFoundError, json.JSONDecodeError, KeyError, TypeError):
+            return {}
@@ -1,15 +1,96 @@
+import threading
 from abc import ABC, abstractmethod
 from llm.llm_service import LLMService
 from rag.retriever import Retriever
+from utils.concurrency import map_ordered, map_ordered_async
+from utils.chunker import split_source
+from utils.compaction import compact_lines, join_lines
+from utils.copybooks import shared_library
+from utils.discovery import SourceDiscovery
+from utils.manifest import RunManifest, hash_text
+from utils.metrics import metrics
+from utils.packing import format_pack, pack_files, split_pack
+from utils.source_reader import SourceReader
+from utils.streaming import report_progress
+from utils.tokens import estimate_tokens
 
 class BaseAgent(ABC):
     """Base class for all agents in the system"""
     
-    def __init__(self, config):
+    supports_streaming = False
+    # Agents whose responses repeat the source (rewritten) need chunks that
+    # fit the LLM's output budget as well as its input budget
+    echoes_source = False
+    
+    def __init__(self, config, llm=None, retriever=None, sources=None):
         self.config = config
-        self.llm = LLMService(config["llm"])
-        self.retriever = Retriever(config["vector_db"])
+        # Agents in one pipeline share the LLM client (and its connection
+        # pool), the knowledge base and the sources that were already read.
+        # Agents that never prompt (site, convert) never create the first two.
+        self._llm = llm
+        self._retriever = retriever
+        self._services_lock = threading.Lock()
+        self.sources = sources if sources is not None else {}
+        self.workers = config.get("execution", {}).get("workers", 1)
+        self.incremental = config.get("execution", {}).get("incremental", True)
+        # Drive LLM requests as asyncio tasks instead of one thread per file
+        self.async_enabled = config.get("execution", {}).get("async", False)
+        # Agents that write each response to a file can stream it there
+        self.streaming = self.supports_streaming and config["llm"].get("stream", False)
+        self.discovery = SourceDiscovery.from_config(config.get("discovery", {}))
+        # Sources may be EBCDIC or fixed-length records straight from the mainframe
+        self.reader = SourceReader.from_config(config.get("sources", {}))
+        
+        chunking = config.get("chunking", {})
+        self.chunking_enabled = chunking.get("enabled", True)
+        self.max_chunk_tokens = chunking.get("max_chunk_tokens", 3000)
+        if self.echoes_source:
+            output_budget = int(config["llm"].get("max_tokens", 1000) / chunking.get("output_ratio", 1.5))
+            self.max_chunk_tokens = max(1, min(self.max_chunk_tokens, output_budget))
+        self.chunk_workers = chunking.get("workers", 4)
+        
+        # Sequence areas, comments and padding are stripped before prompting
+        compaction = config.get("compaction", {})
+        self.compaction_enabled = compaction.get("enabled", True)
+        self.abbreviate_repeats = compaction.get("abbreviate_repeats", False)
+        self._compaction_tokens = [0, 0]
+        self._compaction_lock = threading.Lock()
+        
+        # COPY statements are resolved against the copybook libraries and
+        # replaced by the copybook text ("expand") or its layout ("summary")
+        copybooks = config.get("copybooks", {})
+        self.copybook_mode = copybooks.get("mode", "off")
+        self.copybooks = shared_library(copybooks.get("paths", []), copybooks.get("extensions"), self.reader)
         
+        packing = config.get("packing", {})
+        self.packing_enabled = packing.get("enabled", False)
+        self.max_pack_tokens = packing.get("max_pack_tokens", 3000)
+        self.max_packed_file_tokens = packing.get("max_file_tokens", 500)
+        self.max_pack_files = packing.get("max_files", 20)
+        
+    @property
+    def llm(self):
+        """LLM client, created on first use"""
+        if self._llm is None:
+            with self._services_lock:
+                if self._llm is None:
+                    self._llm = LLMService(self.config["llm"])
+        return self._llm
+    
+    @property
+    def retriever(self):
+        """Knowledge base retriever, created (and its index loaded) on first use"""
+        if self._retriever is None:
+            with self._services_lock:
+                if self._retriever is None:
+                    self._retriever = Retriever(self.config["vector_db"])
+        return self._retriever
+    
+    def shared_services(self):
+        """The LLM client and retriever this agent has created, for agents created after it"""
+        services = {"llm": self._llm, "retriever": self._retriever}
+        return {name: service for name, service in services.items() if service is not None}
+    
     @abstractmethod
     def process(self, source, output=None):
         """
@@ -24,6 +105,17 @@ class BaseAgent(ABC):
         """
         pass
     
+    def queue_tasks(self, source, output=None):
+        """
+        (source, output, level, options) jobs for the work queue
+        
+        By default the whole source is one job. Agents that process files
+        independently return one job per file, writing where that file's
+        output goes in a directory run; options are extra process() arguments
+        of that job.
+        """
+        return [(source, output, 0, {})]
+    
     def _load_prompt_template(self, template_name):
         """Load a prompt template from file"""
         template_path = f"prompts/{template_name}"
@@ -33,3 +125,267 @@ class BaseAgent(ABC):
         except FileNotFoundError:
             print(f"Warning: Prompt template {template_path} not found. Using default.")
             return "Analyze the following code: {code}"
+    
+    def _gather_files(self, source, extensions=None):
+        """Lazily yield the relevant source files under source"""
+        return self.discovery.iter_files(source, extensions)
+    
+    def _read_source(self, file_path):
+        """Read a source file, unless another agent in the pipeline already has"""
+        code = self.sources.get(file_path)
+        if code is not None:
+            return code
+        with metrics.span("read", file=file_path):
+            with self.reader.open(file_path) as source:
+                code = source.text()
+                if metrics.enabled:
+                    metrics.count("files_read")
+                    metrics.count("bytes_read", source.size)
+        return code
+    
+    def _map_files(self, func, files):
+        """Run func on every file using the configured worker pool, keeping input order"""
+        return map_ordered(func, files, self.workers)
+    
+    def _map_requests(self, prepare, units):
+        """
+        Do the LLM work for every unit (one file, or a pack of files), in order
+        
+        prepare(unit) does the local work and returns (entries, finish): the
+        [(file_path, code)] sources that still need a response, and a function
+        turning their responses into the unit's result. Responses come from
+        the worker pool, or from asyncio tasks on one event loop when
+        execution.async is on.
+        """
+        if self.async_enabled:
+            return map_ordered_async(
+                lambda unit: self._arun_unit(prepare, unit), units, self.llm.async_max_in_flight * 2
+            )
+        return self._map_files(lambda unit: self._run_unit(prepare, unit), units)
+    
+    def _run_unit(self, prepare, unit):
+        """Prepare a unit, generate its responses and finish it"""
+        with metrics.span("unit"):
+            entries, finish = prepare(unit)
+            if self.streaming and len(entries) == 1:
+                file_path, code = entries[0]
+                return finish([self._stream_for_code(code, file_path)])
+            return finish(self._generate_for_pack(entries) if entries else [])
+    
+    async def _arun_unit(self, prepare, unit):
+        """
+        Async counterpart of _run_unit
+        
+        Reading, compaction, retrieval and writing block, so they run in
+        threads; only the requests are awaited on the event loop.
+        """
+        import asyncio
+        with metrics.span("unit"):
+            entries, finish = await asyncio.to_thread(prepare, unit)
+            responses = await self._agenerate_for_pack(entries) if entries else []
+            return await asyncio.to_thread(finish, responses)
+    
+    def _pack_files(self, files):
+        """Yield lists of files to handle together: packs of small files when packing is on"""
+        if not self.packing_enabled:
+            return ([file_path] for file_path in files)
+        return pack_files(files, self.max_pack_tokens, self.max_packed_file_tokens, self.max_pack_files)
+    
+    def _open_manifest(self, output_dir, mode, autosave=True):
+        """Open the run manifest for an output directory, or None when incremental runs are off"""
+        if not self.incremental:
+            return None
+        return RunManifest(output_dir, mode, autosave_every=50 if autosave else 0)
+    
+    def _manifest_inputs(self):
+        """Inputs besides the source file that determine this agent's output"""
+        inputs = {
+            "template": hash_text(self.prompt_template),
+            "model": self.config["llm"].get("model", "gpt-3.5-turbo")
+        }
+        if self.compaction_enabled:
+            # Compaction changes the prompts, so outputs made without it are redone
+            inputs["compaction"] = {"abbreviate_repeats": self.abbreviate_repeats}
+        if self.copybook_mode != "off":
+            inputs["copybooks"] = {"mode": self.copybook_mode, "paths": self.copybooks.paths}
+        return inputs
+    
+    def _build_prompt(self, code):
+        """Retrieve context for code and fill in the prompt template"""
+        context = self.retriever.get_relevant_context(code)
+        with metrics.span("prompt"):
+            return self.prompt_template.format(
+                code=code,
+                context=context
+            )
+    
+    def _generate_for_code(self, code, file_path=None):
+        """
+        Get the LLM response for a source file
+        
+        Sources over the chunk token budget are split along DIVISION, SECTION
+        and paragraph (or JCL step) boundaries. The chunks are sent
+        concurrently and their responses merged back in source order.
+        """
+        text, chunks = self._split_code(code, file_path)
+        if chunks is None:
+            return self.llm.generate(self._build_prompt(text))
+        return self._generate_chunks(chunks, file_path)
+    
+    def _generate_chunks(self, chunks, file_path=None):
+        """Send the chunks of one source concurrently and merge their responses"""
+        def generate_chunk(indexed_chunk):
+            index, chunk = indexed_chunk
+            header = chunk.header(index, len(chunks), file_path)
+            return self.llm.generate(self._build_prompt(f"[{header}]\n{chunk.text}"))
+        
+        responses = list(map_ordered(generate_chunk, enumerate(chunks, 1), self.chunk_workers))
+        return self._merge_chunk_responses(chunks, responses, file_path)
+    
+    def _stream_for_code(self, code, file_path=None):
+        """
+        Like _generate_for_code, but return the response as an iterable of
+        text pieces that arrive while it is generated
+        
+        Sources split into chunks are generated concurrently and merged, so
+        they are returned in one piece.
+        """
+        text, chunks = self._split_code(code, file_path)
+        if chunks is not None:
+            return [self._generate_chunks(chunks, file_path)]
+        return report_progress(self.llm.generate_stream(self._build_prompt(text)), file_path or "source")
+    
+    async def _agenerate_for_code(self, code, file_path=None):
+        """Async counterpart of _generate_for_code; chunks are awaited together"""
+        import asyncio
+        text, chunks = await asyncio.to_thread(self._split_code, code, file_path)
+        if chunks is None:
+            return await self.llm.agenerate(await asyncio.to_thread(self._build_prompt, text))
+        
+        prompts = await asyncio.gather(*[
+            asyncio.to_thread(self._build_prompt, f"[{chunk.header(index, len(chunks), file_path)}]\n{chunk.text}")
+            for index, chunk in enumerate(chunks, 1)
+        ])
+        responses = await asyncio.gather(*[self.llm.agenerate(prompt) for prompt in prompts])
+        return self._merge_chunk_responses(chunks, responses, file_path)
+    
+    def _split_code(self, code, file_path=None):
+        """
+        Prepare a source for prompting: (text, None) when it fits in one
+        request, or (None, chunks) when it has to be split
+        
+        The source is compacted and its copybooks resolved first (see
+        _prompt_lines). Oversized sources are split on the original text, so
+        chunk headers keep the file's line numbers, with the budget scaled by
+        how much the prompt text differs in size from the file; each chunk
+        then carries its prompt lines.
+        """
+        text = code
+        lines = None
+        if self.compaction_enabled or self.copybook_mode != "off":
+            text, lines = self._prompt_lines(code, file_path)
+        tokens = estimate_tokens(text)
+        if not self.chunking_enabled or tokens <= self.max_chunk_tokens:
+            return text, None
+        
+        chunks = split_source(code, self.max_chunk_tokens * estimate_tokens(code) // max(tokens, 1), file_path)
+        if len(chunks) <= 1:
+            return text, None
+        if lines is not None:
+            for chunk in chunks:
+                chunk.text = join_lines(lines[chunk.start_line - 1:chunk.end_line])
+        return None, chunks
+    
+    def _prepare_source(self, code, file_path=None):
+        """Source as it goes into prompts: compacted and with copybooks resolved, when enabled"""
+        if not self.compaction_enabled and self.copybook_mode == "off":
+            return code
+        return self._prompt_lines(code, file_path)[0]
+    
+    def _prompt_lines(self, code, file_path=None):
+        """
+        Prompt text of a source and its per-line entries, (text, lines)
+        
+        Compaction (when on) comes first and its token savings are recorded
+        before copybooks are resolved. With copybooks in "expand" or
+        "summary" mode, the first line of each COPY statement then holds the
+        copybook text or layout.
+        """
+        if self.compaction_enabled:
+            with metrics.span("compact", file=file_path):
+                lines = compact_lines(code, file_path, self.abbreviate_repeats)
+                text = join_lines(lines)
+            before = estimate_tokens(code)
+            after = estimate_tokens(text)
+            with self._compaction_lock:
+                self._compaction_tokens[0] += before
+                self._compaction_tokens[1] += after
+            if metrics.enabled:
+                metrics.count("source_tokens", before, form="original")
+                metrics.count("source_tokens", after, form="compacted")
+        else:
+            lines = code.splitlines()
+        
+        if self.copybook_mode != "off":
+            with metrics.span("copybooks", file=file_path):
+                lines = self.copybooks.expand_lines(lines, self.copybook_mode, self.compaction_enabled, file_path)
+        return join_lines(lines), lines
+    
+    def cache_stats(self):
+        """LLM response cache counters of this run, or None without a cache or an LLM client"""
+        return self._llm.cache_stats() if self._llm else None
+    
+    def compaction_stats(self):
+        """Estimated source tokens before and after compaction in this run, or None"""
+        before, after = self._compaction_tokens
+        if not before:
+            return None
+        return {"tokens_before": before, "tokens_after": after, "saved": 1 - after / before}
+    
+    def _merge_chunk_responses(self, chunks, responses, file_path=None):
+        """Combine per-chunk responses into one markdown document"""
+        parts = []
+        for index, (chunk, response) in enumerate(zip(chunks, responses), 1):
+            parts.append(f"## {chunk.header(index, len(chunks), file_path)}\n\n{response.strip()}")
+        return "\n\n".join(parts) + "\n"
+    
+    def _generate_for_pack(self, entries):
+        """
+        Get LLM responses for several sources, [(file_path, code)], in order
+        
+        Several small sources are sent as one request with delimited sections
+        so the template and retrieved context are paid for once. If the
+        response cannot be split back into one section per source, each
+        source is sent on its own instead.
+        """
+        if len(entries) == 1:
+            return [self._generate_for_code(entries[0][1], entries[0][0])]
+        
+        response = self.llm.generate(self._build_prompt(self._format_pack(entries)))
+        with metrics.span("parse", files=len(entries)):
+            sections = split_pack(response, len(entries))
+        if sections is not None:
+            return sections
+        
+        print(f"Warning: Could not split packed response for {len(entries)} files; processing them individually")
+        return [self._generate_for_code(code, file_path) for file_path, code in entries]
+    
+    def _format_pack(self, entries):
+        """Packed request text for [(file_path, code)], each source prepared for prompting"""
+        return format_pack([(file_path, self._prepare_source(code, file_path)) for file_path, code in entries])
+    
+    async def _agenerate_for_pack(self, entries):
+        """Async counterpart of _generate_for_pack"""
+        import asyncio
+        if len(entries) == 1:
+            return [await self._agenerate_for_code(entries[0][1], entries[0][0])]
+        
+        prompt = await asyncio.to_thread(lambda: self._build_prompt(self._format_pack(entries)))
+        response = await self.llm.agenerate(prompt)
+        with metrics.span("parse", files=len(entries)):
+            sections = split_pack(response, len(entries))
+        if sections is not None:
+            return sections
+        
+        print(f"Warning: Could not split packed response for {len(entries)} files; processing them individually")
+        return list(await asyncio.gather(*[self._agenerate_for_code(code, file_path) for file_path, code in entries]))
@@ -0,0 +1,78 @@
+from agents.base_agent import BaseAgent
+import os
+from utils.copybooks import record_roots, source_layout
+from utils.data_converter import DataConverter, layout_columns
+
+class ConvertAgent(BaseAgent):
+    """Agent that converts mainframe data files to CSV or columnar files using their record layout"""
+
+    def __init__(self, config, **services):
+        super().__init__(config, **services)
+        convert_config = config.get("convert", {})
+        self.layout = convert_config.get("layout", "")
+        self.record = convert_config.get("record", "")
+        self.output_format = convert_config.get("format", "csv")
+        self.codepage = convert_config.get("codepage", "cp037")
+        self.lrecl = convert_config.get("lrecl", 0)
+        self.batch_bytes = convert_config.get("batch_mb", 64) * 1024 * 1024
+        self.convert_workers = convert_config.get("workers", 0)
+        self.skip_redefines = convert_config.get("skip_redefines", True)
+
+    def process(self, source, output=None, layout=None, record=None):
+        """
+        Convert a data file, or every file in a directory
+
+        layout is the program or copybook describing the records and record
+        the 01 level (or group) to use; both default to the convert config.
+        """
+        layout = layout or self.layout
+        record = record or self.record
+        if not layout or not os.path.isfile(layout):
+            return {"error": f"Record layout not found: {layout or '(none given)'}"}
+        if not os.path.exists(source):
+            return {"error": f"Source not found: {source}"}
+
+        with self.reader.open(layout) as layout_file:
+            code = layout_file.text()
+        roots = record_roots(source_layout(code, layout, self.copybooks), record)
+        if not roots:
+            return {"error": f"Record {record or '(first)'} not found in {layout}"}
+        columns = layout_columns(roots, self.skip_redefines)
+        if not columns:
+            return {"error": f"No convertible fields in {roots[0].name}"}
+
+        lrecl = self.lrecl or max(root.offset + root.length * root.occurs for root in roots) \
+            - min(root.offset for root in roots)
+        converter = DataConverter(columns, lrecl, self.codepage, self.batch_bytes)
+
+        files = {}
+        for dataset, target in self._datasets(source, output):
+            print(f"Converting {dataset} -> {target}")
+            files[dataset] = converter.convert(dataset, target, self.output_format, self.convert_workers)
+
+        return {
+            "status": "success",
+            "record": roots[0].name,
+            "lrecl": lrecl,
+            "columns": len(columns),
+            "records": sum(result["records"] for result in files.values()),
+            "files": files
+        }
+
+    def queue_tasks(self, source, output=None):
+        """One job per data file"""
+        return [(dataset, target, 0, {}) for dataset, target in self._datasets(source, output)]
+
+    def _datasets(self, source, output=None):
+        """
+        (data file, output) pairs: the source file, or every file in the source directory
+        
+        In a directory, each output keeps the file's whole name (CUST.dat ->
+        CUST.dat.csv), so CUST.dat and CUST.bak do not write to one target.
+        """
+        extension = ".csv" if self.output_format == "csv" else ""
+        if not os.path.isdir(source):
+            return [(source, output or os.path.splitext(source)[0] + (extension or "_columns"))]
+        output = output or f"{source.rstrip(os.sep)}_converted"
+        return [(entry.path, os.path.join(output, entry.name + (extension or "_columns")))
+                for entry in sorted(os.scandir(source), key=lambda entry: entry.name) if entry.is_file()]
@@ -2,18 +2,23 @@ from agents.base_agent import BaseAgent
 import os
 import json
 import re
-import networkx as nx
-import matplotlib.pyplot as plt
+from utils.dependency_extractor import extract_all
+from utils.dependency_graph import DependencyGraph
+from utils.metrics import metrics
 
 class DependencyAgent(BaseAgent):
     """Agent for identifying technical and resource dependencies"""
     
-    def __init__(self, config):
-        super().__init__(config)
+    def __init__(self, config, **services):
+        super().__init__(config, **services)
         agent_config = config["agents"].get("dependency", {})
         self.prompt_template = self._load_prompt_template(
             agent_config.get("prompt_template", "dependency_template.txt")
         )
+        # Static extraction always runs; the LLM only enriches it
+        self.use_llm = agent_config.get("use_llm", True)
+        self.extract_workers = agent_config.get("extract_workers", 0) or None
+        self.graph_file = agent_config.get("graph_file", "")
     
     def process(self, source, output=None, **kwargs):
         """Analyze dependencies in mainframe code"""
@@ -23,58 +28,128 @@ class DependencyAgent(BaseAgent):
         project = kwargs.get('project', 'main')
         
         # Gather all relevant files
-        code_files = self._gather_files(source)
+        code_files = list(self._gather_files(source))
         
         # Extract initial dependencies through static analysis
-        static_dependencies = self._extract_static_dependencies(code_files)
+        with metrics.span("extract", files=len(code_files)):
+            static_dependencies = self._extract_static_dependencies(code_files)
         
         # Process each file to find dependencies
-        all_dependencies = []
-        processed_files = 0
+        all_dependencies = list(self._map_files(
+            lambda file_path: self._analyze_file_dependencies(
+                file_path, static_dependencies.get(file_path, [])
+            ),
+            code_files
+        ))
         
-        for file_path in code_files:
-            with open(file_path, 'r') as f:
-                code = f.read()
-            
-            # Get relevant context from the knowledge base
-            context = self.retriever.get_relevant_context(code)
-            
-            # Add static analysis insights
-            file_deps = static_dependencies.get(file_path, [])
-            static_deps_str = "\n".join([f"- {d['type']}: {d['name']}" for d in file_deps])
-            
-            # Prepare prompt with the code and context
+        return self._build_result(project, static_dependencies, all_dependencies, output)
+    
+    def _build_result(self, project, static_dependencies, all_dependencies, output=None):
+        """Index the dependencies as a graph, save the graph and the report, and return the report"""
+        result = {
+            "project": project,
+            "processed_files": len(all_dependencies),
+            "dependencies": all_dependencies
+        }
+        
+        # Index the static dependencies as a graph for later queries and for
+        # dependency-ordered transformation
+        graph = DependencyGraph.from_static_dependencies(static_dependencies)
+        cycles = [sorted(graph.names[node] for node in component)
+                  for component in graph.strongly_connected_components() if len(component) > 1]
+        result["graph"] = {
+            "nodes": len(graph),
+            "edges": len(graph.out_targets),
+            "levels": len(graph.topological_levels()),
+            "cycles": cycles
+        }
+        
+        graph_file = self.graph_file or (f"{os.path.splitext(output)[0]}.graph.json" if output else "")
+        if graph_file:
+            graph.save(graph_file)
+            result["graph"]["file"] = graph_file
+        
+        if output:
+            with metrics.span("write", file=output):
+                with open(output, 'w') as f:
+                    json.dump(result, f, indent=2)
+        
+        return result
+    
+    def _extract_static_dependencies(self, code_files):
+        """Extract COPY/CALL/EXEC SQL/EXEC CICS/SELECT ASSIGN/JCL DD dependencies without the LLM"""
+        return extract_all(code_files, self.extract_workers, self.reader)
+    
+    def _analyze_file_dependencies(self, file_path, file_deps):
+        """Combine static dependencies for a file with the LLM's enrichment"""
+        with metrics.span("unit"):
+            return self._enrich_dependencies(file_path, file_deps)
+    
+    def _enrich_dependencies(self, file_path, file_deps):
+        """Build the output record for one file, asking the LLM when enabled"""
+        record = {
+            "file": file_path,
+            "static_dependencies": file_deps
+        }
+        if self.copybook_mode != "off":
+            record["copybook_layouts"] = self._copybook_layouts(file_path, file_deps)
+        if not self.use_llm:
+            record["dependencies"] = file_deps
+            return record
+        
+        code = self._prepare_source(self._read_source(file_path), file_path)
+        
+        # Get relevant context from the knowledge base
+        context = self.retriever.get_relevant_context(code)
+        
+        # Add static analysis insights
+        static_deps_str = "\n".join([f"- {d['type']}: {d['name']}" for d in file_deps])
+        
+        # Prepare prompt with the code and context
+        with metrics.span("prompt"):
             prompt = self.prompt_template.format(
                 code=code,
                 context=context,
                 static_dependencies=static_deps_str,
                 file_path=file_path
             )
-            
-            # Get dependency analysis from LLM
-            dependency_analysis = self.llm.generate(prompt)
-            
-            # Parse the dependency analysis
-            try:
-                # The LLM should return JSON, but sometimes it might include markdown
-                # Try to extract JSON from the response
-                json_match = re.search(r'```json\n(.*?)\n```', dependency_analysis, re.DOTALL)
-                if json_match:
-                    dependency_data = json.loads(json_match.group(1))
-                else:
-                    dependency_data = json.loads(dependency_analysis)
-                
-                all_dependencies.append({
-                    "file": file_path,
-                    "dependencies": dependency_data
-                })
-            except json.JSONDecodeError as e:
-                return {"error": f"Failed to parse JSON: {str(e)}"}
-            
-            processed_files += 1
         
-        return {
-            "project": project,
-            "processed_files": processed_files,
-            "dependencies": all_dependencies
-        }
\ No newline at end of file
+        # Get dependency analysis from LLM
+        dependency_analysis = self.llm.generate(prompt)
+        
+        # Parse the dependency analysis
+        with metrics.span("parse", file=file_path):
+            self._parse_dependencies(record, dependency_analysis, file_deps)
+        return record
+    
+    def _copybook_layouts(self, file_path, file_deps):
+        """Record layouts of the copybooks a file copies, by copybook name"""
+        layouts = {}
+        for dependency in file_deps:
+            if dependency["type"] != "copybook" or dependency["name"] in layouts:
+                continue
+            copybook = self.copybooks.get(dependency["name"], file_path)
+            if copybook:
+                layouts[dependency["name"]] = {
+                    "path": copybook.path,
+                    "length": copybook.length,
+                    "fields": copybook.layout()
+                }
+        return layouts
+    
+    def _parse_dependencies(self, record, dependency_analysis, file_deps):
+        """Store the LLM's JSON dependencies in record, or the static ones if it cannot be parsed"""
+        file_path = record["file"]
+        try:
+            # The LLM should return JSON, but sometimes it might include markdown
+            # Try to extract JSON from the response
+            json_match = re.search(r'```json\n(.*?)\n```', dependency_analysis, re.DOTALL)
+            if json_match:
+                record["dependencies"] = json.loads(json_match.group(1))
+            else:
+                record["dependencies"] = json.loads(dependency_analysis)
+        except json.JSONDecodeError as e:
+            # Keep the static results rather than failing the whole run
+            print(f"Warning: Could not parse LLM dependencies for {file_path}: {e}")
+            record["dependencies"] = file_deps
+            record["llm_error"] = f"Failed to parse JSON: {str(e)}"
@@ -1,19 +1,34 @@
 from agents.base_agent import BaseAgent
 import os
-import markdown
+from utils.manifest import hash_text
+from utils.site_builder import build_site
+from utils.streaming import write_stream
 
 class DocumentationAgent(BaseAgent):
     """Agent for generating documentation from mainframe code"""
     
-    def __init__(self, config):
-        super().__init__(config)
+    supports_streaming = True
+    
+    def __init__(self, config, **services):
+        super().__init__(config, **services)
         agent_config = config["agents"].get("document", {})
         self.prompt_template = self._load_prompt_template(
             agent_config.get("prompt_template", "document_template.txt")
         )
+        # HTML pages, index and search manifest are built from the markdown after each run
+        site_config = config.get("site", {})
+        self.site_enabled = site_config.get("enabled", True)
+        self.site_workers = site_config.get("workers", 0)
+        self.site_title = site_config.get("title", "Mainframe documentation")
     
-    def process(self, source, output=None):
-        """Generate documentation from mainframe code"""
+    def process(self, source, output=None, root=None):
+        """
+        Generate documentation from mainframe code
+        
+        Pages are named by their path relative to root (the source's parent
+        by default). Queued jobs pass the directory run's root and output, so
+        each page and its manifest entry land where a directory run puts them.
+        """
         if not os.path.exists(source):
             return {"error": f"Source file or directory not found: {source}"}
         
@@ -23,72 +38,80 @@ class DocumentationAgent(BaseAgent):
             output = os.path.join(os.path.dirname(source), "documentation")
         
         os.makedirs(output, exist_ok=True)
+        manifest = self._open_manifest(output, "document")
         
-        for file_path in code_files:
-            with open(file_path, 'r') as f:
-                code = f.read()
-            
-            # Get relevant context from the knowledge base
-            context = self.retriever.get_relevant_context(code)
-            
-            # Prepare prompt with the code and context
-            prompt = self.prompt_template.format(
-                code=code,
-                context=context
-            )
-            
-            # Get documentation from LLM
-            documentation_md = self.llm.generate(prompt)
-            
-            # Save documentation as markdown
-            rel_path = os.path.relpath(file_path, start=os.path.dirname(source))
-            doc_filename = os.path.join(output, f"{rel_path}.md")
-            
-            # Create directory if it doesn't exist
-            os.makedirs(os.path.dirname(doc_filename), exist_ok=True)
-            
-            with open(doc_filename, 'w') as f:
-                f.write(documentation_md)
-            
-            # Also generate HTML for easier viewing
-            html_filename = os.path.join(output, f"{rel_path}.html")
-            html_content = markdown.markdown(documentation_md)
-            with open(html_filename, 'w') as f:
-                f.write(f"""
-                <!DOCTYPE html>
-                <html>
-                <head>
-                    <title>Documentation for {os.path.basename(file_path)}</title>
-                    <style>
-                        body {{ font-family: Arial, sans-serif; margin: 40px; line-height: 1.6; }}
-                        pre {{ background-color: #f4f4f4; padding: 10px; border-radius: 5px; }}
-                        h1 {{ color: #333; }}
-                    </style>
-                </head>
-                <body>
-                    {html_content}
-                </body>
-                </html>
-                """)
+        documented = []
+        for doc_filenames in self._map_requests(
+            lambda file_paths: self._prepare_documentation(file_paths, root or os.path.dirname(source), output,
+                                                           manifest),
+            self._pack_files(code_files)
+        ):
+            documented.extend(doc_filenames)
+        if manifest:
+            manifest.save()
         
-        return {
+        result = {
             "status": "success",
-            "files_documented": len(code_files),
+            "files_documented": len(documented),
+            "files_skipped": manifest.skipped if manifest else 0,
             "output_directory": output
         }
+        site = self.build_site(output, pages=documented)
+        if site:
+            result["site"] = site
+        return result
+    
+    def queue_tasks(self, source, output=None):
+        """One job per file, documented into the output and manifest of a directory run"""
+        output = output or os.path.join(os.path.dirname(source), "documentation")
+        root = os.path.abspath(os.path.dirname(source))
+        return [(file_path, output, 0, {"root": root}) for file_path in self._gather_files(source)]
     
-    def _gather_files(self, source):
-        """Gather all relevant files from the source path"""
-        if os.path.isfile(source):
-            return [source]
+    def build_site(self, output, site_dir=None, pages=None):
+        """
+        Render the documentation pages under output into the HTML site, when
+        enabled; returns the build summary
         
-        relevant_extensions = ['.cbl', '.cob', '.jcl', '.asm', '.pli', '.cobol']
-        result = []
+        pages are the markdown files of this run; pages of earlier runs stay
+        published, and other markdown under output is not part of the site.
+        """
+        if not self.site_enabled:
+            return None
+        return build_site(output, site_dir, self.site_workers, self.site_title, pages)
+    
+    def _prepare_documentation(self, file_paths, root, output, manifest=None):
+        """
+        Read a single file, or a pack of small files, for documentation
         
-        for root, _, files in os.walk(source):
-            for file in files:
-                ext = os.path.splitext(file)[1].lower()
-                if ext in relevant_extensions:
-                    result.append(os.path.join(root, file))
+        Returns (entries, finish) for _map_requests. finish takes the LLM
+        documentation for entries, writes it and returns the markdown paths.
+        """
+        doc_filenames = []
+        pending = []
+        for file_path in file_paths:
+            code = self._read_source(file_path)
+            
+            rel_path = os.path.relpath(file_path, start=root)
+            doc_filename = os.path.join(output, f"{rel_path}.md")
+            doc_filenames.append(doc_filename)
+            
+            # Skip files whose documentation is already up to date
+            fingerprint = None
+            if manifest:
+                fingerprint = (hash_text(code), self._manifest_inputs())
+                if manifest.is_current(file_path, *fingerprint, [doc_filename]):
+                    continue
+            pending.append((file_path, code, doc_filename, fingerprint))
         
-        return result
+        def finish(documents):
+            for (file_path, _, doc_filename, fingerprint), documentation in zip(pending, documents):
+                # Saved as markdown (the file only appears once complete);
+                # HTML is rendered for the whole site at the end of the run
+                write_stream(doc_filename, documentation)
+                if manifest:
+                    manifest.record(file_path, *fingerprint, [doc_filename])
+            return doc_filenames
+        
+        # Retrieval and prompting happen per chunk for sources too large for
+        # a single request, and per pack for small ones
+        return [(file_path, code) for file_path, code, _, _ in pending], finish
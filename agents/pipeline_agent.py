@@ -0,0 +1,239 @@
+from agents.agent_factory import create_agent
+from agents.base_agent import BaseAgent
+import os
+from utils.dependency_extractor import extract_dependencies
+from utils.concurrency import map_ordered_async
+from utils.jsonl import JsonlIndex, JsonlWriter, compact_jsonl
+from utils.metrics import metrics
+
+STAGES = ["analyze", "dependency", "document", "transform"]
+
+class PipelineAgent(BaseAgent):
+    """
+    Runs analyze, dependency, document and transform in one process
+    
+    The stage agents share this agent's LLM client (and its connection pool)
+    and retriever. Each file (or pack of small files) is read once and
+    passed through every stage before the next file's result is needed, so
+    documentation for one file is written while other files are still being
+    analyzed. The modernization plan runs at the end when a phase is given.
+    """
+    
+    def __init__(self, config, **services):
+        super().__init__(config, **services)
+        pipeline_config = config.get("pipeline", {})
+        self.stages = [stage for stage in STAGES if stage in pipeline_config.get("stages", STAGES)]
+        self.plan_phase = pipeline_config.get("plan_phase", "")
+        
+        # Stage agents are only imported and built when their stage is enabled
+        self.agents = {
+            stage: create_agent(stage, config, llm=self.llm, retriever=self.retriever, sources=self.sources)
+            for stage in self.stages
+        }
+    
+    def process(self, source, output=None, **kwargs):
+        """Run every enabled stage on the source, writing each stage's output under output"""
+        if not os.path.exists(source):
+            return {"error": f"Source file or directory not found: {source}"}
+        
+        if not output:
+            output = os.path.join(os.path.dirname(source), "pipeline_output")
+        os.makedirs(output, exist_ok=True)
+        source_root = source if os.path.isdir(source) else os.path.dirname(source)
+        
+        outputs = {
+            "analyze": os.path.join(output, "analysis.jsonl"),
+            "dependency": os.path.join(output, "dependencies.json"),
+            "document": os.path.join(output, "docs"),
+            "transform": os.path.join(output, "transformed")
+        }
+        # Each stage keeps its own manifest, so they live in separate directories
+        manifest_dirs = {"analyze": output, "document": outputs["document"], "transform": outputs["transform"]}
+        manifests = {stage: self._open_manifest(directory, stage) if stage in self.stages else None
+                     for stage, directory in manifest_dirs.items()}
+        previous = JsonlIndex(outputs["analyze"]) if manifests["analyze"] else {}
+        
+        processed = []
+        static_dependencies = {}
+        dependencies = []
+        documented = []
+        transformed = []
+        writer = None
+        if "analyze" in self.stages:
+            writer = JsonlWriter(outputs["analyze"], flush_every=self.agents["analyze"].flush_every,
+                                 append=bool(manifests["analyze"]))
+        try:
+            for result in self._map_units(
+                self._units(source), (source, source_root, outputs, manifests, previous)
+            ):
+                processed.extend(result["files"])
+                for record, fingerprint in result.get("analysis", []):
+                    if fingerprint:
+                        with metrics.span("write", file=outputs["analyze"]):
+                            writer.write(record)
+                        if manifests["analyze"]:
+                            manifests["analyze"].record(record["file"], *fingerprint, [outputs["analyze"]])
+                for record in result.get("dependencies", []):
+                    static_dependencies[record["file"]] = record["static_dependencies"]
+                    dependencies.append(record)
+                documented.extend(result.get("documentation", []))
+                transformed.extend(result.get("transformed", []))
+        finally:
+            if writer:
+                writer.close()
+        
+        if manifests["analyze"]:
+            # Drop superseded records and records of files no longer present
+            compact_jsonl(outputs["analyze"], processed)
+        for manifest in manifests.values():
+            if manifest:
+                manifest.save()
+        
+        result = {
+            "status": "success",
+            "files_processed": len(processed),
+            "stages": list(self.stages)
+        }
+        if "analyze" in self.stages:
+            result["analysis"] = outputs["analyze"]
+        if "dependency" in self.stages:
+            report = self.agents["dependency"]._build_result(
+                kwargs.get("project", "main"), static_dependencies, dependencies, outputs["dependency"]
+            )
+            result["dependencies"] = outputs["dependency"]
+            result["graph"] = report["graph"]
+        if "document" in self.stages:
+            result["files_documented"] = len(documented)
+            result["output_directory"] = outputs["document"]
+            site = self.agents["document"].build_site(outputs["document"], pages=documented)
+            if site:
+                result["site"] = site
+        if "transform" in self.stages:
+            result["files_transformed"] = len(transformed)
+            result["transformed_directory"] = outputs["transform"]
+        result["files_skipped"] = {stage: manifest.skipped for stage, manifest in manifests.items() if manifest}
+        
+        phase = kwargs.get("phase") or self.plan_phase
+        if phase:
+            planner = create_agent("plan", self.config, llm=self.llm, retriever=self.retriever)
+            plan = planner.process(source, os.path.join(output, "plan.md"), phase=phase,
+                                   analysis_file=outputs["analyze"] if "analyze" in self.stages else None)
+            result["plan"] = plan.get("plan_output", plan.get("error"))
+        
+        return result
+    
+    def compaction_stats(self):
+        """Compaction savings summed over the stage agents"""
+        stats = [agent.compaction_stats() for agent in self.agents.values()]
+        before = sum(stat["tokens_before"] for stat in stats if stat)
+        after = sum(stat["tokens_after"] for stat in stats if stat)
+        if not before:
+            return None
+        return {"tokens_before": before, "tokens_after": after, "saved": 1 - after / before}
+    
+    def _units(self, source):
+        """
+        Lists of files to take through the stages together, in running order
+        
+        With packing on, small files share a pack (analyze and document then
+        send one request per pack). With a dependency graph for the transform
+        stage, files come one dependency level at a time, leaves first.
+        """
+        files = self._gather_files(source)
+        levels = self.agents["transform"]._load_file_levels() if "transform" in self.stages else None
+        if levels is None:
+            return [list(self._pack_files(files))]
+        waves = {}
+        for file_path in files:
+            waves.setdefault(levels.get(os.path.abspath(file_path), 0), []).append(file_path)
+        return [list(self._pack_files(waves[level])) for level in sorted(waves)]
+    
+    def _map_units(self, waves, context):
+        """Yield the result of every unit; each wave finishes before the next starts"""
+        for units in waves:
+            if self.async_enabled:
+                yield from map_ordered_async(
+                    lambda file_paths: self._arun_files(file_paths, *context), units, self.llm.async_max_in_flight * 2
+                )
+            else:
+                yield from self._map_files(lambda file_paths: self._run_files(file_paths, *context), units)
+    
+    def _run_files(self, file_paths, source, source_root, outputs, manifests, previous):
+        """Take one file (or pack) through every enabled stage; returns what each stage produced"""
+        with metrics.span("file", file=file_paths[0], files=len(file_paths)):
+            # Read once; the stage agents find the sources in the shared cache
+            for file_path in file_paths:
+                self.sources[file_path] = self._read_source(file_path)
+            try:
+                result = {"files": file_paths}
+                for key, agent, prepare, unit in self._stage_steps(
+                    file_paths, source, source_root, outputs, manifests, previous
+                ):
+                    output = agent._run_unit(prepare, unit) if agent else [prepare(unit)]
+                    result.setdefault(key, []).extend(output)
+                return result
+            finally:
+                for file_path in file_paths:
+                    self.sources.pop(file_path, None)
+    
+    async def _arun_files(self, file_paths, source, source_root, outputs, manifests, previous):
+        """Async counterpart of _run_files: LLM requests are awaited, the rest runs in threads"""
+        import asyncio
+        with metrics.span("file", file=file_paths[0], files=len(file_paths)):
+            for file_path in file_paths:
+                self.sources[file_path] = await asyncio.to_thread(self._read_source, file_path)
+            try:
+                result = {"files": file_paths}
+                steps = await asyncio.to_thread(
+                    self._stage_steps, file_paths, source, source_root, outputs, manifests, previous
+                )
+                for key, agent, prepare, unit in steps:
+                    if agent:
+                        output = await agent._arun_unit(prepare, unit)
+                    else:
+                        output = [await asyncio.to_thread(prepare, unit)]
+                    result.setdefault(key, []).extend(output)
+                return result
+            finally:
+                for file_path in file_paths:
+                    self.sources.pop(file_path, None)
+    
+    def _stage_steps(self, file_paths, source, source_root, outputs, manifests, previous):
+        """
+        (result key, stage agent, prepare, unit) for every enabled stage, in order
+        
+        Each step's prepare is run through its agent's _run_unit and yields a
+        list of results. The dependency stage has no agent: its prepare takes
+        one file and returns its record.
+        """
+        steps = []
+        if "analyze" in self.stages:
+            analyzer = self.agents["analyze"]
+            steps.append(("analysis", analyzer, lambda unit: analyzer._prepare_analysis(
+                unit, outputs["analyze"], manifests["analyze"], previous
+            ), file_paths))
+        if "dependency" in self.stages:
+            dependency = self.agents["dependency"]
+            for file_path in file_paths:
+                steps.append(("dependencies", None, lambda unit: dependency._analyze_file_dependencies(
+                    unit, extract_dependencies(self.sources[unit], unit)
+                ), file_path))
+        if "document" in self.stages:
+            documenter = self.agents["document"]
+            steps.append(("documentation", documenter, lambda unit: documenter._prepare_documentation(
+                unit, os.path.dirname(source), outputs["document"], manifests["document"]
+            ), file_paths))
+        if "transform" in self.stages:
+            transformer = self.agents["transform"]
+            
+            def prepare_transform(job):
+                entries, finish = transformer._prepare_transform(*job, manifests["transform"])
+                return entries, lambda responses: [finish(responses)]
+            
+            for file_path in file_paths:
+                if not transformer._is_transformed(file_path):
+                    continue
+                output_file = transformer._output_file(os.path.relpath(file_path, source_root), outputs["transform"])
+                os.makedirs(os.path.dirname(output_file), exist_ok=True)
+                steps.append(("transformed", transformer, prepare_transform, (file_path, output_file)))
+        return steps
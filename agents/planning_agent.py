@@ -1,14 +1,14 @@
 from agents.base_agent import BaseAgent
 import os
 import json
-import yaml
-import markdown
+import itertools
+from utils.jsonl import iter_jsonl
 
 class PlanningAgent(BaseAgent):
     """Agent for creating modernization plans for different phases"""
     
-    def __init__(self, config):
-        super().__init__(config)
+    def __init__(self, config, **services):
+        super().__init__(config, **services)
         agent_config = config["agents"].get("plan", {})
         self.prompt_template = self._load_prompt_template(
             agent_config.get("prompt_template", "plan_template.txt")
@@ -22,11 +22,11 @@ class PlanningAgent(BaseAgent):
         phase = kwargs.get('phase', 'discovery')
         
         # Analyze the codebase to understand what we're planning for
-        code_files = self._gather_files(source)
+        code_files = list(self._gather_files(source))
         code_samples = self._extract_code_samples(code_files)
         
         # Get analysis information if available
-        analysis_data = self._get_analysis_data(source)
+        analysis_data = self._get_analysis_data(source, kwargs.get('analysis_file'))
         
         # Get relevant context from the knowledge base
         context_query = f"mainframe modernization {phase} phase planning"
@@ -53,6 +53,7 @@ class PlanningAgent(BaseAgent):
             # If output is .md, also generate HTML version
             if output.endswith('.md'):
                 html_output = output[:-3] + '.html'
+                import markdown
                 html_content = markdown.markdown(plan_markdown)
                 with open(html_output, 'w') as f:
                     f.write(f"""
@@ -84,34 +85,27 @@ class PlanningAgent(BaseAgent):
             "plan_output": output if output else "Plan not saved to file"
         }
     
-    def _gather_files(self, source):
-        """Gather all relevant files from the source path"""
-        if os.path.isfile(source):
-            return [source]
-        
-        relevant_extensions = ['.cbl', '.cob', '.jcl', '.asm', '.pli', '.cobol']
-        result = []
-        
-        for root, _, files in os.walk(source):
-            for file in files:
-                ext = os.path.splitext(file)[1].lower()
-                if ext in relevant_extensions:
-                    result.append(os.path.join(root, file))
-        
-        return result
-    
     def _extract_code_samples(self, files, max_files=3, max_lines=50):
         """Extract representative code samples from the files"""
         samples = []
         
         for file in files[:max_files]:
-            with open(file, 'r') as f:
-                content = f.readlines()
-                
-            # Get a representative sample (beginning of the file)
+            # Get a representative sample (beginning of the file); only the
+            # records it needs are decoded, in batches since compaction drops
+            # comment lines
+            content = []
+            with self.reader.open(file) as source:
+                total = source.record_count
+                consumed = 0
+                while len(content) < max_lines and consumed < total:
+                    batch = source.text(consumed, consumed + max_lines)
+                    consumed = min(consumed + max_lines, total)
+                    content.extend(self._prepare_source(batch, file).splitlines(keepends=True))
+            
             sample = ''.join(content[:max_lines])
-            if len(content) > max_lines:
-                sample += f"\n... (file continues with {len(content) - max_lines} more lines) ..."
+            remaining = total - consumed + max(len(content) - max_lines, 0)
+            if remaining > 0:
+                sample += f"\n... (file continues with {remaining} more lines) ..."
                 
             samples.append({
                 "file": os.path.basename(file),
@@ -126,9 +120,13 @@ class PlanningAgent(BaseAgent):
             
         return samples
     
-    def _get_analysis_data(self, source):
-        """Look for existing analysis data for this source"""
-        potential_paths = [
+    def _get_analysis_data(self, source, analysis_file=None, max_records=20):
+        """Look for existing analysis data for this source (analysis_file first, when given)"""
+        potential_paths = [analysis_file] if analysis_file else []
+        potential_paths += [
+            os.path.join(os.path.dirname(source), "analysis.jsonl"),
+            source + ".analysis.jsonl",
+            "analysis.jsonl",
             os.path.join(os.path.dirname(source), "analysis.json"),
             source + ".analysis.json",
             "analysis.json"
@@ -137,6 +135,9 @@ class PlanningAgent(BaseAgent):
         for path in potential_paths:
             if os.path.exists(path):
                 try:
+                    if path.endswith(".jsonl"):
+                        # Streamed analyses can be huge; only read what the prompt can use
+                        return list(itertools.islice(iter_jsonl(path), max_records))
                     with open(path, 'r') as f:
                         return json.load(f)
                 except:
@@ -0,0 +1,20 @@
+from agents.base_agent import BaseAgent
+import os
+from utils.site_builder import build_site
+
+class SiteAgent(BaseAgent):
+    """Agent that publishes generated markdown documentation as a static HTML site"""
+    
+    def __init__(self, config, **services):
+        super().__init__(config, **services)
+        site_config = config.get("site", {})
+        self.site_workers = site_config.get("workers", 0)
+        self.site_title = site_config.get("title", "Mainframe documentation")
+    
+    def process(self, source, output=None):
+        """Render the markdown under source into output (source itself by default)"""
+        if not os.path.isdir(source):
+            return {"error": f"Documentation directory not found: {source}"}
+        
+        site = build_site(source, output, self.site_workers, self.site_title)
+        return {"status": "success", **site}
@@ -1,22 +1,40 @@
 from agents.base_agent import BaseAgent
 import os
-import yaml
-import re
+import json
+from utils.compaction import join_lines
+from utils.manifest import hash_text
+from utils.metrics import metrics
+from utils.rule_engine import RuleEngine
+from utils.dependency_graph import DependencyGraph
+from utils.streaming import write_stream
 
 class TransformationAgent(BaseAgent):
     """Agent for transforming mainframe code to modern alternatives"""
     
-    def __init__(self, config):
-        super().__init__(config)
+    supports_streaming = True
+    echoes_source = True
+    
+    def __init__(self, config, **services):
+        super().__init__(config, **services)
         agent_config = config["agents"].get("transform", {})
         self.prompt_template = self._load_prompt_template(
             agent_config.get("prompt_template", "transform_template.txt")
         )
         self.rules_file = agent_config.get("rules_file", "transformation_rules.yaml")
         self.transformation_rules = self._load_transformation_rules()
+        # Compile the simple rules once for the lifetime of the agent
+        self.rule_engine = RuleEngine(self.transformation_rules.get("simple_rules", []))
+        # Graph written by the dependency agent; when set, files are
+        # transformed leaf programs first, one dependency level at a time
+        self.dependency_graph = agent_config.get("dependency_graph", "")
     
-    def process(self, source, output=None):
-        """Transform mainframe code to modern alternatives"""
+    def process(self, source, output=None, manifest_dir=None):
+        """
+        Transform mainframe code to modern alternatives
+        
+        A single file's manifest is kept next to its output unless
+        manifest_dir is given; queued jobs pass their directory run's output.
+        """
         if not os.path.exists(source):
             return {"error": f"Source file or directory not found: {source}"}
         
@@ -30,84 +48,175 @@ class TransformationAgent(BaseAgent):
         # If source is a directory, create output directory
         if os.path.isdir(source):
             os.makedirs(output, exist_ok=True)
-            transformed_files = self._transform_directory(source, output)
+            manifest = self._open_manifest(output, "transform")
+            transformed_files = self._transform_directory(source, output, manifest)
         else:
             # Transform a single file
-            transformed_files = [self._transform_file(source, output)]
+            manifest = self._open_manifest(manifest_dir or os.path.dirname(output), "transform")
+            transformed_files = list(self._map_requests(
+                lambda job: self._prepare_transform(*job, manifest), [(source, output)]
+            ))
+        if manifest:
+            manifest.save()
         
         return {
             "status": "success",
             "files_transformed": len(transformed_files),
+            "files_skipped": manifest.skipped if manifest else 0,
             "transformed_files": transformed_files
         }
     
-    def _transform_file(self, source_file, output_file):
-        """Transform a single file"""
+    def queue_tasks(self, source, output=None):
+        """One job per file; with a dependency graph, its level orders the jobs"""
+        if not os.path.isdir(source):
+            return [(source, output, 0, {})]
+        output = output or f"{source}_transformed"
+        options = {"manifest_dir": os.path.abspath(output)}
+        extension_map = self.transformation_rules.get("extension_map", {})
+        levels = self._load_file_levels() or {}
+        return [
+            (source_file, self._output_file(os.path.relpath(source_file, source), output),
+             levels.get(os.path.abspath(source_file), 0), options)
+            for source_file in self._gather_files(source, extensions=extension_map.keys())
+        ]
+    
+    def _prepare_transform(self, source_file, output_file, manifest=None):
+        """
+        Read and rule-transform a single file
+        
+        Returns (entries, finish) for _map_requests. finish takes the LLM
+        transformation, writes the output file and returns its summary.
+        """
         # Read the source file
-        with open(source_file, 'r') as f:
-            code = f.read()
+        code = self._read_source(source_file)
         
-        # Apply simple rule-based transformations first
-        for rule in self.transformation_rules.get("simple_rules", []):
-            pattern = rule["pattern"]
-            replacement = rule["replacement"]
-            code = re.sub(pattern, replacement, code)
+        result = {
+            "source": source_file,
+            "output": output_file
+        }
         
-        # Get relevant context from the knowledge base
-        context = self.retriever.get_relevant_context(code)
+        # Skip files whose transformed output is already up to date
+        if manifest:
+            source_hash = hash_text(code)
+            inputs = self._manifest_inputs()
+            if manifest.is_current(source_file, source_hash, inputs, [output_file]):
+                return [], lambda responses: result
         
-        # Prepare prompt with the code and context
-        prompt = self.prompt_template.format(
-            code=code,
-            context=context,
-            target_language=self.transformation_rules.get("target_language", "Java")
-        )
+        # Apply simple rule-based transformations first; with compaction or
+        # copybooks on they run on the prompt lines instead (_prompt_lines)
+        if not self.compaction_enabled and self.copybook_mode == "off":
+            code = self.rule_engine.apply(code)
         
-        # Get transformed code from LLM
-        transformed_code = self.llm.generate(prompt)
+        def finish(responses):
+            # Write the transformed code to the output file, as it is
+            # generated when streaming
+            write_stream(output_file, responses[0])
+            
+            if manifest:
+                manifest.record(source_file, source_hash, inputs, [output_file])
+            return result
         
-        # Write the transformed code to the output file
-        with open(output_file, 'w') as f:
-            f.write(transformed_code)
+        # Get transformed code from LLM (retrieval and prompting happen per
+        # chunk for sources too large for a single request)
+        return [(source_file, code)], finish
+    
+    def _prompt_lines(self, code, file_path=None):
+        """
+        Prompt text and lines, with the rules applied after compaction
         
-        return {
-            "source": source_file,
-            "output": output_file
-        }
+        Rules run once copybooks are expanded, so they also see the fields
+        copybooks define, and after compaction, so the lines they rewrite or
+        insert are never cut to columns 8-72. They run on the whole text, so
+        statements split over several lines are rewritten as before; each
+        rewrite is kept with the line it starts on, so chunks stay aligned
+        with the file's lines.
+        """
+        text, lines = super()._prompt_lines(code, file_path)
+        with metrics.span("rules", file=file_path):
+            lines = self.rule_engine.apply_lines(lines)
+        return join_lines(lines), lines
     
-    def _transform_directory(self, source_dir, output_dir):
+    def _transform_directory(self, source_dir, output_dir, manifest=None):
         """Transform all relevant files in a directory"""
-        transformed_files = []
-        
         # Get the file extension mappings from rules
         extension_map = self.transformation_rules.get("extension_map", {})
         
-        for root, _, files in os.walk(source_dir):
-            for file in files:
-                # Check if this is a file we should transform
-                _, ext = os.path.splitext(file)
-                if ext.lower() not in extension_map:
-                    continue
-                
-                # Determine the output file path and extension
-                rel_path = os.path.relpath(os.path.join(root, file), source_dir)
-                new_ext = extension_map.get(ext.lower(), ext)
-                output_file = os.path.join(
-                    output_dir,
-                    os.path.splitext(rel_path)[0] + new_ext
-                )
+        def jobs():
+            for source_file in self._gather_files(source_dir, extensions=extension_map.keys()):
+                # Determine the output file path and extension; extensionless
+                # PDS members use member_extension
+                output_file = self._output_file(os.path.relpath(source_file, source_dir), output_dir)
                 
                 # Ensure output directory exists
                 os.makedirs(os.path.dirname(output_file), exist_ok=True)
                 
-                # Transform the file
-                result = self._transform_file(os.path.join(root, file), output_file)
-                transformed_files.append(result)
+                yield source_file, output_file
+        
+        prepare = lambda job: self._prepare_transform(*job, manifest)
+        levels = self._load_file_levels()
+        if levels is None:
+            # Transform the files as they are discovered, several at a time
+            # when workers are configured
+            return list(self._map_requests(prepare, jobs()))
         
+        # Dependency order: callees and copybooks before the programs that use
+        # them. Files in one level are independent, so each level runs in
+        # parallel; files unknown to the graph are treated as leaves.
+        waves = {}
+        for job in jobs():
+            waves.setdefault(levels.get(os.path.abspath(job[0]), 0), []).append(job)
+        
+        transformed_files = []
+        for level in sorted(waves):
+            transformed_files.extend(self._map_requests(prepare, waves[level]))
         return transformed_files
     
+    def _output_file(self, rel_path, output_dir):
+        """Output path for the source at rel_path, with its extension mapped by the rules"""
+        extension_map = self.transformation_rules.get("extension_map", {})
+        member_extension = self.transformation_rules.get("member_extension", ".java")
+        base, ext = os.path.splitext(rel_path)
+        new_ext = extension_map.get(ext.lower(), ext) if ext else member_extension
+        return os.path.join(output_dir, base + new_ext)
+    
+    def _is_transformed(self, file_path):
+        """Whether the rules transform this kind of file (extensionless PDS members are)"""
+        ext = os.path.splitext(file_path)[1].lower()
+        return not ext or ext in {key.lower() for key in self.transformation_rules.get("extension_map", {})}
+    
+    def _load_file_levels(self):
+        """Return {abspath: level} from the configured dependency graph, or None"""
+        if not self.dependency_graph:
+            return None
+        try:
+            return DependencyGraph.load(self.dependency_graph).file_levels()
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Warning: Could not load dependency graph {self.dependency_graph}: {e}")
+            return None
+    
+    def _build_prompt(self, code):
+        """Retrieve context for code and fill in the transformation prompt"""
+        context = self.retriever.get_relevant_context(code)
+        with metrics.span("prompt"):
+            return self.prompt_template.format(
+                code=code,
+                context=context,
+                target_language=self.transformation_rules.get("target_language", "Java")
+            )
+    
+    def _merge_chunk_responses(self, chunks, responses, file_path=None):
+        """Transformed code for each chunk is concatenated in source order"""
+        return "\n\n".join(response.strip("\n") for response in responses) + "\n"
+    
+    def _manifest_inputs(self):
+        """Transformed output also depends on the transformation rules"""
+        inputs = super()._manifest_inputs()
+        inputs["rules"] = hash_text(json.dumps(self.transformation_rules, sort_keys=True))
+        return inputs
+    
     def _load_transformation_rules(self):
         """Load transformation rules from YAML file"""
+        import yaml
         try:
             with open(self.rules_file, 'r') as f:
                 return yaml.safe_load(f)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+
+import argparse
+import math
+import os
+import random
+
+VERBS = ["MOVE", "ADD", "COMPUTE", "IF", "PERFORM", "DISPLAY", "READ", "WRITE"]
+
+def cobol_line(text, sequence, area_a=False):
+    """Fixed-format line: sequence number (1-6), blank indicator (7), Area A or B"""
+    return f"{sequence:06d} {'' if area_a else '    '}{text}"[:72]
+
+def long_tail(rng, median, sigma, low, high):
+    """Log-normal size with the given median, clamped to [low, high]"""
+    return int(min(high, max(low, rng.lognormvariate(math.log(median), sigma))))
+
+class CorpusGenerator:
+    """
+    Builds a synthetic mainframe estate
+
+    Programs have long-tail sizes (log-normal line counts), COPY a few
+    copybooks (popular ones are shared widely), CALL programs generated
+    after them (so the call graph is mostly a DAG, with some back edges for
+    cycles), and are run by JCL jobs with DD statements.
+    """
+
+    def __init__(self, programs=100, copybooks=None, jobs=None, median_lines=300, sigma=1.0, seed=42):
+        self.rng = random.Random(seed)
+        self.programs = [f"PGM{i:05d}" for i in range(programs)]
+        self.copybooks = [f"CPY{i:04d}" for i in range(copybooks if copybooks is not None else max(1, programs // 3))]
+        self.jobs = [f"JOB{i:04d}" for i in range(jobs if jobs is not None else max(1, programs // 10))]
+        self.median_lines = median_lines
+        self.sigma = sigma
+
+    def write(self, output_dir):
+        """Write cobol/, copybook/ and jcl/ under output_dir; returns file counts"""
+        for sub in ("cobol", "copybook", "jcl"):
+            os.makedirs(os.path.join(output_dir, sub), exist_ok=True)
+
+        for name in self.copybooks:
+            with open(os.path.join(output_dir, "copybook", f"{name}.cpy"), 'w') as f:
+                f.write(self.copybook(name))
+        for index, name in enumerate(self.programs):
+            with open(os.path.join(output_dir, "cobol", f"{name}.cbl"), 'w') as f:
+                f.write(self.program(index, name))
+        for name in self.jobs:
+            with open(os.path.join(output_dir, "jcl", f"{name}.jcl"), 'w') as f:
+                f.write(self.job(name))
+
+        return {"programs": len(self.programs), "copybooks": len(self.copybooks), "jobs": len(self.jobs)}
+
+    def copybook(self, name):
+        """A record layout of 3-40 fields"""
+        lines = [cobol_line(f"01  {name}-REC.", 10, area_a=True)]
+        for field in range(long_tail(self.rng, 10, 0.7, 3, 40)):
+            pic = self.rng.choice(["X(10)", "X(30)", "9(5)", "S9(7)V99 COMP-3", "9(8)"])
+            lines.append(cobol_line(f"    05  {name}-F{field:03d}  PIC {pic}.", 20 + field * 10))
+        return "\n".join(lines) + "\n"
+
+    def program(self, index, name):
+        """A program of long-tail length with COPY, CALL and file statements"""
+        rng = self.rng
+        target_lines = long_tail(rng, self.median_lines, self.sigma, 40, 20000)
+        copies = {self._popular(self.copybooks) for _ in range(rng.randint(1, 4))}
+        calls = set()
+        for _ in range(rng.choices([0, 1, 2, 3], weights=[3, 4, 2, 1])[0]):
+            if index + 1 < len(self.programs) and rng.random() < 0.95:
+                calls.add(self.programs[rng.randint(index + 1, len(self.programs) - 1)])
+            elif index > 0:
+                calls.add(self.programs[rng.randint(0, index - 1)])  # occasional cycle
+
+        seq = iter(range(10, 10 ** 6, 10))
+        lines = [
+            cobol_line("IDENTIFICATION DIVISION.", next(seq), area_a=True),
+            cobol_line(f"PROGRAM-ID. {name}.", next(seq), area_a=True),
+            cobol_line("ENVIRONMENT DIVISION.", next(seq), area_a=True),
+            cobol_line("INPUT-OUTPUT SECTION.", next(seq), area_a=True),
+            cobol_line("FILE-CONTROL.", next(seq), area_a=True),
+            cobol_line(f"SELECT {name}-IN ASSIGN TO INFILE.", next(seq)),
+            cobol_line("DATA DIVISION.", next(seq), area_a=True),
+            cobol_line("WORKING-STORAGE SECTION.", next(seq), area_a=True),
+        ]
+        lines += [cobol_line(f"COPY {copybook}.", next(seq)) for copybook in sorted(copies)]
+        lines += [cobol_line(f"01  WS-COUNT-{i}  PIC 9(5) VALUE ZERO.", next(seq), area_a=True) for i in range(3)]
+        lines.append(cobol_line("PROCEDURE DIVISION.", next(seq), area_a=True))
+
+        paragraph = 0
+        pending_calls = sorted(calls)
+        while len(lines) < target_lines:
+            lines.append(cobol_line(f"P{paragraph:04d}-PROCESS.", next(seq), area_a=True))
+            for _ in range(rng.randint(4, 25)):
+                lines.append(cobol_line(self._statement(paragraph), next(seq)))
+            if pending_calls:
+                lines.append(cobol_line(f"CALL '{pending_calls.pop()}'.", next(seq)))
+            paragraph += 1
+        for callee in pending_calls:
+            lines.append(cobol_line(f"CALL '{callee}'.", next(seq)))
+        lines.append(cobol_line("GOBACK.", next(seq)))
+        return "\n".join(lines) + "\n"
+
+    def job(self, name):
+        """A job running 1-6 program steps with DD statements"""
+        lines = [f"//{name} JOB (ACCT),'BENCHMARK',CLASS=A,MSGCLASS=X"]
+        for step in range(self.rng.randint(1, 6)):
+            program = self._popular(self.programs)
+            lines.append(f"//STEP{step:02d}  EXEC PGM={program}")
+            lines.append(f"//INFILE   DD DSN=PROD.{name}.S{step:02d}.INPUT,DISP=SHR")
+            lines.append(f"//OUTFILE  DD DSN=PROD.{name}.S{step:02d}.OUTPUT,DISP=(NEW,CATLG)")
+            lines.append("//SYSOUT   DD SYSOUT=*")
+        return "\n".join(lines) + "\n"
+
+    def _popular(self, names):
+        """Pick a name with a Zipf-like bias towards the first ones"""
+        return names[min(len(names) - 1, int(self.rng.paretovariate(1.2)) - 1)]
+
+    def _statement(self, paragraph):
+        """One random procedure statement"""
+        verb = self.rng.choice(VERBS)
+        if verb == "MOVE":
+            return "MOVE WS-COUNT-0 TO WS-COUNT-1."
+        if verb == "ADD":
+            return "ADD 1 TO WS-COUNT-2."
+        if verb == "COMPUTE":
+            return "COMPUTE WS-COUNT-1 = WS-COUNT-0 * 2 + WS-COUNT-2."
+        if verb == "IF":
+            return "IF WS-COUNT-0 > 100 MOVE ZERO TO WS-COUNT-0 END-IF."
+        if verb == "PERFORM":
+            return f"PERFORM P{max(0, paragraph - 1):04d}-PROCESS."
+        if verb == "DISPLAY":
+            return f"DISPLAY 'PARAGRAPH {paragraph}' WS-COUNT-1."
+        if verb == "READ":
+            return "READ INFILE AT END MOVE 1 TO WS-COUNT-2 END-READ."
+        return "WRITE OUT-REC."
+
+def main():
+    """Generate a synthetic COBOL/JCL corpus for benchmarks"""
+    parser = argparse.ArgumentParser(description='Generate a synthetic mainframe corpus')
+    parser.add_argument('--output', required=True, help='Directory to write the corpus to')
+    parser.add_argument('--programs', type=int, default=100, help='Number of COBOL programs')
+    parser.add_argument('--copybooks', type=int, help='Number of copybooks (default: programs / 3)')
+    parser.add_argument('--jobs', type=int, help='Number of JCL jobs (default: programs / 10)')
+    parser.add_argument('--median-lines', type=int, default=300, help='Median program length in lines')
+    parser.add_argument('--sigma', type=float, default=1.0, help='Spread of the log-normal program size distribution')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed')
+    args = parser.parse_args()
+
+    generator = CorpusGenerator(args.programs, args.copybooks, args.jobs, args.median_lines, args.sigma, args.seed)
+    counts = generator.write(args.output)
+    print(f"Wrote {counts['programs']} programs, {counts['copybooks']} copybooks and {counts['jobs']} jobs to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils.packing import MARKER_PATTERN, member_marker
+
+class MockLLMServer(ThreadingHTTPServer):
+    """
+    OpenAI-compatible chat completions stub
+
+    Each response waits latency seconds plus a uniform random extra of up to
+    jitter seconds, and a rate_429 fraction of requests is rejected with
+    HTTP 429 and a Retry-After header, like a rate-limited API.
+    """
+
+    daemon_threads = True
+    # Deep listen backlog so hundreds of concurrent clients can connect
+    request_queue_size = 1024
+
+    def __init__(self, address, latency=0.0, jitter=0.0, rate_429=0.0, retry_after=1, seed=None):
+        super().__init__(address, MockLLMHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        self.requests = 0
+        self.rejected = 0
+
+    @property
+    def base_url(self):
+        """URL to use as llm.base_url"""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def draw(self):
+        """Return (delay in seconds, whether to reject) for one request"""
+        with self.random_lock:
+            self.requests += 1
+            delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0.0)
+            reject = self.rate_429 > 0 and self.random.random() < self.rate_429
+            if reject:
+                self.rejected += 1
+        return delay, reject
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    """Answers OpenAI-style chat completion requests with canned text"""
+
+    def do_POST(self):
+        if not self.path.endswith("/chat/completions"):
+            self.send_error(404)
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        prompt = request.get("messages", [{}])[-1].get("content", "")
+
+        delay, reject = self.server.draw()
+        if delay:
+            time.sleep(delay)
+
+        if reject:
+            self._send_json(429, {
+                "error": {"message": "Rate limit reached (mock)", "type": "rate_limit_exceeded", "code": "rate_limit_exceeded"}
+            }, {"Retry-After": str(self.server.retry_after)})
+            return
+
+        if request.get("stream"):
+            self._send_stream(request.get("model", "mock"), self._answer(prompt))
+            return
+
+        self._send_json(200, {
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": self._answer(prompt)},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": 20, "total_tokens": len(prompt) // 4 + 20}
+        })
+
+    def _answer(self, prompt):
+        """Canned response; packed prompts get one section per member"""
+        members = MARKER_PATTERN.findall(prompt)
+        if members:
+            return "\n\n".join(f"{member_marker(index)}\nMock response for member {index}."
+                               for index in range(1, len(members) + 1))
+        return f"Mock response for a {len(prompt)} character prompt."
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, model, text, size=16):
+        """Send text as server-sent chat.completion.chunk events"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for start in range(0, len(text), size):
+            event = {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": text[start:start + size]}, "finish_reason": None}]
+            }
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass  # keep benchmark output quiet
+
+def start_server(host="127.0.0.1", port=0, **options):
+    """Start a MockLLMServer in a background thread (port 0 picks a free port)"""
+    server = MockLLMServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    """
+    Run a local OpenAI-compatible chat completions server
+
+    Start it from the repository root with
+    `python -m benchmarks.mock_llm_server`, then point the POC at it with
+    llm.base_url: "http://127.0.0.1:8800/v1" and any non-empty API key.
+    """
+    parser = argparse.ArgumentParser(description='Mock OpenAI-compatible LLM server')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=8800, help='Port to listen on')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds to wait before each response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Extra random delay of up to this many seconds')
+    parser.add_argument('--rate-429', type=float, default=0.0, help='Fraction of requests rejected with HTTP 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds sent with 429 responses')
+    parser.add_argument('--seed', type=int, help='Random seed for jitter and 429 decisions')
+    args = parser.parse_args()
+
+    server = MockLLMServer((args.host, args.port), latency=args.latency, jitter=args.jitter,
+                           rate_429=args.rate_429, retry_after=args.retry_after, seed=args.seed)
+    print(f"Mock LLM server listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(f"Served {server.requests} requests ({server.rejected} rejected with 429)")
+
+if __name__ == "__main__":
+    main()
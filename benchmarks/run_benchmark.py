@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import yaml
+
+from benchmarks.generate_corpus import CorpusGenerator
+from benchmarks.mock_llm_server import start_server
+from utils.config import default_config
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Output argument for each mode (a file or a directory under the work dir)
+MODE_OUTPUTS = {
+    "analyze": "analysis.jsonl",
+    "document": "docs",
+    "transform": "transformed",
+    "dependency": "dependencies.json",
+    "plan": "plan.md",
+    "pipeline": "pipeline"
+}
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+def write_config(path, base_url, args):
+    """Benchmark configuration: every mode talks to the stub server, no caching or skipping"""
+    config = default_config()
+    config["llm"].update({
+        "api_key": "benchmark",
+        "base_url": base_url,
+        "rate_limit": False,
+        "retry_delay": args.retry_delay,
+        "cache_enabled": False
+    })
+    config["execution"].update({"workers": args.workers, "async": args.use_async, "incremental": False})
+    config["discovery"]["extensions"] = [".cbl", ".cob", ".cpy", ".jcl"]
+    config["packing"]["enabled"] = args.pack
+    with open(path, 'w') as f:
+        yaml.safe_dump(config, f)
+
+def run_mode(mode, corpus, config_path, work_dir):
+    """Run one mode of main.py end to end; returns a result dict"""
+    metrics_prefix = os.path.join(work_dir, f"{mode}-metrics")
+    command = [
+        sys.executable, os.path.join(REPO_ROOT, "main.py"),
+        "--mode", mode,
+        "--source", corpus,
+        "--output", os.path.join(work_dir, MODE_OUTPUTS[mode]),
+        "--config", config_path,
+        "--metrics-out", metrics_prefix
+    ]
+    if mode == "plan":
+        command += ["--phase", "discovery"]
+
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=REPO_ROOT, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    log = process.stdout.read()
+    # wait4 reports the resource usage of this child alone
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    elapsed = time.perf_counter() - start
+
+    result = {"mode": mode, "seconds": elapsed, "exit_code": process.returncode,
+              "peak_rss_mb": usage.ru_maxrss / 1024}  # ru_maxrss is in KiB on Linux
+    try:
+        with open(f"{metrics_prefix}.trace.json", 'r') as f:
+            trace = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        result["error"] = log[-2000:]
+        return result
+
+    counters = trace["otherData"]["counters"]
+    latencies = [event["dur"] / 1e6 for event in trace["traceEvents"] if event["name"] == "unit"]
+    files = counters.get("files_read", len(latencies))
+    result.update({
+        "files": files,
+        "files_per_second": files / elapsed if elapsed else 0.0,
+        "p50_seconds": percentile(latencies, 0.50),
+        "p95_seconds": percentile(latencies, 0.95),
+        "llm_requests": trace["otherData"]["stages"].get("llm", {}).get("count", 0),
+        "retries": sum(value for name, value in counters.items() if name.startswith("llm_retries"))
+    })
+    return result
+
+def print_report(results):
+    """Print one row per mode"""
+    print(f"{'mode':<11}{'files':>7}{'seconds':>9}{'files/s':>9}{'p50 s':>8}{'p95 s':>8}"
+          f"{'requests':>10}{'retries':>9}{'peak MB':>9}")
+    for result in results:
+        if "error" in result:
+            print(f"{result['mode']:<11} failed (exit code {result['exit_code']}):\n{result['error']}")
+            continue
+        print(f"{result['mode']:<11}{result['files']:>7}{result['seconds']:>9.2f}{result['files_per_second']:>9.1f}"
+              f"{result['p50_seconds']:>8.3f}{result['p95_seconds']:>8.3f}{result['llm_requests']:>10}"
+              f"{result['retries']:>9}{result['peak_rss_mb']:>9.1f}")
+
+def main():
+    """
+    Time each mode end to end against the mock LLM server
+
+    Run from the repository root: python -m benchmarks.run_benchmark
+    """
+    parser = argparse.ArgumentParser(description='Benchmark the modernization modes')
+    parser.add_argument('--corpus', help='Existing corpus directory (default: generate one)')
+    parser.add_argument('--programs', type=int, default=200, help='Programs in the generated corpus')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed for the corpus and the server')
+    parser.add_argument('--modes', default='analyze,document,transform,dependency',
+                      help='Comma-separated modes to run')
+    parser.add_argument('--workers', type=int, default=8, help='execution.workers for every mode')
+    parser.add_argument('--async', dest='use_async', action='store_true', help='Run the modes with --async')
+    parser.add_argument('--pack', action='store_true', help='Enable prompt packing')
+    parser.add_argument('--latency', type=float, default=0.2, help='Stub server base latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.1, help='Stub server extra random latency in seconds')
+    parser.add_argument('--rate-429', type=float, default=0.0, help='Fraction of requests rejected with 429')
+    parser.add_argument('--retry-delay', type=float, default=0.5, help='llm.retry_delay for the runs')
+    parser.add_argument('--json-out', help='Also write the results as JSON to this file')
+    args = parser.parse_args()
+
+    server = start_server(latency=args.latency, jitter=args.jitter, rate_429=args.rate_429,
+                          retry_after=0, seed=args.seed)
+    with tempfile.TemporaryDirectory(prefix="mainframe-bench-") as work_dir:
+        corpus = args.corpus
+        if not corpus:
+            corpus = os.path.join(work_dir, "corpus")
+            counts = CorpusGenerator(args.programs, seed=args.seed).write(corpus)
+            print(f"Generated {counts['programs']} programs, {counts['copybooks']} copybooks and {counts['jobs']} jobs")
+
+        config_path = os.path.join(work_dir, "benchmark_config.yaml")
+        write_config(config_path, server.base_url, args)
+
+        results = []
+        for mode in args.modes.split(","):
+            mode = mode.strip()
+            print(f"Running {mode}...")
+            results.append(run_mode(mode, os.path.abspath(corpus), config_path, work_dir))
+    server.shutdown()
+
+    print_report(results)
+    print(f"Stub server: {server.requests} requests, {server.rejected} rejected with 429")
+    if args.json_out:
+        with open(args.json_out, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
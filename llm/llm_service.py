@@ -1,16 +1,19 @@
 import os
 
-import time
-from openai import OpenAI
-from dotenv import load_dotenv
+from llm.rate_limiter import RateLimiter
+from llm.response_cache import ResponseCache
+from utils.metrics import metrics
+from utils.packing import MARKER_PATTERN, member_marker
+from utils.tokens import CHARS_PER_TOKEN, estimate_tokens
 
-# Make sure .env is loaded
-load_dotenv()
+from utils.config import load_env
 
 class LLMService:
     """Service for interacting with LLMs"""
     
     def __init__(self, config):
+        # Make sure .env is loaded
+        load_env()
         self.provider = config.get("provider", "openai")
         self.model = config.get("model", "gpt-3.5-turbo")
         self.temperature = config.get("temperature", 0.1)
@@ -19,6 +22,18 @@ class LLMService:
         self.retry_attempts = config.get("retry_attempts", 3)
         self.retry_delay = config.get("retry_delay", 5)
         
+        # Shared pacing so concurrent workers don't flood the API
+        self.limiter = RateLimiter(
+            requests_per_minute=config.get("requests_per_minute", 0),
+            max_concurrent=config.get("max_concurrent_requests", 0)
+        )
+        # In-flight cap for agenerate(); async requests need no thread each
+        self.async_max_in_flight = config.get("async_max_in_flight", 100)
+        self._async_state = None
+        
+        # OpenAI-compatible endpoint override (proxies, local stub servers)
+        self.base_url = config.get("base_url", "") or os.environ.get("OPENAI_BASE_URL") or None
+        
         # Set API key for OpenAI
         if self.provider == "openai":
             # Try to get API key from config
@@ -37,22 +52,120 @@ class LLMService:
                     print("OpenAI API key configured with rate limiting (free tier mode).")
                 else:
                     print("OpenAI API key configured.")
-                self.client = OpenAI(api_key=api_key)
+                self.api_key = api_key
+                # Imported here so mock runs never load the OpenAI SDK
+                from openai import OpenAI
+                # max_retries=0: the SDK would otherwise retry 429s on its own,
+                # bypassing the shared rate limiter's cooldown and retry_attempts
+                self.client = OpenAI(api_key=api_key, base_url=self.base_url, max_retries=0)
                 self.use_mock = False
         else:
             self.use_mock = True
             self.client = None
+        
+        # Persistent response cache: "use" reads and writes, "refresh" only
+        # writes (forcing new completions), "bypass" ignores the cache
+        self.cache_mode = config.get("cache_mode", "use")
+        self.cache = None
+        if not self.use_mock and config.get("cache_enabled", True) and self.cache_mode != "bypass":
+            self.cache = ResponseCache(
+                config.get("cache_path", "./.llm_cache/responses.db"),
+                max_bytes=int(config.get("cache_max_mb", 200) * 1024 * 1024)
+            )
     
     def generate(self, prompt):
         """Generate text using the configured LLM"""
-        if self.provider == "openai" and not self.use_mock and self.client:
-            return self._generate_openai(prompt)
-        else:
-            # Fallback to mock responses for demo purposes
-            return self._generate_mock(prompt)
+        with metrics.span("llm", prompt_chars=len(prompt)) as span:
+            if self.provider == "openai" and not self.use_mock and self.client:
+                key = self._cache_key(prompt)
+                cached = self._cache_lookup(key, span)
+                if cached is not None:
+                    return cached
+                
+                response = self._generate_openai(prompt)
+                if response is None:
+                    # All attempts failed; never cache the mock fallback
+                    return self._generate_mock_counted(prompt)
+                
+                if self.cache:
+                    self.cache.put(key, response)
+                return response
+            else:
+                # Fallback to mock responses for demo purposes
+                return self._generate_mock_counted(prompt)
+    
+    async def agenerate(self, prompt):
+        """
+        Generate text without blocking the event loop
+        
+        At most llm.async_max_in_flight requests are awaited at once; rate
+        limit backoff uses asyncio.sleep and is shared with generate().
+        Cancelling the calling task cancels the in-flight request.
+        """
+        with metrics.span("llm", prompt_chars=len(prompt), mode="async") as span:
+            if self.provider == "openai" and not self.use_mock and self.client:
+                key = self._cache_key(prompt)
+                cached = self._cache_lookup(key, span)
+                if cached is not None:
+                    return cached
+                
+                response = await self._agenerate_openai(prompt)
+                if response is None:
+                    # All attempts failed; never cache the mock fallback
+                    return self._generate_mock_counted(prompt)
+                
+                if self.cache:
+                    self.cache.put(key, response)
+                return response
+            else:
+                # Fallback to mock responses for demo purposes
+                return self._generate_mock_counted(prompt)
+    
+    def generate_stream(self, prompt):
+        """
+        Generate text, yielding it in pieces as the API produces them
+        
+        Cached responses are yielded whole. The full text is only kept in
+        memory when it has to be written to the response cache.
+        """
+        # The span also covers the time the caller spends between pieces
+        with metrics.span("llm", prompt_chars=len(prompt), mode="stream") as span:
+            if self.provider == "openai" and not self.use_mock and self.client:
+                key = self._cache_key(prompt)
+                cached = self._cache_lookup(key, span)
+                if cached is not None:
+                    yield cached
+                    return
+                
+                parts = [] if self.cache else None
+                completed = yield from self._stream_openai(prompt, parts)
+                if not completed:
+                    # All attempts failed; never cache the mock fallback
+                    yield from self._stream_mock(prompt)
+                    return
+                
+                if self.cache:
+                    self.cache.put(key, "".join(parts))
+            else:
+                # Fallback to mock responses for demo purposes
+                yield from self._stream_mock(prompt)
+    
+    def cache_stats(self):
+        """Return response cache counters, or None when caching is disabled"""
+        return self.cache.stats() if self.cache else None
+    
+    def _cache_key(self, prompt):
+        """Cache key covering every setting that affects the completion"""
+        return ResponseCache.make_key(
+            self.provider, self.model, self.temperature, self.max_tokens, prompt
+        )
     
     def _generate_openai(self, prompt):
-        """Generate text using OpenAI API with retry logic for free tier"""
+        """
+        Generate text using OpenAI API with retry logic for free tier
+        
+        Returns None when every attempt failed so the caller can fall back.
+        """
         attempts = 0
         
         while attempts <= self.retry_attempts:
@@ -60,34 +173,201 @@ class LLMService:
                 # Add a small delay if rate limiting is enabled
                 if self.rate_limit and attempts > 0:
                     print(f"Rate limit pause: waiting {self.retry_delay} seconds before retry...")
-                    time.sleep(self.retry_delay)
+                    self.limiter.backoff(self.retry_delay)
                 
                 # Make API call with controlled token usage
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[{"role": "user", "content": prompt}],
-                    temperature=self.temperature,
-                    max_tokens=self.max_tokens
-                )
+                with self.limiter:
+                    response = self.client.chat.completions.create(
+                        model=self.model,
+                        messages=[{"role": "user", "content": prompt}],
+                        temperature=self.temperature,
+                        max_tokens=self.max_tokens
+                    )
+                self._record_usage(prompt, response)
                 return response.choices[0].message.content
             
             except Exception as e:
                 attempts += 1
-                if "rate limit" in str(e).lower():
-                    wait_time = self.retry_delay * attempts
-                    print(f"Rate limit reached. Waiting {wait_time} seconds before retry. Attempt {attempts}/{self.retry_attempts}")
-                    time.sleep(wait_time)
-                else:
-                    print(f"Error with OpenAI API: {e}")
-                    if attempts >= self.retry_attempts:
-                        print("Maximum retry attempts reached. Using mock response.")
-                        return self._generate_mock(prompt)
+                if not self._handle_api_error(e, attempts):
+                    return None
         
-        return self._generate_mock(prompt)
+        return None
+    
+    def _stream_openai(self, prompt, parts=None):
+        """
+        Yield completion text from a streaming API call, appending it to parts
         
+        Returns True once the stream has finished, or False when every attempt
+        failed before any text arrived. Errors after the first piece are
+        raised, since the caller has already consumed part of the response.
+        """
+        attempts = 0
+        started = False
+        
+        while attempts <= self.retry_attempts:
+            try:
+                if self.rate_limit and attempts > 0:
+                    print(f"Rate limit pause: waiting {self.retry_delay} seconds before retry...")
+                    self.limiter.backoff(self.retry_delay)
+                
+                with self.limiter:
+                    stream = self.client.chat.completions.create(
+                        model=self.model,
+                        messages=[{"role": "user", "content": prompt}],
+                        temperature=self.temperature,
+                        max_tokens=self.max_tokens,
+                        stream=True
+                    )
+                    completion_chars = 0
+                    for event in stream:
+                        text = event.choices[0].delta.content if event.choices else None
+                        if text:
+                            started = True
+                            completion_chars += len(text)
+                            if parts is not None:
+                                parts.append(text)
+                            yield text
+                # Streaming responses carry no usage block
+                metrics.count("llm_prompt_tokens", estimate_tokens(prompt), source="estimated")
+                metrics.count("llm_completion_tokens", (completion_chars + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN, source="estimated")
+                return True
+            
+            except Exception as e:
+                if started:
+                    raise
+                attempts += 1
+                if not self._handle_api_error(e, attempts):
+                    return False
+        
+        return False
+    
+    async def _agenerate_openai(self, prompt):
+        """Async counterpart of _generate_openai; returns None when every attempt failed"""
+        import asyncio
+        client, semaphore = self._get_async_state()
+        attempts = 0
+        
+        while attempts <= self.retry_attempts:
+            try:
+                if self.rate_limit and attempts > 0:
+                    self.limiter.backoff(self.retry_delay)
+                
+                async with semaphore:
+                    await self.limiter.wait_async()
+                    response = await client.chat.completions.create(
+                        model=self.model,
+                        messages=[{"role": "user", "content": prompt}],
+                        temperature=self.temperature,
+                        max_tokens=self.max_tokens
+                    )
+                self._record_usage(prompt, response)
+                return response.choices[0].message.content
+            
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                attempts += 1
+                if not self._handle_api_error(e, attempts):
+                    return None
+        
+        return None
+    
+    def _get_async_state(self):
+        """Async client and in-flight semaphore for the running event loop"""
+        import asyncio
+        from openai import AsyncOpenAI
+        
+        loop = asyncio.get_running_loop()
+        if self._async_state is None or self._async_state[0] is not loop:
+            # Both are bound to the loop they are first used on
+            client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0)
+            semaphore = asyncio.Semaphore(self.async_max_in_flight)
+            self._async_state = (loop, client, semaphore)
+        return self._async_state[1], self._async_state[2]
+    
+    def _cache_lookup(self, key, span):
+        """Return the cached response for key, if caching is in "use" mode and it exists"""
+        if not (self.cache and self.cache_mode == "use"):
+            return None
+        cached = self.cache.get(key)
+        span.set(cache="hit" if cached is not None else "miss")
+        metrics.count("llm_cache_hits" if cached is not None else "llm_cache_misses")
+        return cached
+    
+    def _record_usage(self, prompt, response):
+        """Count prompt and completion tokens as reported by the API"""
+        if not metrics.enabled:
+            return
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            metrics.count("llm_prompt_tokens", usage.prompt_tokens, source="api")
+            metrics.count("llm_completion_tokens", usage.completion_tokens, source="api")
+        else:
+            metrics.count("llm_prompt_tokens", estimate_tokens(prompt), source="estimated")
+            metrics.count("llm_completion_tokens", estimate_tokens(response.choices[0].message.content or ""),
+                          source="estimated")
+    
+    def _generate_mock_counted(self, prompt):
+        """Mock response, counted as such"""
+        response = self._generate_mock(prompt)
+        if metrics.enabled:
+            metrics.count("llm_mock_responses")
+            metrics.count("llm_prompt_tokens", estimate_tokens(prompt), source="mock")
+            metrics.count("llm_completion_tokens", estimate_tokens(response), source="mock")
+        return response
+    
+    def _handle_api_error(self, error, attempts):
+        """Report a failed attempt and back off; returns False when no retries are left"""
+        metrics.count("llm_retries", reason="rate_limit" if self._is_rate_limit_error(error) else "error")
+        if self._is_rate_limit_error(error):
+            wait_time = self.retry_delay * attempts
+            print(f"Rate limit reached. Waiting {wait_time} seconds before retry. Attempt {attempts}/{self.retry_attempts}")
+            # Pause every worker sharing this service, not just this one
+            self.limiter.backoff(wait_time)
+            return True
+        
+        print(f"Error with OpenAI API: {error}")
+        if attempts >= self.retry_attempts:
+            print("Maximum retry attempts reached. Using mock response.")
+            return False
+        return True
+    
+    def _is_rate_limit_error(self, error):
+        """Check whether an API error is a rate limit (HTTP 429) response"""
+        message = str(error).lower()
+        return "rate limit" in message or "429" in message or getattr(error, "status_code", None) == 429
+        
+    def _stream_mock(self, prompt, size=64):
+        """Yield a mock response in small pieces, like a streaming API"""
+        response = self._generate_mock(prompt)
+        for start in range(0, len(response), size):
+            yield response[start:start + size]
+    
     def _generate_mock(self, prompt):
         """Generate mock responses for demo purposes"""
-        if "analyze" in prompt.lower():
+        members = MARKER_PATTERN.findall(prompt)
+        if members:
+            # Packed prompt: answer each member under its own marker
+            single = self._generate_mock(MARKER_PATTERN.sub("", prompt))
+            return "\n\n".join(f"{member_marker(index)}\n{single.strip()}"
+                                 for index in range(1, len(members) + 1))
+        
+        if "dependency specialist" in prompt.lower():
+            return """```json
+{
+  "dependencies": [
+    {"type": "file", "name": "CUSTMAST", "notes": "Indexed customer master (VSAM KSDS)"},
+    {"type": "file", "name": "TRANFILE", "notes": "Sequential transaction input"},
+    {"type": "file", "name": "PRNTFILE", "notes": "Report output"}
+  ],
+  "resources": [
+    {"type": "runtime", "name": "Batch COBOL runtime"},
+    {"type": "skill", "name": "VSAM file handling"}
+  ]
+}
+```"""
+        
+        elif "analyze" in prompt.lower():
             return """
 # Code Analysis Report
 
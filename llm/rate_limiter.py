@@ -0,0 +1,66 @@
+import threading
+import time
+from utils.metrics import metrics
+
+class RateLimiter:
+    """
+    Thread-safe request pacing shared by every caller of an LLMService
+
+    Combines three controls:
+    - an optional cap on concurrent in-flight requests
+    - an optional requests-per-minute pace
+    - a shared cooldown, so a rate-limit error seen by one worker pauses all of them
+    """
+
+    def __init__(self, requests_per_minute=0, max_concurrent=0):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+        self._cooldown_until = 0.0
+        self._semaphore = threading.BoundedSemaphore(max_concurrent) if max_concurrent else None
+
+    def acquire(self):
+        """Block until a request may be sent"""
+        if self._semaphore:
+            self._semaphore.acquire()
+        wait = self._reserve_slot()
+        if wait > 0:
+            metrics.count("llm_wait_seconds", wait)
+            with metrics.span("llm_wait", seconds=wait):
+                time.sleep(wait)
+
+    async def wait_async(self):
+        """Wait for the pace and any shared cooldown without blocking the event loop"""
+        import asyncio
+        wait = self._reserve_slot()
+        if wait > 0:
+            metrics.count("llm_wait_seconds", wait)
+            with metrics.span("llm_wait", seconds=wait):
+                await asyncio.sleep(wait)
+
+    def release(self):
+        """Mark an in-flight request as finished"""
+        if self._semaphore:
+            self._semaphore.release()
+
+    def backoff(self, seconds):
+        """Pause all callers for the given number of seconds"""
+        with self._lock:
+            self._cooldown_until = max(self._cooldown_until, time.monotonic() + seconds)
+
+    def _reserve_slot(self):
+        """Reserve the next send time and return how long to wait for it"""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_slot, self._cooldown_until)
+            if self.interval:
+                self._next_slot = start + self.interval
+            return start - now
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
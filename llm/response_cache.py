@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+class ResponseCache:
+    """
+    Persistent, content-addressed cache of LLM responses
+
+    Entries are keyed by a hash of everything that influences a completion
+    (provider, model, temperature, max_tokens and the prompt) and stored in a
+    small SQLite database. When the stored responses exceed max_bytes the
+    least recently used entries are evicted. Several processes may share
+    the database, so its size is always read from the table.
+    """
+
+    def __init__(self, path, max_bytes=200 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " response TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(provider, model, temperature, max_tokens, prompt):
+        """Build the cache key for a request"""
+        payload = json.dumps([provider, model, temperature, max_tokens, prompt])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Return the cached response for key, or None on a miss"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, response):
+        """Store a response and evict old entries if the cache is over its size limit"""
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            # The write lock is taken up front, so the size summed below
+            # includes every other process's entries and can't change before
+            # the eviction commits
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, size, last_access) VALUES (?, ?, ?, ?)",
+                    (key, response, size, time.time())
+                )
+                if self.max_bytes and self._total_bytes() > self.max_bytes:
+                    self._evict()
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+
+    def stats(self):
+        """Return hit/miss counters and current cache size"""
+        with self._lock:
+            total_bytes = self._total_bytes()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bytes": total_bytes
+        }
+
+    def close(self):
+        """Close the underlying database"""
+        with self._lock:
+            self._conn.close()
+
+    def _total_bytes(self):
+        """Size of all stored responses, from every process sharing the database"""
+        return self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+
+    def _evict(self):
+        """Drop least recently used entries until the cache is back under 90% of its limit"""
+        target = int(self.max_bytes * 0.9)
+        total_bytes = self._total_bytes()
+        rows = self._conn.execute(
+            "SELECT key, size FROM responses ORDER BY last_access ASC"
+        )
+        evicted = []
+        for key, size in rows:
+            if total_bytes <= target:
+                break
+            evicted.append((key,))
+            total_bytes -= size
+        rows.close()
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
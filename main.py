@@ -3,27 +3,62 @@
 import argparse
 import os
 import sys
-from agents.agent_factory import create_agent
-from utils.config import load_config
+from agents.agent_factory import agent_types
+from utils.metrics import metrics
 
 def main():
     """
     Main entry point for the Agentic Mainframe Modernization POC.
     """
     parser = argparse.ArgumentParser(description='Agentic Mainframe Modernization POC')
-    parser.add_argument('--mode', choices=['analyze', 'document', 'transform', 'plan', 'dependency'], 
+    parser.add_argument('--mode', choices=agent_types(), 
                       help='Mode of operation')
     parser.add_argument('--source', help='Source file or directory')
     parser.add_argument('--output', help='Output file or directory')
     parser.add_argument('--config', default='config.yaml', help='Configuration file')
     parser.add_argument('--project', help='Project name for organizing multiple operations')
     parser.add_argument('--phase', choices=['discovery', 'design', 'transform', 'test', 'deploy'],
-                      help='Modernization phase for planning operations')
+                      help='Modernization phase for planning operations (pipeline mode also writes a plan when given)')
+    parser.add_argument('--workers', type=int,
+                      help='Number of files to process concurrently (overrides execution.workers)')
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                      help='Send LLM requests as asyncio tasks (up to llm.async_max_in_flight at once)')
+    parser.add_argument('--stream', action='store_true',
+                      help='Write document and transform output to disk while it is being generated')
+    parser.add_argument('--no-cache', action='store_true',
+                      help='Bypass the LLM response cache for this run')
+    parser.add_argument('--refresh-cache', action='store_true',
+                      help='Ignore cached LLM responses and store fresh ones')
+    parser.add_argument('--force', action='store_true',
+                      help='Reprocess every file even if the output manifest says it is unchanged')
+    parser.add_argument('--pack', action='store_true',
+                      help='Send several small files per LLM request in analyze and document modes')
+    parser.add_argument('--metrics-out',
+                      help='Write per-stage timings and counters to <prefix>.trace.json and <prefix>.prom')
+    parser.add_argument('--dependency-graph',
+                      help='Graph file from dependency mode; transform mode then works leaf programs first')
+    parser.add_argument('--layout',
+                      help='Program or copybook describing the records of the data files in convert mode')
+    parser.add_argument('--record',
+                      help='01 level (or group) of the layout to convert; the first 01 level by default')
+    parser.add_argument('--enqueue', action='store_true',
+                      help='Add one job per file of --source to the job queue instead of running the mode')
+    parser.add_argument('--worker', action='store_true',
+                      help='Run jobs from the job queue until it is drained')
+    parser.add_argument('--queue-status', action='store_true',
+                      help='Show how many queued, leased, done and dead jobs the job queue holds')
+    parser.add_argument('--retry-dead', action='store_true',
+                      help='Queue the dead jobs (of --wave, when given) again with fresh attempts')
+    parser.add_argument('--queue',
+                      help='Job queue database (overrides queue.path)')
+    parser.add_argument('--wave',
+                      help='Name of the group of enqueued jobs; levels only order jobs within one wave')
     
     args = parser.parse_args()
     
     # Show help message if no arguments provided
-    if len(sys.argv) == 1 or not args.mode or not args.source:
+    queue_command = args.worker or args.queue_status or args.retry_dead
+    if len(sys.argv) == 1 or not queue_command and (not args.mode or not args.source):
         print("Agentic Mainframe Modernization POC")
         print("===================================")
         print("\nAddressing key modernization challenges:")
@@ -39,10 +74,43 @@ def main():
         print("  Transform:   python main.py --mode transform --source examples/sample.cbl --output transformed/sample.java")
         print("  Plan:        python main.py --mode plan --source project_dir --phase discovery --output transformation_plan.md")
         print("  Dependency:  python main.py --mode dependency --source project_dir --output dependency_map.json")
+        print("  Pipeline:    python main.py --mode pipeline --source project_dir --output modernization")
+        print("  Site:        python main.py --mode site --source docs --output site")
+        print("  Convert:     python main.py --mode convert --source CUSTMAST.dat --layout examples/sample.cbl --record CUST-RECORD --output cust.csv")
+        print("  Job queue:   python main.py --mode transform --source project_dir --output transformed --enqueue")
+        print("               python main.py --worker   (run any number of these, on any host sharing the queue)")
         print("\nFor detailed instructions, see GETTING_STARTED.md")
         return
     
+    # Imported after the help check so --help and usage never load YAML or agents
+    from agents.agent_factory import create_agent
+    from utils.config import load_config
+    
     config = load_config(args.config)
+    if args.workers:
+        config["execution"]["workers"] = args.workers
+    if args.use_async:
+        config["execution"]["async"] = True
+    if args.stream:
+        config["llm"]["stream"] = True
+    if args.force:
+        config["execution"]["incremental"] = False
+    if args.no_cache:
+        config["llm"]["cache_mode"] = "bypass"
+    elif args.refresh_cache:
+        config["llm"]["cache_mode"] = "refresh"
+    if args.pack:
+        config["packing"]["enabled"] = True
+    if config["execution"].get("async") and config["llm"].get("stream"):
+        print("Error: --stream is not supported together with --async (execution.async); use one or the other.")
+        return
+    if args.dependency_graph:
+        config["agents"]["transform"]["dependency_graph"] = args.dependency_graph
+    if args.queue:
+        config["queue"]["path"] = args.queue
+    metrics_out = args.metrics_out or config["metrics"].get("output")
+    if metrics_out:
+        metrics.enable()
     
     # Add warning about free tier usage - with safer access
     if config.get("llm", {}).get("api_key") and config.get("llm", {}).get("rate_limit", False):
@@ -54,6 +122,10 @@ def main():
     if args.output and os.path.dirname(args.output) and not os.path.exists(os.path.dirname(args.output)):
         os.makedirs(os.path.dirname(args.output), exist_ok=True)
     
+    if queue_command:
+        run_queue_command(args, config, metrics_out)
+        return
+    
     # Create and run the appropriate agent
     try:
         # For planning mode, provide phase information
@@ -65,15 +137,35 @@ def main():
         agent = create_agent(args.mode, config)
         
         # Add extra context for certain agent types
-        if args.mode == 'plan':
-            result = agent.process(args.source, args.output, phase=args.phase)
-        elif args.mode == 'dependency':
-            result = agent.process(args.source, args.output, project=args.project or "main")
-        else:
-            result = agent.process(args.source, args.output)
+        options = process_options(args)
+        if args.enqueue:
+            queue = open_queue(config)
+            tasks = agent.queue_tasks(args.source, args.output)
+            wave = args.wave or "default"
+            added = queue.enqueue(args.mode, tasks, options, wave)
+            print(f"Enqueued {added} {args.mode} jobs ({len(tasks) - added} already in wave {wave}) in {queue.path}")
+            print(f"Wave {wave}: {queue.stats(wave)}")
+            queue.close()
+            return
+        
+        with metrics.span("run", mode=args.mode):
+            result = agent.process(args.source, args.output, **options)
         
         print(f"Agent completed task. Result: {result}")
         
+        if metrics_out:
+            trace_path, prom_path = metrics.write(metrics_out)
+            print(f"Metrics written to {trace_path} and {prom_path}")
+        
+        compaction_stats = agent.compaction_stats()
+        if compaction_stats:
+            print(f"Source compaction: {compaction_stats['tokens_before']} -> {compaction_stats['tokens_after']} "
+                  f"estimated tokens ({compaction_stats['saved']:.0%} smaller)")
+        
+        cache_stats = agent.cache_stats()
+        if cache_stats:
+            print(f"LLM response cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+        
         # Provide next steps guidance
         if args.mode == 'analyze':
             print("\nNext steps:")
@@ -91,5 +183,69 @@ def main():
         import traceback
         traceback.print_exc()
 
+def process_options(args):
+    """Extra process() arguments of the selected mode"""
+    if args.mode == 'plan':
+        return {"phase": args.phase}
+    if args.mode == 'dependency':
+        return {"project": args.project or "main"}
+    if args.mode == 'pipeline':
+        return {"phase": args.phase, "project": args.project or "main"}
+    if args.mode == 'convert':
+        # Absolute, so queue workers started elsewhere find the layout
+        return {"layout": os.path.abspath(args.layout) if args.layout else None, "record": args.record}
+    return {}
+
+def open_queue(config):
+    """Open the job queue database configured in the queue section"""
+    from utils.job_queue import JobQueue
+    queue_config = config["queue"]
+    return JobQueue(queue_config.get("path", "jobs.db"), queue_config.get("journal_mode", "wal"),
+                    queue_config.get("max_attempts", 3), queue_config.get("retry_delay", 30))
+
+def run_queue_command(args, config, metrics_out=None):
+    """Show the job queue's status, requeue dead jobs and/or work through the jobs (--worker)"""
+    from agents.agent_factory import create_agent
+    from utils.job_queue import run_worker
+    
+    queue = open_queue(config)
+    if args.retry_dead:
+        print(f"Queued {queue.retry_dead(args.wave)} dead jobs again")
+    if not args.worker:
+        print(f"Queue {queue.path}: {queue.stats(args.wave)}")
+        queue.close()
+        return
+    
+    queue_config = config["queue"]
+    # Document jobs would each rebuild the site of their own directory;
+    # build it once with --mode site after the wave instead
+    config["site"]["enabled"] = False
+    agents = {}
+    
+    def agent_for(mode):
+        """One agent per mode, sharing the LLM client and retriever once an agent has created them"""
+        if mode not in agents:
+            services = {}
+            for agent in agents.values():
+                services.update(agent.shared_services())
+            agents[mode] = create_agent(mode, config, **services)
+        return agents[mode]
+    
+    with metrics.span("run", mode="worker"):
+        result = run_worker(
+            queue, agent_for,
+            visibility_timeout=queue_config.get("visibility_timeout", 600),
+            heartbeat_interval=queue_config.get("heartbeat_interval", 60),
+            poll_interval=queue_config.get("poll_interval", 5),
+            exit_when_empty=queue_config.get("exit_when_empty", True)
+        )
+    print(f"Worker finished. Result: {result}")
+    print(f"Queue {queue.path}: {queue.stats()}")
+    queue.close()
+    
+    if metrics_out:
+        trace_path, prom_path = metrics.write(metrics_out)
+        print(f"Metrics written to {trace_path} and {prom_path}")
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,69 @@
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+
+# COBOL names are hyphenated (CM-CUST-ID), so hyphens split tokens too
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+def tokenize(text):
+    """Lowercase text and split it into index terms"""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if len(token) > 1]
+
+class BM25Index:
+    """
+    In-memory inverted index scored with Okapi BM25
+
+    Documents are tokenized once when the index is built. Each term maps to
+    its idf and a postings list of (document id, precomputed BM25 term
+    weight), so answering a query only touches the postings of the terms it
+    contains.
+    """
+
+    def __init__(self, documents, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_count = 0
+        self.postings = {}
+        self._build(documents)
+
+    def search(self, query, top_k=3):
+        """Return up to top_k (document id, score) pairs, best first"""
+        return self.search_terms(set(tokenize(query)), top_k)
+
+    def search_terms(self, terms, top_k=3):
+        """Like search, for a set of already tokenized query terms"""
+        scores = {}
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            idf, entries = posting
+            for doc_id, weight in entries:
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * weight
+
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+
+    def _build(self, documents):
+        """Tokenize documents and build postings lists with BM25 weights"""
+        term_counts = [Counter(tokenize(text)) for text in documents]
+        doc_lengths = [sum(counts.values()) for counts in term_counts]
+
+        self.doc_count = len(term_counts)
+        if not self.doc_count:
+            return
+        avg_length = (sum(doc_lengths) / self.doc_count) or 1.0
+
+        # Store the length-normalized term frequency part of BM25 per posting;
+        # the idf factor is shared by the whole list and applied at query time
+        k1_plus_1 = self.k1 + 1
+        postings = defaultdict(list)
+        for doc_id, counts in enumerate(term_counts):
+            norm = self.k1 * (1 - self.b + self.b * doc_lengths[doc_id] / avg_length)
+            for term, tf in counts.items():
+                postings[term].append((doc_id, tf * k1_plus_1 / (tf + norm)))
+
+        for term, entries in postings.items():
+            df = len(entries)
+            idf = math.log(1 + (self.doc_count - df + 0.5) / (df + 0.5))
+            self.postings[term] = (idf, entries)
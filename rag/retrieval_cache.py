@@ -0,0 +1,57 @@
+import threading
+from collections import OrderedDict
+
+class RetrievalCache:
+    """
+    Least recently used cache of retrieval results
+
+    Keys are query signatures (see Retriever), so many different queries that
+    reduce to the same terms share one entry. Safe to use from several
+    threads.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached result for key, or None"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Store value, evicting the least recently used entries beyond max_entries"""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def resize(self, max_entries):
+        """Change the capacity, evicting entries if it shrinks"""
+        with self._lock:
+            self.max_entries = max_entries
+            while len(self._entries) > max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop every entry and reset the statistics"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+# Shared by every Retriever in the process, so agents reuse each other's results
+retrieval_cache = RetrievalCache()
@@ -1,5 +1,17 @@
 import os
 import json
+import hashlib
+from collections import Counter
+from rag.bm25_index import TOKEN_PATTERN, BM25Index, tokenize
+from rag.retrieval_cache import retrieval_cache
+from utils.metrics import metrics
+
+# Technical terms that weigh more in mock retrieval
+MAINFRAME_TERMS = ["cobol", "jcl", "cics", "vsam", "db2", "ims", "mvs",
+                   "transaction", "copybook", "mainframe", "zos"]
+
+# Bound on the words whose matching knowledge base entries are remembered
+MAX_MEMO_WORDS = 100000
 
 class Retriever:
     """Retriever component for RAG system"""
@@ -10,6 +22,38 @@ class Retriever:
         
         # For the POC, we'll use a simple mock knowledge base
         self.knowledge_base = self._load_mock_knowledge_base()
+        self._contents = [entry["content"].lower() for entry in self.knowledge_base]
+        self._term_entries = {
+            term: [index for index, content in enumerate(self._contents) if term in content]
+            for term in MAINFRAME_TERMS
+        }
+        self._word_entries = {}
+        
+        # Results are memoized per query signature in a process-wide LRU
+        self.cache_size = config.get("cache_size", 1024)
+        if self.cache_size:
+            retrieval_cache.resize(self.cache_size)
+        self._cache_namespace = (self.db_type, self.db_path, config.get("bm25_k1", 1.5),
+                                 config.get("bm25_b", 0.75), config.get("dense_dim", 1024))
+        
+        # Lexical index is built once, up front, when selected
+        self.bm25_index = None
+        if self.db_type == "bm25":
+            self.bm25_index = BM25Index(
+                [entry["content"] for entry in self.knowledge_base],
+                k1=config.get("bm25_k1", 1.5),
+                b=config.get("bm25_b", 0.75)
+            )
+        
+        # Local dense store also serves "chroma" until a real client is wired in
+        self.vector_store = None
+        if self.db_type in ("dense", "chroma"):
+            from rag.vector_store import VectorStore
+            self.vector_store = VectorStore(
+                self.db_path,
+                [entry["content"] for entry in self.knowledge_base],
+                dim=config.get("dense_dim", 1024)
+            )
     
     def get_relevant_context(self, query, top_k=3):
         """
@@ -17,43 +61,90 @@ class Retriever:
         
         In a real implementation, this would query a vector database
         For the POC, we'll use simple keyword matching
+        
+        The query is first reduced to the signature that determines its
+        results, and results are memoized per signature, so thousands of
+        near-identical programs pay for ranking once.
         """
-        if self.db_type == "mock":
-            return self._mock_retrieval(query, top_k)
-        else:
-            # In a real implementation, this would use the actual vector DB
-            print("Warning: Using mock retrieval since real vector DB not implemented")
-            return self._mock_retrieval(query, top_k)
+        with metrics.span("retrieval", backend=self.db_type, query_chars=len(query)) as span:
+            signature = self._query_signature(query)
+            key = (self._cache_namespace, top_k, signature)
+            if self.cache_size:
+                cached = retrieval_cache.get(key)
+                if metrics.enabled:
+                    metrics.count("retrieval_cache", result="hit" if cached is not None else "miss")
+                if cached is not None:
+                    span.set(cache="hit")
+                    return cached
+            
+            if self.db_type == "bm25":
+                context = self._bm25_retrieval(signature, top_k)
+            elif self.vector_store is not None:
+                context = self._dense_retrieval(query, top_k)
+            else:
+                if self.db_type != "mock":
+                    # In a real implementation, this would use the actual vector DB
+                    print("Warning: Using mock retrieval since real vector DB not implemented")
+                context = self._mock_retrieval(signature, top_k)
+            
+            if self.cache_size:
+                retrieval_cache.put(key, context)
+            return context
     
-    def _mock_retrieval(self, query, top_k=3):
-        """Simple mock retrieval using keyword matching"""
+    def _query_signature(self, query):
+        """
+        Reduce a query to what its results depend on
+        
+        For BM25 that is the set of query terms in the index vocabulary; for
+        mock retrieval, the distinct words longer than 3 characters that occur
+        in the knowledge base plus the mainframe terms in the query. Dense
+        retrieval depends on every term count, so its signature is a digest
+        of them.
+        """
+        if self.vector_store is not None:
+            counts = sorted(Counter(tokenize(query)).items())
+            return hashlib.blake2b(repr(counts).encode("utf-8"), digest_size=16).hexdigest()
+        
+        # Source code repeats itself, so tokenizing the distinct words is cheaper than the whole text
         query = query.lower()
+        distinct_words = set(query.split())
+        if self.db_type == "bm25":
+            postings = self.bm25_index.postings
+            return frozenset(term for word in distinct_words for term in TOKEN_PATTERN.findall(word) if term in postings)
         
-        # Count keyword occurrences in knowledge entries
-        scored_entries = []
-        for entry in self.knowledge_base:
-            score = 0
-            content = entry["content"].lower()
-            
-            # Look for keywords from query in the content
-            for word in query.split():
-                if len(word) > 3 and word in content:  # Only consider words longer than 3 chars
-                    score += 1
-            
-            # Also check for technical terms specific to mainframes
-            mainframe_terms = ["cobol", "jcl", "cics", "vsam", "db2", "ims", "mvs", 
-                             "transaction", "copybook", "mainframe", "zos"]
-            for term in mainframe_terms:
-                if term in content and term in query:
-                    score += 3  # Give higher weight to technical terms
-            
-            if score > 0:
-                scored_entries.append((score, entry))
+        words = frozenset(word for word in distinct_words if len(word) > 3 and self._entries_containing(word))
+        terms = frozenset(term for term in MAINFRAME_TERMS if term in query)
+        return words, terms
+    
+    def _entries_containing(self, word):
+        """Indexes of the knowledge base entries that contain word, remembered per word"""
+        entries = self._word_entries.get(word)
+        if entries is None:
+            if len(self._word_entries) >= MAX_MEMO_WORDS:
+                self._word_entries.clear()
+            entries = [index for index, content in enumerate(self._contents) if word in content]
+            self._word_entries[word] = entries
+        return entries
+    
+    def _mock_retrieval(self, signature, top_k=3):
+        """
+        Simple mock retrieval using keyword matching
         
-        # Sort by score and take top_k
-        scored_entries.sort(reverse=True, key=lambda x: x[0])
+        Entries score 1 for each signature word and 3 for each mainframe
+        term they contain.
+        """
+        words, terms = signature
+        scores = [0] * len(self.knowledge_base)
+        for word in words:
+            for index in self._entries_containing(word):
+                scores[index] += 1
+        for term in terms:
+            for index in self._term_entries[term]:
+                scores[index] += 3  # Give higher weight to technical terms
         
-        # Extract just the content from the top entries
+        # Sort by score (ties keep knowledge base order) and take top_k
+        scored_entries = [(score, entry) for score, entry in zip(scores, self.knowledge_base) if score > 0]
+        scored_entries.sort(reverse=True, key=lambda x: x[0])
         results = [entry["content"] for _, entry in scored_entries[:top_k]]
         
         # Combine results into a single context string
@@ -62,6 +153,30 @@ class Retriever:
         else:
             return "No relevant context found."
     
+    def _bm25_retrieval(self, terms, top_k=3):
+        """Rank knowledge base entries with the BM25 inverted index"""
+        results = [
+            self.knowledge_base[doc_id]["content"]
+            for doc_id, _ in self.bm25_index.search_terms(terms, top_k)
+        ]
+        
+        if results:
+            return "\n\n---\n\n".join(results)
+        else:
+            return "No relevant context found."
+    
+    def _dense_retrieval(self, query, top_k=3):
+        """Rank knowledge base entries by cosine similarity in the local vector store"""
+        results = [
+            self.knowledge_base[index]["content"]
+            for index, _ in self.vector_store.search(query, top_k)
+        ]
+        
+        if results:
+            return "\n\n---\n\n".join(results)
+        else:
+            return "No relevant context found."
+    
     def _load_mock_knowledge_base(self):
         """Load a simple mock knowledge base for the POC"""
         # In a real implementation, this would be a vector database
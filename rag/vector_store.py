@@ -0,0 +1,151 @@
+import hashlib
+import json
+import math
+import os
+import tempfile
+import zlib
+from collections import Counter
+
+import numpy as np
+
+from rag.bm25_index import tokenize
+
+class HashingEmbedder:
+    """
+    Offline text embedder based on the hashing trick
+
+    Each token is hashed into one of `dim` buckets with a hash-derived sign,
+    weighted by 1 + log(tf), and the vector is L2-normalized. No model or
+    network access is needed and the output is stable across processes.
+    """
+
+    name = "hashing-v1"
+
+    def __init__(self, dim=1024):
+        self.dim = dim
+
+    def embed(self, text):
+        """Embed a single text as a float32 vector"""
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token, tf in Counter(tokenize(text)).items():
+            h = zlib.crc32(token.encode("utf-8"))
+            sign = 1.0 if h & 0x80000000 else -1.0
+            vector[h % self.dim] += sign * (1.0 + math.log(tf))
+
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector
+
+    def embed_batch(self, texts):
+        """Embed several texts into a (len(texts), dim) matrix"""
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            matrix[row] = self.embed(text)
+        return matrix
+
+class VectorStore:
+    """
+    Dense vector store kept as a memory-mapped float32 matrix on disk
+
+    The store lives under `path` as `embeddings.f32` (row-major, one row per
+    chunk) plus `meta.json`. It is rebuilt only when the chunks or the
+    embedder change; otherwise opening it maps the file without reading it
+    into memory, and the OS pages in rows as queries touch them.
+    """
+
+    def __init__(self, path, chunks, dim=1024, batch_size=1024):
+        self.path = path
+        self.embedder = HashingEmbedder(dim)
+        self.batch_size = batch_size
+        self.matrix_file = os.path.join(path, "embeddings.f32")
+        self.meta_file = os.path.join(path, "meta.json")
+
+        fingerprint = self._fingerprint(chunks)
+        if not self._is_current(fingerprint, len(chunks)):
+            self._build(chunks, fingerprint)
+
+        self.count = len(chunks)
+        if self.count:
+            self.matrix = np.memmap(self.matrix_file, dtype=np.float32, mode="r",
+                                    shape=(self.count, dim))
+        else:
+            self.matrix = np.zeros((0, dim), dtype=np.float32)
+
+    def search(self, query, top_k=3):
+        """Return up to top_k (chunk index, score) pairs for one query"""
+        return self.search_batch([query], top_k)[0]
+
+    def search_batch(self, queries, top_k=3):
+        """Answer several queries with a single matrix product"""
+        if not self.count or not queries:
+            return [[] for _ in queries]
+
+        query_matrix = self.embedder.embed_batch(queries)
+        scores = self.matrix @ query_matrix.T  # (chunks, queries)
+        k = min(top_k, self.count)
+
+        results = []
+        for column in range(scores.shape[1]):
+            column_scores = scores[:, column]
+            candidates = np.argpartition(-column_scores, k - 1)[:k]
+            ranked = candidates[np.argsort(-column_scores[candidates])]
+            results.append([
+                (int(index), float(column_scores[index]))
+                for index in ranked
+                if column_scores[index] > 0
+            ])
+        return results
+
+    def _fingerprint(self, chunks):
+        """Hash of the chunk texts and embedder settings"""
+        digest = hashlib.sha256(f"{self.embedder.name}:{self.embedder.dim}".encode("utf-8"))
+        for chunk in chunks:
+            digest.update(chunk.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _is_current(self, fingerprint, count):
+        """Check whether the store on disk matches the given chunks"""
+        try:
+            with open(self.meta_file, 'r') as f:
+                meta = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return False
+
+        expected_size = count * self.embedder.dim * 4
+        return (
+            meta.get("fingerprint") == fingerprint
+            and meta.get("count") == count
+            and os.path.exists(self.matrix_file)
+            and os.path.getsize(self.matrix_file) == expected_size
+        )
+
+    def _build(self, chunks, fingerprint):
+        """Embed all chunks in batches straight into a new memory-mapped file"""
+        os.makedirs(self.path, exist_ok=True)
+        print(f"Building vector store in {self.path} ({len(chunks)} chunks)...")
+
+        # Queue workers may build the same store at once; each writes its own
+        # temporary files and the last complete one wins
+        fd, tmp_file = tempfile.mkstemp(dir=self.path, prefix="embeddings.", suffix=".tmp")
+        os.close(fd)
+        if chunks:
+            matrix = np.memmap(tmp_file, dtype=np.float32, mode="w+",
+                               shape=(len(chunks), self.embedder.dim))
+            for start in range(0, len(chunks), self.batch_size):
+                batch = chunks[start:start + self.batch_size]
+                matrix[start:start + len(batch)] = self.embedder.embed_batch(batch)
+            matrix.flush()
+            del matrix
+        os.replace(tmp_file, self.matrix_file)
+
+        fd, tmp_meta = tempfile.mkstemp(dir=self.path, prefix="meta.", suffix=".tmp")
+        with os.fdopen(fd, 'w') as f:
+            json.dump({
+                "embedder": self.embedder.name,
+                "dim": self.embedder.dim,
+                "count": len(chunks),
+                "fingerprint": fingerprint
+            }, f, indent=2)
+        os.replace(tmp_meta, self.meta_file)
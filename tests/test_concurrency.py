@@ -0,0 +1,65 @@
+import asyncio
+import time
+import pytest
+from utils.concurrency import map_ordered, map_ordered_async
+
+async def double(item):
+    await asyncio.sleep(0.001 * (item % 3))
+    return item * 2
+
+def test_map_ordered_keeps_input_order():
+    assert list(map_ordered(lambda item: item * 2, range(50), workers=4)) == [item * 2 for item in range(50)]
+
+def test_map_ordered_async_keeps_input_order():
+    assert list(map_ordered_async(double, range(50), limit=4)) == [item * 2 for item in range(50)]
+
+def test_slow_producer_does_not_block_the_loop():
+    ticks = {}
+
+    def items():
+        for item in range(3):
+            time.sleep(0.3)  # discovery and reading block
+            yield item
+
+    async def tick(item):
+        # The first task finishes early, so the next item is pulled while
+        # the second is still running
+        for _ in range(5 if item == 0 else 30):
+            ticks.setdefault(item, []).append(time.monotonic())
+            await asyncio.sleep(0.02)
+        return item
+
+    assert list(map_ordered_async(tick, items(), limit=2)) == [0, 1, 2]
+    # No task stalls while the producer sleeps
+    assert max(later - earlier for times in ticks.values() for earlier, later in zip(times, times[1:])) < 0.2
+
+def test_closing_early_cancels_running_tasks():
+    cancelled = []
+
+    async def slow(item):
+        try:
+            await asyncio.sleep(0 if item < 2 else 10)
+        except asyncio.CancelledError:
+            cancelled.append(item)
+            raise
+        return item
+
+    results = map_ordered_async(slow, range(10), limit=5)
+    assert [next(results), next(results)] == [0, 1]
+    results.close()
+    assert cancelled
+
+def test_errors_reach_the_consumer():
+    async def fail(item):
+        if item == 3:
+            raise ValueError("bad item")
+        return item
+
+    def broken():
+        yield 1
+        raise KeyError("discovery failed")
+
+    with pytest.raises(ValueError):
+        list(map_ordered_async(fail, range(10), limit=2))
+    with pytest.raises(KeyError):
+        list(map_ordered_async(fail, broken(), limit=2))
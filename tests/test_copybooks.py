@@ -0,0 +1,67 @@
+import threading
+import time
+from utils.copybooks import CopybookLibrary
+from utils.source_reader import SourceReader
+
+CUSTOMER = "       01 CUSTOMER.\n          05 CUST-ID PIC 9(6).\n          05 CUST-NAME PIC X(30).\n"
+
+class SlowReader(SourceReader):
+    """Reads one copybook slowly, to hold its load open"""
+
+    def __init__(self, slow_name, delay):
+        super().__init__()
+        self.slow_name = slow_name
+        self.delay = delay
+
+    def read(self, path):
+        if path.endswith(self.slow_name):
+            time.sleep(self.delay)
+        return super().read(path)
+
+def write_copybooks(tmp_path, copybooks):
+    for name, text in copybooks.items():
+        (tmp_path / f"{name}.cpy").write_text(text)
+    return str(tmp_path)
+
+def test_identical_members_share_the_parse_but_keep_their_names(tmp_path):
+    directory = write_copybooks(tmp_path, {"CUSTREC": CUSTOMER, "CUSTCOPY": CUSTOMER})
+    library = CopybookLibrary([directory])
+    first, second = library.get("CUSTREC"), library.get("CUSTCOPY")
+    assert (first.name, second.name) == ("CUSTREC", "CUSTCOPY")
+    assert first.path.endswith("CUSTREC.cpy") and second.path.endswith("CUSTCOPY.cpy")
+    assert second.fields is first.fields
+    assert library.stats() == {"reads": 2, "parses": 1, "missing": 0}
+    assert library.get("CUSTCOPY") is second
+
+def test_slow_copybook_only_holds_up_its_own_readers(tmp_path):
+    directory = write_copybooks(tmp_path, {"SLOW": CUSTOMER, "FAST": CUSTOMER.replace("CUSTOMER", "OTHER")})
+    library = CopybookLibrary([directory], reader=SlowReader("SLOW.cpy", 0.5))
+    results = {}
+
+    def load(key, name):
+        results[key] = library.get(name)
+
+    slow = [threading.Thread(target=load, args=(key, "SLOW")) for key in ("slow1", "slow2")]
+    for thread in slow:
+        thread.start()
+    time.sleep(0.05)
+    start = time.monotonic()
+    load("fast", "FAST")
+    assert time.monotonic() - start < 0.3
+    for thread in slow:
+        thread.join()
+    assert results["slow1"] is results["slow2"]
+    assert library.stats()["reads"] == 2
+
+def test_self_copying_copybook_does_not_hang(tmp_path):
+    directory = write_copybooks(tmp_path, {"LOOP": "       01 LOOP-REC.\n           COPY LOOP.\n"})
+    library = CopybookLibrary([directory])
+    assert library.get("LOOP").name == "LOOP"
+
+def test_expand_lines_inserts_copybook_text(tmp_path):
+    directory = write_copybooks(tmp_path, {"CUSTREC": CUSTOMER})
+    library = CopybookLibrary([directory])
+    lines = library.expand_lines(["WORKING-STORAGE SECTION.", "COPY CUSTREC", "REPLACING ==CUST-ID== BY ==WS-ID==.", "X."])
+    assert lines[1].split("\n")[0] == "01 CUSTOMER."
+    assert "05 WS-ID PIC 9(6)." in lines[1]
+    assert lines[2] is None and lines[3] == "X."
@@ -0,0 +1,134 @@
+import json
+import os
+import numpy as np
+from utils.copybooks import record_roots, source_layout
+from utils.data_converter import DataConverter, layout_columns
+
+LAYOUT = """       01 CUSTOMER-REC.
+          05 NAME   PIC X(10).
+          05 AMT    PIC S9(5)V99.
+          05 BAL    PIC S9(7)V99 COMP-3.
+          05 CNT    PIC S9(4) COMP.
+          05 BIG    PIC S9(19)V99 COMP-3.
+          05 RATE   PIC VPP99.
+          05 HUND   PIC 99PP.
+          05 U64    PIC 9(18) COMP.
+"""
+LRECL = 47
+HEADER = "NAME,AMT,BAL,CNT,BIG,RATE,HUND,U64\n"
+
+def zoned(value, digits, signed=True):
+    text = str(abs(value)).zfill(digits).encode("cp037")
+    sign = (0xD0 if value < 0 else 0xC0) if signed else 0xF0
+    return text[:-1] + bytes([sign | (text[-1] & 0x0F)])
+
+def packed(value, length):
+    nibbles = str(abs(value)).zfill(length * 2 - 1) + ("D" if value < 0 else "C")
+    return bytes.fromhex(nibbles)
+
+def record(name, amt, bal, cnt, big, rate, hund, u64):
+    data = (name.ljust(10).encode("cp037") + zoned(amt, 7) + packed(bal, 5) + cnt.to_bytes(2, "big", signed=True)
+            + packed(big, 11) + zoned(rate, 2, False) + zoned(hund, 2, False) + u64.to_bytes(8, "big"))
+    assert len(data) == LRECL
+    return data
+
+RECORDS = [
+    record("ALICE", 1234567, -123456789, -42, -1234567890123456789, 42, 12, 18446744073709551615),
+    record("BOB", -7, 5, 32767, 100000000000000000000, 0, 0, 12345),
+]
+EXPECTED = [
+    '"ALICE",12345.67,-1234567.89,-42,-12345678901234567.89,0.0042,1200,18446744073709551615\n',
+    '"BOB",-0.07,0.05,32767,1000000000000000000.00,0.0000,0,12345\n',
+]
+
+def converter():
+    columns = layout_columns(record_roots(source_layout(LAYOUT, "CUSTOMER.cpy")))
+    return DataConverter(columns, LRECL)
+
+def write_dataset(tmp_path, records):
+    path = tmp_path / "CUST.dat"
+    path.write_bytes(b"".join(records))
+    return str(path)
+
+def test_columns_from_layout():
+    columns = {column.name: column for column in converter().columns}
+    assert (columns["RATE"].digits, columns["RATE"].scale) == (2, 4)
+    assert (columns["HUND"].digits, columns["HUND"].scale) == (2, -2)
+    assert columns["CNT"].digits == 5
+    assert columns["BIG"].wide and columns["U64"].wide and not columns["BAL"].wide
+
+def test_csv_matches_hand_built_records(tmp_path):
+    output = str(tmp_path / "out.csv")
+    result = converter().convert(write_dataset(tmp_path, RECORDS), output)
+    assert result["records"] == 2
+    with open(output) as f:
+        assert f.read() == HEADER + "".join(EXPECTED)
+
+def test_csv_slow_path_matches_fast_path(tmp_path):
+    # A quote in a text value sends the batch through the row by row path
+    records = [record('A"B', 1234567, -123456789, -42, -1234567890123456789, 42, 12, 18446744073709551615)]
+    output = str(tmp_path / "out.csv")
+    converter().convert(write_dataset(tmp_path, records), output)
+    with open(output) as f:
+        assert f.read() == HEADER + '"A""B"' + EXPECTED[0][len('"ALICE"'):]
+
+def test_invalid_values_are_empty(tmp_path):
+    broken = bytearray(RECORDS[0])
+    broken[10] = 0x4B  # a non-digit in AMT
+    output = str(tmp_path / "out.csv")
+    result = converter().convert(write_dataset(tmp_path, [bytes(broken)]), output)
+    assert result["invalid_values"] == {"AMT": 1}
+    with open(output) as f:
+        assert f.read().splitlines()[1].split(",")[1] == ""
+
+def test_columnar_values_are_unscaled(tmp_path):
+    output = str(tmp_path / "out")
+    converter().convert(write_dataset(tmp_path, RECORDS), output, "columnar")
+    with open(os.path.join(output, "schema.json")) as f:
+        schema = {column["name"]: column for column in json.load(f)["columns"]}
+    assert schema["AMT"]["scale"] == 2 and schema["HUND"]["scale"] == -2
+    assert np.load(os.path.join(output, "AMT.npy")).tolist() == [1234567, -7]
+    wide = lambda name: [int(value["high"]) * 10 ** 18 + int(value["low"])
+                         for value in np.load(os.path.join(output, f"{name}.npy"))]
+    assert wide("BIG") == [-1234567890123456789, 100000000000000000000]
+    assert wide("U64") == [18446744073709551615, 12345]
+
+def test_parallel_ranges_match_single_process(tmp_path):
+    dataset = write_dataset(tmp_path, RECORDS * 50)
+    single, parallel = str(tmp_path / "single.csv"), str(tmp_path / "parallel.csv")
+    small_batches = DataConverter(converter().columns, LRECL, batch_bytes=LRECL * 7)
+    small_batches.convert(dataset, single, workers=1)
+    small_batches.convert(dataset, parallel, workers=3)
+    with open(single) as a, open(parallel) as b:
+        assert a.read() == b.read() == HEADER + "".join(EXPECTED) * 50
+
+def test_empty_dataset(tmp_path):
+    dataset = write_dataset(tmp_path, [])
+    output = str(tmp_path / "out.csv")
+    assert converter().convert(dataset, output, workers=4)["records"] == 0
+    with open(output) as f:
+        assert f.read() == HEADER
+    columnar = str(tmp_path / "columns")
+    assert converter().convert(dataset, columnar, "columnar")["records"] == 0
+    assert np.load(os.path.join(columnar, "AMT.npy")).shape == (0,)
+
+def test_dataset_shorter_than_a_record(tmp_path):
+    output = str(tmp_path / "out.csv")
+    assert converter().convert(write_dataset(tmp_path, [RECORDS[0][:20]]), output)["records"] == 0
+
+def test_directory_keeps_files_with_one_stem_apart(tmp_path):
+    from agents.convert_agent import ConvertAgent
+    from utils.config import default_config
+    layout = tmp_path / "CUSTOMER.cpy"
+    layout.write_text(LAYOUT)
+    source = tmp_path / "data"
+    source.mkdir()
+    (source / "CUST.dat").write_bytes(RECORDS[0])
+    (source / "CUST.bak").write_bytes(RECORDS[1])
+    (source / "EMPTY.dat").write_bytes(b"")
+    output = tmp_path / "converted"
+    result = ConvertAgent(default_config()).process(str(source), str(output), layout=str(layout))
+    assert result["status"] == "success" and result["records"] == 2
+    assert (output / "CUST.dat.csv").read_text() == HEADER + EXPECTED[0]
+    assert (output / "CUST.bak.csv").read_text() == HEADER + EXPECTED[1]
+    assert (output / "EMPTY.dat.csv").read_text() == HEADER
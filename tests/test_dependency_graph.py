@@ -0,0 +1,40 @@
+import os
+from utils.dependency_graph import DependencyGraph
+
+STATIC_DEPENDENCIES = {
+    "src/MAIN.cbl": [{"type": "program", "name": "SUB"}, {"type": "copybook", "name": "CUSTREC"},
+                     {"type": "file", "name": "CUSTFILE"}],
+    "src/SUB.cbl": [{"type": "db2_table", "name": "ACCOUNTS"}, {"type": "cics_map", "name": "SUBMAP"}],
+    "src/CUSTREC.cpy": [],
+    "src/REPORT.cbl": [{"type": "dataset", "name": "CUSTFILE"}, {"type": "cics_transaction", "name": "TX01"}],
+    "src/A.cbl": [{"type": "program", "name": "B"}],
+    "src/B.cbl": [{"type": "program", "name": "A"}],
+}
+
+def graph():
+    return DependencyGraph.from_static_dependencies(STATIC_DEPENDENCIES)
+
+def test_data_dependencies_do_not_raise_levels():
+    levels = graph().file_levels()
+    level = lambda name: levels[os.path.abspath(f"src/{name}")]
+    assert level("SUB.cbl") == level("REPORT.cbl") == level("CUSTREC.cpy") == 0
+    assert level("MAIN.cbl") == 1
+    # A call cycle shares one level
+    assert level("A.cbl") == level("B.cbl") == 0
+
+def test_find_by_name_across_kinds():
+    dependencies = dict(STATIC_DEPENDENCIES, **{"src/X.cbl": [{"type": "program", "name": "CUSTFILE"}]})
+    loaded = DependencyGraph.from_static_dependencies(dependencies)
+    kinds = sorted(loaded.kinds[node] for node in loaded.find("custfile"))
+    assert kinds == ["dataset", "program"]
+    assert [loaded.kinds[node] for node in loaded.find("CUSTFILE", "dataset")] == ["dataset"]
+    assert loaded.find("NOSUCH") == []
+
+def test_save_and_load_keep_the_graph(tmp_path):
+    original = graph()
+    path = str(tmp_path / "graph.json")
+    original.save(path)
+    loaded = DependencyGraph.load(path)
+    assert loaded.file_levels() == original.file_levels()
+    assert loaded.find("SUB") == original.find("SUB")
+    assert loaded.callers("SUB") == ["MAIN"]
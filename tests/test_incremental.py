@@ -0,0 +1,20 @@
+from agents.documentation_agent import DocumentationAgent
+from utils.config import default_config
+
+PROGRAM = "       IDENTIFICATION DIVISION.\n       PROGRAM-ID. HELLO.\n       PROCEDURE DIVISION.\n           STOP RUN.\n"
+
+def test_up_to_date_run_creates_no_llm_client(tmp_path):
+    config = default_config()
+    config["llm"]["cache_path"] = str(tmp_path / "cache.db")
+    config["vector_db"]["path"] = str(tmp_path / "vector_store")
+    config["site"]["enabled"] = False
+    source = tmp_path / "src"
+    source.mkdir()
+    (source / "HELLO.cbl").write_text(PROGRAM)
+    output = str(tmp_path / "docs")
+
+    assert DocumentationAgent(config).process(str(source), output)["files_skipped"] == 0
+    agent = DocumentationAgent(config)
+    result = agent.process(str(source), output)
+    assert result["files_skipped"] == 1
+    assert agent._llm is None and agent._retriever is None
@@ -0,0 +1,157 @@
+import os
+from utils.job_queue import JobQueue, run_worker
+
+def make_queue(tmp_path, **kwargs):
+    kwargs.setdefault("retry_delay", 0)
+    return JobQueue(str(tmp_path / "jobs.db"), **kwargs)
+
+def test_enqueue_is_idempotent_within_a_wave(tmp_path):
+    queue = make_queue(tmp_path)
+    tasks = [("a.cbl", "out", 0, {}), ("b.cbl", "out", 0, {})]
+    assert queue.enqueue("analyze", tasks) == 2
+    assert queue.enqueue("analyze", tasks) == 0
+    assert queue.enqueue("analyze", tasks, wave="second") == 2
+    assert queue.stats() == {"queued": 4, "leased": 0, "done": 0, "dead": 0}
+    job = queue.lease("worker", 60)
+    assert job["source"] == os.path.abspath("a.cbl")
+    assert job["output"] == os.path.abspath("out")
+    queue.close()
+
+def test_task_options_override_queue_options(tmp_path):
+    queue = make_queue(tmp_path)
+    queue.enqueue("document", [("a.cbl", None, 0, {"root": "/src"})], options={"root": "/", "x": 1})
+    job = queue.lease("worker", 60)
+    assert job["output"] is None
+    assert job["options"] == {"root": "/src", "x": 1}
+    queue.close()
+
+def test_lease_then_complete(tmp_path):
+    queue = make_queue(tmp_path)
+    queue.enqueue("analyze", [("a.cbl", "out", 0, {})])
+    job = queue.lease("worker", 60)
+    assert job["attempt"] == 1
+    assert queue.lease("other", 60) is None
+    assert queue.heartbeat(job["id"], "worker", 60)
+    assert queue.complete(job["id"], "worker", {"status": "success"})
+    assert queue.stats()["done"] == 1
+    assert queue.lease("worker", 60) is None
+    queue.close()
+
+def test_lost_lease_is_not_recorded(tmp_path):
+    queue = make_queue(tmp_path)
+    queue.enqueue("analyze", [("a.cbl", "out", 0, {})])
+    job = queue.lease("worker", -1)
+    # The lease has expired, so another worker takes the job over
+    again = queue.lease("other", 60)
+    assert again["id"] == job["id"] and again["attempt"] == 2
+    assert not queue.heartbeat(job["id"], "worker", 60)
+    assert not queue.complete(job["id"], "worker", {})
+    assert not queue.fail(job["id"], "worker", "boom")
+    assert queue.complete(job["id"], "other", {})
+    queue.close()
+
+def test_failed_job_is_retried_after_backoff(tmp_path):
+    queue = make_queue(tmp_path, retry_delay=60)
+    queue.enqueue("analyze", [("a.cbl", "out", 0, {})])
+    job = queue.lease("worker", 60)
+    assert queue.fail(job["id"], "worker", "boom")
+    assert queue.stats()["queued"] == 1
+    # Still backing off
+    assert queue.lease("worker", 60) is None
+    queue.close()
+
+def test_failures_become_dead_letters_after_max_attempts(tmp_path):
+    queue = make_queue(tmp_path, max_attempts=2)
+    queue.enqueue("analyze", [("a.cbl", "out", 0, {})])
+    for attempt in (1, 2):
+        job = queue.lease("worker", 60)
+        assert job["attempt"] == attempt
+        assert queue.fail(job["id"], "worker", f"failure {attempt}")
+    assert queue.stats() == {"queued": 0, "leased": 0, "done": 0, "dead": 1}
+    assert queue.lease("worker", 60) is None
+
+    assert queue.retry_dead() == 1
+    job = queue.lease("worker", 60)
+    assert job["attempt"] == 1
+    queue.close()
+
+def test_expired_last_lease_becomes_a_dead_letter(tmp_path):
+    queue = make_queue(tmp_path, max_attempts=1)
+    queue.enqueue("analyze", [("a.cbl", "out", 0, {})])
+    assert queue.lease("worker", -1) is not None
+    assert queue.lease("other", 60) is None
+    assert queue.stats()["dead"] == 1
+    queue.close()
+
+def test_retry_dead_by_wave(tmp_path):
+    queue = make_queue(tmp_path, max_attempts=1)
+    queue.enqueue("analyze", [("a.cbl", "out", 0, {})], wave="one")
+    queue.enqueue("analyze", [("a.cbl", "out", 0, {})], wave="two")
+    for _ in range(2):
+        job = queue.lease("worker", 60)
+        queue.fail(job["id"], "worker", "boom")
+    assert queue.retry_dead("one") == 1
+    assert queue.stats("one")["queued"] == 1
+    assert queue.stats("two")["dead"] == 1
+    queue.close()
+
+def test_higher_levels_wait_for_lower_levels(tmp_path):
+    queue = make_queue(tmp_path, max_attempts=1)
+    queue.enqueue("transform", [("main.cbl", "out", 1, {}), ("leaf.cbl", "out", 0, {}),
+                                ("copy.cpy", "out", 0, {})])
+    first = queue.lease("worker", 60)
+    second = queue.lease("worker", 60)
+    assert {first["source"], second["source"]} == {os.path.abspath("leaf.cbl"), os.path.abspath("copy.cpy")}
+    assert queue.lease("worker", 60) is None
+    queue.complete(first["id"], "worker", {})
+    assert queue.lease("worker", 60) is None
+    # Dead letters don't hold later levels back
+    queue.fail(second["id"], "worker", "boom")
+    assert queue.lease("worker", 60)["source"] == os.path.abspath("main.cbl")
+    queue.close()
+
+def test_levels_are_gated_per_wave(tmp_path):
+    queue = make_queue(tmp_path)
+    queue.enqueue("transform", [("leaf.cbl", "out", 0, {})], wave="one")
+    queue.enqueue("transform", [("main.cbl", "out", 1, {})], wave="two")
+    assert queue.lease("worker", 60)["source"] == os.path.abspath("leaf.cbl")
+    assert queue.lease("worker", 60)["source"] == os.path.abspath("main.cbl")
+    queue.close()
+
+class FakeAgent:
+    def __init__(self, calls):
+        self.calls = calls
+
+    def process(self, source, output=None, **options):
+        self.calls.append((source, output, options))
+        if source.endswith("bad.cbl"):
+            return {"error": "cannot parse"}
+        if source.endswith("crash.cbl"):
+            raise RuntimeError("agent crashed")
+        return {"status": "success"}
+
+def test_run_worker_drains_the_queue(tmp_path):
+    queue = make_queue(tmp_path, max_attempts=2)
+    queue.enqueue("analyze", [("good.cbl", "out", 0, {"flag": True}), ("bad.cbl", "out", 0, {}),
+                              ("crash.cbl", "out", 0, {})])
+    calls = []
+    modes = []
+
+    def create_agent(mode):
+        modes.append(mode)
+        return FakeAgent(calls)
+
+    counts = run_worker(queue, create_agent, heartbeat_interval=60, poll_interval=0.01)
+    assert counts == {"completed": 1, "failed": 4}
+    assert set(modes) == {"analyze"}
+    assert (os.path.abspath("good.cbl"), os.path.abspath("out"), {"flag": True}) in calls
+    assert queue.stats() == {"queued": 0, "leased": 0, "done": 1, "dead": 2}
+    queue.close()
+
+def test_run_worker_stops_after_max_jobs(tmp_path):
+    queue = make_queue(tmp_path)
+    queue.enqueue("analyze", [(f"{index}.cbl", "out", 0, {}) for index in range(3)])
+    counts = run_worker(queue, lambda mode: FakeAgent([]), heartbeat_interval=60, max_jobs=2)
+    assert counts == {"completed": 2, "failed": 0}
+    assert queue.stats()["queued"] == 1
+    queue.close()
@@ -0,0 +1,24 @@
+from llm.response_cache import ResponseCache
+
+def test_limit_holds_across_instances_sharing_a_database(tmp_path):
+    path = str(tmp_path / "cache.db")
+    first = ResponseCache(path, max_bytes=1000)
+    second = ResponseCache(path, max_bytes=1000)
+    for index in range(20):
+        cache = first if index % 2 else second
+        cache.put(f"key{index}", "x" * 100)
+        assert cache.stats()["bytes"] <= 1000
+    assert first.stats()["bytes"] == second.stats()["bytes"]
+    # The most recent entries survive eviction, whichever instance wrote them
+    assert first.get("key19") == "x" * 100
+    assert second.get("key18") == "x" * 100
+    assert first.get("key0") is None
+    first.close()
+    second.close()
+
+def test_replacing_an_entry_counts_its_new_size(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.db"), max_bytes=1000)
+    cache.put("key", "x" * 300)
+    cache.put("key", "x" * 50)
+    assert cache.stats()["bytes"] == 50
+    cache.close()
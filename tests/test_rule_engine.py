@@ -0,0 +1,101 @@
+import os
+import re
+import yaml
+from utils.compaction import join_lines
+from utils.rule_engine import RuleEngine, required_literal
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RULES_FILE = os.path.join(ROOT, "transformation_rules.yaml")
+
+SOURCE = """       IDENTIFICATION DIVISION.
+       PROGRAM-ID. CUSTUPDT.
+       DATA DIVISION.
+       WORKING-STORAGE SECTION.
+       01 WS-NAME PIC X(30).
+       01 WS-AMOUNT PIC 9(7)V9(2).
+       PROCEDURE DIVISION.
+       MAIN-PARA.
+           OPEN INPUT CUSTFILE
+           MOVE WS-A
+               TO WS-B.
+           PERFORM
+               PARA-1.
+           PERFORM UNTIL WS-EOF = 'Y'
+               IF WS-AMOUNT > 0
+                   MOVE WS-AMOUNT TO WS-TOTAL
+               ELSE
+                   PERFORM PARA-2
+               END-IF
+           END-PERFORM
+           CLOSE CUSTFILE
+           STOP RUN.
+"""
+
+def load_rules():
+    with open(RULES_FILE) as f:
+        return yaml.safe_load(f)["simple_rules"]
+
+def apply_re_sub(rules, code):
+    for rule in rules:
+        code = re.sub(rule["pattern"], rule["replacement"], code)
+    return code
+
+def keyword_rules(count):
+    """A rule set large enough for the trie prefilter, with overlapping keywords"""
+    rules = [{"pattern": f"KEY{index}\\s+(\\w+)", "replacement": f"key{index}(\\1)"} for index in range(count)]
+    rules += [{"pattern": "END-IF", "replacement": "}"}, {"pattern": "IF\\s+(\\S+)", "replacement": "if (\\1)"}]
+    return rules
+
+def test_required_literal():
+    assert required_literal("MOVE\\s+(\\S+)") == "MOVE"
+    assert required_literal("END\\-IF") == "END-IF"
+    assert required_literal("PERFORM|CALL") is None
+    assert required_literal("(MOVE)") is None
+    assert required_literal("AB*C") == "A"
+
+def test_apply_matches_re_sub():
+    rules = load_rules()
+    assert RuleEngine(rules).apply(SOURCE) == apply_re_sub(rules, SOURCE)
+
+def test_apply_matches_re_sub_with_scanner():
+    rules = keyword_rules(100)
+    code = "KEY1 A KEY12 B\nKEY99\n  C END-IF IF X KEY100 D\n"
+    assert RuleEngine(rules).apply(code) == apply_re_sub(rules, code)
+
+def test_apply_lines_matches_apply():
+    rules = load_rules()
+    engine = RuleEngine(rules)
+    lines = [line.strip() for line in SOURCE.splitlines()]
+    lines[2] = None
+    lines[6] = None
+    result = engine.apply_lines(lines)
+    assert len(result) == len(lines)
+    assert "\n".join(line for line in result if line is not None) == \
+        engine.apply("\n".join(line for line in lines if line is not None))
+
+def test_apply_lines_keeps_matches_across_lines():
+    engine = RuleEngine([{"pattern": "MOVE\\s+(\\S+)\\s+TO\\s+(\\S+)", "replacement": "\\2 = \\1;"}])
+    assert engine.apply_lines(["MOVE WS-A", None, "TO WS-B.", "DISPLAY X"]) == \
+        ["WS-B. = WS-A;", None, None, "DISPLAY X"]
+
+def test_apply_lines_keeps_inserted_lines_in_their_slot():
+    engine = RuleEngine([{"pattern": "STOP RUN", "replacement": "// End of program\n}"}])
+    assert engine.apply_lines(["A", "STOP RUN.", "B"]) == ["A", "// End of program\n}.", "B"]
+
+def test_transform_prompt_applies_rules_to_split_statements():
+    from agents.transformation_agent import TransformationAgent
+    from utils.config import default_config
+    config = default_config()
+    config["agents"]["transform"]["rules_file"] = RULES_FILE
+    config["compaction"]["enabled"] = True
+    agent = TransformationAgent(config)
+    code = ("       PROCEDURE DIVISION.\n"
+            "           MOVE WS-A\n"
+            "               TO WS-B.\n"
+            "           PERFORM\n"
+            "               PARA-1.\n")
+    text, lines = agent._prompt_lines(code, "SPLIT.cbl")
+    assert "WS-B. = WS-A;" in text
+    assert "PARA-1.();" in text
+    assert len(lines) == len(code.splitlines())
+    assert text == join_lines(lines)
@@ -0,0 +1,159 @@
+import os
+import re
+from utils.tokens import estimate_tokens
+
+# COBOL structural boundaries, matched against the text after the
+# sequence and indicator areas (column 8 onwards in fixed format)
+DIVISION_PATTERN = re.compile(r"^\s*([A-Z-]+\s+DIVISION)\b", re.IGNORECASE)
+SECTION_PATTERN = re.compile(r"^\s*([A-Z0-9-]+\s+SECTION)\s*\.", re.IGNORECASE)
+# Paragraph names start in Area A (columns 8-11) and stand alone on the line
+PARAGRAPH_PATTERN = re.compile(r"^ {0,3}([A-Z0-9][A-Z0-9-]*)\s*\.\s*$", re.IGNORECASE)
+# Fixed-format sequence area: six digits or blanks
+SEQUENCE_AREA = re.compile(r"^[0-9 ]{6}")
+# A numbered sequence area; such sources carry an identification area in columns 73-80
+SEQUENCE_NUMBER = re.compile(r"^[0-9]{6}")
+
+# JCL steps start with //name EXEC
+JCL_STEP_PATTERN = re.compile(r"^//(\S*)\s+EXEC\s", re.IGNORECASE)
+
+# Single-word statements that look like paragraph names but are not
+COBOL_STATEMENTS = {"EXIT", "GOBACK", "CONTINUE", "ELSE", "END-IF", "END-PERFORM",
+                    "END-READ", "END-EVALUATE", "END-EXEC"}
+
+class Chunk:
+    """A contiguous slice of a source file"""
+
+    def __init__(self, text, start_line, end_line, label):
+        self.text = text
+        self.start_line = start_line
+        self.end_line = end_line
+        self.label = label
+
+    def header(self, index, total, file_path=None):
+        """Describe where this chunk sits in its file, for prompts and merged output"""
+        name = os.path.basename(file_path) if file_path else "source"
+        return f"Part {index} of {total} of {name}: {self.label} (lines {self.start_line}-{self.end_line})"
+
+def has_identification_area(lines):
+    """
+    Whether columns 73-80 of fixed-format COBOL lines are an identification area
+
+    That is the case when the sequence area is numbered, or when no line has
+    anything past column 72. Otherwise the source was edited without the
+    column limits, and code past column 72 is kept.
+    """
+    reaches_past = False
+    for line in lines:
+        if line is None:
+            continue
+        if SEQUENCE_NUMBER.match(line):
+            return True
+        if not reaches_past and len(line) > 72 and line[72:].strip():
+            reaches_past = True
+    return not reaches_past
+
+def code_area(line, identification=True):
+    """Code of a fixed-format line: columns 8-72, or everything from column 8 without an identification area"""
+    return line[7:72] if identification else line[7:]
+
+def is_jcl(code, file_path=None):
+    """Detect JCL by extension or by a leading // statement"""
+    if file_path and os.path.splitext(file_path)[1].lower() in (".jcl", ".proc"):
+        return True
+    for line in code.splitlines():
+        if line.strip():
+            return line.startswith("//")
+    return False
+
+def split_source(code, max_tokens, file_path=None):
+    """
+    Split COBOL or JCL into chunks of at most max_tokens (estimated)
+
+    COBOL is cut at DIVISION, SECTION and paragraph boundaries and JCL at
+    EXEC steps. Consecutive segments are packed together until the budget is
+    reached; a single segment larger than the budget is split by lines.
+    """
+    lines = code.splitlines(keepends=True)
+    if not lines:
+        return []
+
+    boundaries = _jcl_boundaries(lines) if is_jcl(code, file_path) else _cobol_boundaries(lines)
+    if not boundaries or boundaries[0][0] != 0:
+        boundaries.insert(0, (0, "Preamble"))
+
+    segments = []
+    for i, (start, label) in enumerate(boundaries):
+        end = boundaries[i + 1][0] if i + 1 < len(boundaries) else len(lines)
+        segments.extend(_split_by_lines(lines, start, end, label, max_tokens))
+
+    chunks = []
+    current = []
+    current_tokens = 0
+    for start, end, label, tokens in segments:
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append(_make_chunk(lines, current))
+            current = []
+            current_tokens = 0
+        current.append((start, end, label))
+        current_tokens += tokens
+    if current:
+        chunks.append(_make_chunk(lines, current))
+
+    return chunks
+
+def _cobol_boundaries(lines):
+    """Line indexes where a DIVISION, SECTION or paragraph begins"""
+    boundaries = []
+    identification = has_identification_area(line.rstrip("\r\n") for line in lines)
+    for index, line in enumerate(lines):
+        line = line.rstrip("\r\n")
+        if len(line) > 6 and SEQUENCE_AREA.match(line):
+            if line[6] in "*/":
+                continue  # comment line
+            content = code_area(line, identification)
+        else:
+            content = line
+
+        match = DIVISION_PATTERN.match(content) or SECTION_PATTERN.match(content)
+        if match:
+            boundaries.append((index, " ".join(match.group(1).upper().split())))
+            continue
+
+        match = PARAGRAPH_PATTERN.match(content)
+        if match and match.group(1).upper() not in COBOL_STATEMENTS:
+            boundaries.append((index, match.group(1).upper()))
+    return boundaries
+
+def _jcl_boundaries(lines):
+    """Line indexes where a JCL step begins"""
+    boundaries = []
+    for index, line in enumerate(lines):
+        match = JCL_STEP_PATTERN.match(line)
+        if match and not line.startswith("//*"):
+            boundaries.append((index, f"Step {match.group(1) or index + 1}"))
+    return boundaries
+
+def _split_by_lines(lines, start, end, label, max_tokens):
+    """Return (start, end, label, tokens) pieces of a segment that each fit the budget"""
+    pieces = []
+    piece_start = start
+    piece_tokens = 0
+    for index in range(start, end):
+        tokens = estimate_tokens(lines[index])
+        if index > piece_start and piece_tokens + tokens > max_tokens:
+            pieces.append((piece_start, index, label, piece_tokens))
+            piece_start = index
+            piece_tokens = 0
+        piece_tokens += tokens
+    if piece_start < end:
+        pieces.append((piece_start, end, label, piece_tokens))
+    return pieces
+
+def _make_chunk(lines, segments):
+    """Join consecutive segments into a Chunk"""
+    start = segments[0][0]
+    end = segments[-1][1]
+    label = segments[0][2]
+    if len(segments) > 1 and segments[-1][2] != label:
+        label = f"{label} .. {segments[-1][2]}"
+    return Chunk("".join(lines[start:end]), start + 1, end, label)
@@ -0,0 +1,143 @@
+import re
+from utils.chunker import SEQUENCE_AREA, code_area, has_identification_area, is_jcl
+
+# COBOL: string literals are kept verbatim, floating comments (*>) dropped
+# and other runs of whitespace collapsed to one space
+COBOL_TOKEN_PATTERN = re.compile(r"(\"[^\"]*\"|'[^']*')|(\*>.*$)|(\s+)")
+# JCL has no floating comments and only apostrophe-quoted strings
+JCL_TOKEN_PATTERN = re.compile(r"('[^']*')|(\s+)")
+# Free-format directive (>>SOURCE FORMAT IS FREE); otherwise sources are fixed format
+FREE_FORMAT_PATTERN = re.compile(r">>\s*SOURCE\s+(FORMAT\s+)?(IS\s+)?FREE\b", re.IGNORECASE)
+# JCL DD statements followed by in-stream data
+INSTREAM_PATTERN = re.compile(r"^//\S*\s+DD\s+(\*|DATA)(\s|,|$)", re.IGNORECASE)
+# Data division entries that start a new record or file description
+RECORD_START_PATTERN = re.compile(r"^(0?1|77|FD|SD|RD)\s+([A-Z0-9-]+)", re.IGNORECASE)
+STRUCTURE_PATTERN = re.compile(r"^([A-Z0-9-]+\s+)?(SECTION|DIVISION)\b", re.IGNORECASE)
+
+# Only data blocks at least this long are abbreviated when repeated
+MIN_REPEAT_LINES = 3
+
+def compact_source(code, file_path=None, abbreviate_repeats=False):
+    """
+    Strip what an LLM does not need from fixed-format COBOL or JCL
+
+    See compact_lines; dropped lines are removed and the rest joined.
+    """
+    return join_lines(compact_lines(code, file_path, abbreviate_repeats))
+
+def join_lines(lines):
+    """Join compact_lines output (or a slice of it), skipping dropped lines"""
+    kept = [line for line in lines if line is not None]
+    return "\n".join(kept) + "\n" if kept else ""
+
+def compact_lines(code, file_path=None, abbreviate_repeats=False):
+    """
+    Compact source line by line
+
+    Returns one entry per line of code: its compacted text, or None when the
+    line carries nothing the LLM needs. COBOL loses the sequence area
+    (columns 1-6), the identification area (columns 73-80), comment lines
+    and floating comments, blank lines and repeated blanks outside literals.
+    JCL loses //* comment lines and columns 73-80 of statements; in-stream
+    data is kept as is. With abbreviate_repeats, a data division record whose
+    fields repeat an earlier record's fields line for line is replaced by a
+    comment naming that record.
+    """
+    lines = code.splitlines()
+    if is_jcl(code, file_path):
+        return _compact_jcl(lines)
+
+    fixed_format = not FREE_FORMAT_PATTERN.search(code)
+    identification = fixed_format and has_identification_area(lines)
+    compacted = [_compact_cobol_line(line, fixed_format, identification) for line in lines]
+    if abbreviate_repeats:
+        _abbreviate_repeated_records(compacted)
+    return compacted
+
+def _compact_cobol_line(line, fixed_format, identification=True):
+    """Compacted text of one COBOL line, or None"""
+    prefix = ""
+    if fixed_format and len(line) > 6 and SEQUENCE_AREA.match(line):
+        indicator = line[6]
+        if indicator in "*/":
+            return None  # comment line
+        if indicator == "-":
+            prefix = "- "  # continuation of the previous line
+        elif indicator in "Dd":
+            prefix = "D "  # debugging line
+        line = code_area(line, identification)
+    elif fixed_format and len(line) <= 6 and SEQUENCE_AREA.match(line):
+        return None  # sequence number only
+
+    if line.strip().startswith("*>"):
+        return None
+    if line.count('"') % 2 or line.count("'") % 2:
+        # A literal continues on the next line, trailing blanks included
+        text = line.lstrip()
+    else:
+        text = COBOL_TOKEN_PATTERN.sub(_cobol_token, line).strip()
+    return prefix + text if text else None
+
+def _compact_jcl(lines):
+    """Compacted text of each JCL line, or None"""
+    compacted = []
+    in_stream = False
+    for line in lines:
+        if line.startswith("//*"):
+            compacted.append(None)
+            continue
+        if line.startswith("//") or line.startswith("/*"):
+            in_stream = bool(INSTREAM_PATTERN.match(line))
+            if line.count("'") % 2:
+                text = line[:72].rstrip()
+            else:
+                # Keep the leading // (or /*) and the space that marks a continuation
+                text = line[:2] + (" " if line[2:3].isspace() else "") + JCL_TOKEN_PATTERN.sub(_jcl_token, line[2:72]).strip()
+            compacted.append(text.rstrip() or None)
+        elif in_stream:
+            compacted.append(line.rstrip())
+        else:
+            compacted.append(line.strip() or None)
+    return compacted
+
+def _cobol_token(match):
+    """Keep literals, drop floating comments, collapse whitespace"""
+    if match.group(1):
+        return match.group(1)
+    return "" if match.group(2) is not None else " "
+
+def _jcl_token(match):
+    """Keep literals, collapse whitespace"""
+    return match.group(1) or " "
+
+def _abbreviate_repeated_records(compacted):
+    """Replace the fields of data division records that repeat an earlier record's fields (in place)"""
+    seen = {}
+    record = None
+    in_data = False
+    for index, line in enumerate(compacted):
+        if line is None:
+            continue
+        structure = STRUCTURE_PATTERN.match(line)
+        if structure and structure.group(2).upper() == "DIVISION":
+            in_data = line.upper().startswith("DATA ")
+        start = RECORD_START_PATTERN.match(line) if in_data else None
+        if structure or start:
+            _finish_record(compacted, record, seen)
+            record = (start.group(2).upper(), []) if start else None
+        elif record is not None:
+            record[1].append(index)
+    _finish_record(compacted, record, seen)
+
+def _finish_record(compacted, record, seen):
+    """Abbreviate a record's field lines if an earlier record had the same ones"""
+    if record is None or len(record[1]) < MIN_REPEAT_LINES:
+        return
+    name, body = record
+    key = tuple(compacted[position] for position in body)
+    if key not in seen:
+        seen[key] = name
+        return
+    compacted[body[0]] = f"*> {len(body)} field lines identical to those of {seen[key]}"
+    for position in body[1:]:
+        compacted[position] = None
@@ -0,0 +1,109 @@
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+def map_ordered(func, items, workers=1):
+    """
+    Apply func to every item using a bounded thread pool
+
+    Results are yielded in the same order as the input items. At most
+    workers * 2 items are in flight at once, so items can be produced lazily
+    and processing starts before the whole input has been consumed.
+    """
+    if workers is None or workers <= 1:
+        for item in items:
+            yield func(item)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+
+def map_ordered_async(func, items, limit=100):
+    """
+    Await the coroutine func(item) for every item on one event loop
+
+    The loop runs in a single background thread, so any number of requests
+    can be in flight without a thread each. Results are yielded in input
+    order and at most limit tasks exist at once. Items are pulled from the
+    input in a worker thread, since producing them (discovery, reading) may
+    block, and at most limit finished results wait for the consumer before
+    the loop stops starting new tasks. Closing the generator early (or an
+    exception from func) cancels the tasks still running.
+    """
+    import asyncio
+    results = queue.Queue(maxsize=limit)
+    finished = object()
+    exhausted = object()
+    started = threading.Event()
+    runner = {}
+
+    async def put(entry):
+        # A full queue waits for the consumer in a thread, not on the loop
+        await asyncio.to_thread(results.put, entry)
+
+    async def drive():
+        runner["loop"] = asyncio.get_running_loop()
+        runner["task"] = asyncio.current_task()
+        started.set()
+        try:
+            await produce()
+        except asyncio.CancelledError:
+            pass  # the consumer stopped early and no longer reads results
+
+    async def produce():
+        pending = deque()
+        iterator = iter(items)
+        try:
+            while True:
+                item = await asyncio.to_thread(next, iterator, exhausted)
+                if item is exhausted:
+                    break
+                pending.append(asyncio.ensure_future(func(item)))
+                if len(pending) >= limit:
+                    await put((True, await pending.popleft()))
+            while pending:
+                await put((True, await pending.popleft()))
+        except BaseException as e:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            await put((False, e))
+            return
+        await put(finished)
+
+    thread = threading.Thread(target=lambda: asyncio.run(drive()), daemon=True)
+    thread.start()
+    started.wait()
+    done = False
+    try:
+        while True:
+            entry = results.get()
+            if entry is finished:
+                done = True
+                return
+            ok, value = entry
+            if not ok:
+                done = True
+                raise value
+            yield value
+    finally:
+        if not done and thread.is_alive():
+            try:
+                runner["loop"].call_soon_threadsafe(runner["task"].cancel)
+            except RuntimeError:
+                pass  # loop already closed
+        # Drain what the loop still puts, so it never waits on a full queue
+        while thread.is_alive():
+            try:
+                results.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        thread.join()
@@ -1,18 +1,37 @@
-import yaml
 import os
-from dotenv import load_dotenv
 
-# Load environment variables from .env file
-load_dotenv()
+_env_loaded = False
+
+def load_env():
+    """
+    Load environment variables from a .env file, once per process
+
+    python-dotenv is only imported when a .env file exists in the working
+    directory or the repository root, so runs without one skip its import.
+    """
+    global _env_loaded
+    if _env_loaded:
+        return
+    _env_loaded = True
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for directory in (os.getcwd(), repo_root):
+        env_file = os.path.join(directory, ".env")
+        if os.path.exists(env_file):
+            from dotenv import load_dotenv
+            load_dotenv(env_file)
+            return
 
 def load_config(config_file):
     """
     Load configuration from YAML file
     """
+    # Load environment variables from .env file
+    load_env()
     if not os.path.exists(config_file):
         print(f"Configuration file {config_file} not found. Using default configuration.")
         return default_config()
     
+    import yaml
     with open(config_file, 'r') as f:
         config = yaml.safe_load(f)
     
@@ -20,10 +39,10 @@ def load_config(config_file):
     default = default_config()
     
     # Update with values from config file
-    if "llm" in config:
-        default["llm"].update(config.get("llm", {}))
-    if "vector_db" in config:
-        default["vector_db"].update(config.get("vector_db", {}))
+    for section, values in config.items():
+        if section == "agents" or not isinstance(values, dict):
+            continue
+        default.setdefault(section, {}).update(values)
     if "agents" in config:
         for agent_type, agent_config in config.get("agents", {}).items():
             if agent_type in default["agents"]:
@@ -66,16 +85,103 @@ def default_config():
             "rate_limit": rate_limit,
             "max_tokens": 1000,  
             "retry_attempts": 3,  
-            "retry_delay": 5      
+            "retry_delay": 5,
+            "requests_per_minute": 0,     # 0 = no pacing
+            "max_concurrent_requests": 0,  # 0 = limited only by workers
+            "cache_enabled": True,
+            "cache_mode": "use",  # use | refresh | bypass
+            "cache_path": "./.llm_cache/responses.db",
+            "cache_max_mb": 200,
+            "base_url": "",  # OpenAI-compatible endpoint; empty = OpenAI (or OPENAI_BASE_URL)
+            "async_max_in_flight": 100,  # Concurrent requests when execution.async is on
+            "stream": False  # Stream document/transform output to disk as it is generated
         },
         "vector_db": {
             "type": "chroma",
-            "path": "./vector_store"
+            "path": "./vector_store",
+            "bm25_k1": 1.5,
+            "bm25_b": 0.75,
+            "dense_dim": 1024,
+            "cache_size": 1024  # Retrieval results memoized per query signature (0 = off)
+        },
+        "execution": {
+            "workers": 1,  # Files processed concurrently per agent
+            "incremental": True,  # Skip files whose inputs match the output manifest
+            "async": False  # Issue LLM requests as asyncio tasks on one event loop
+        },
+        "discovery": {
+            "extensions": ['.cbl', '.cob', '.jcl', '.asm', '.pli', '.cobol'],
+            "include": [],  # Globs on the path relative to --source
+            "exclude": [],
+            "include_members": False,  # Also pick up extensionless PDS member names
+            "follow_symlinks": True,
+            "cache_file": ""  # Reuse directory listings whose mtime is unchanged
+        },
+        "sources": {
+            "encoding": "auto",  # auto detects EBCDIC; or utf-8, latin-1, cp037, cp1140...
+            "ebcdic_codepage": "cp037",  # Used when auto detection finds EBCDIC
+            "recfm": "auto",  # auto, FB (fixed-length records) or text
+            "lrecl": 80  # Record length of fixed-length files
+        },
+        "chunking": {
+            "enabled": True,
+            "max_chunk_tokens": 3000,  # Estimated source tokens per request
+            "output_ratio": 1.5,  # Transform output tokens per source token (caps chunks at llm.max_tokens / ratio)
+            "workers": 4  # Chunks of one file sent concurrently
+        },
+        "metrics": {
+            "output": ""  # Prefix for <prefix>.trace.json and <prefix>.prom; empty = disabled
+        },
+        "compaction": {
+            "enabled": True,  # Strip sequence areas, comments and padding before prompting
+            "abbreviate_repeats": False  # Replace data records that repeat an earlier record's fields
+        },
+        "copybooks": {
+            "paths": [],  # Copybook libraries, searched before the program's own directory
+            "extensions": [".cpy", ".copy", ".cbk", ""],
+            "mode": "off"  # off, expand or summary
+        },
+        "packing": {
+            "enabled": False,
+            "max_pack_tokens": 3000,  # Estimated source tokens per packed request
+            "max_file_tokens": 500,  # Only files this small are packed
+            "max_files": 20
+        },
+        "pipeline": {
+            "stages": ["analyze", "dependency", "document", "transform"],
+            "plan_phase": ""  # Also write plan.md for this phase (or pass --phase)
+        },
+        "site": {
+            "enabled": True,  # Build the HTML site after document runs
+            "workers": 0,  # Rendering processes; 0 uses every CPU
+            "title": "Mainframe documentation"
+        },
+        "convert": {
+            "layout": "",  # Program or copybook describing the records (or pass --layout)
+            "record": "",  # 01 level to convert; empty = the first one (or pass --record)
+            "format": "csv",  # csv, or columnar (.npy per column plus schema.json)
+            "codepage": "cp037",  # Code page of text fields; an ASCII one for ASCII data
+            "lrecl": 0,  # Record length; 0 = the length of the record layout
+            "batch_mb": 64,  # Input decoded per batch
+            "workers": 0,  # Conversion processes; 0 uses every CPU
+            "skip_redefines": True  # Leave out items that redefine others
+        },
+        "queue": {
+            "path": "jobs.db",  # SQLite job queue shared by --enqueue and --worker
+            "journal_mode": "wal",  # wal for workers on one host; delete when hosts share it over NFS
+            "visibility_timeout": 600,  # Seconds a lease lasts without a heartbeat
+            "heartbeat_interval": 60,
+            "poll_interval": 5,  # Seconds between checks while every job is leased or backing off
+            "max_attempts": 3,  # Failed or expired leases before a job is dead
+            "retry_delay": 30,  # Seconds before the first retry, doubled for each further attempt
+            "exit_when_empty": True  # Stop once no job is queued or leased; false keeps polling
         },
         "agents": {
             "analyze": {
                 "prompt_template": "analyze_template.txt",
                 "model": "gpt-3.5-turbo",
+                "output_format": "auto",  # auto | json | jsonl
+                "flush_every": 10
             },
             "document": {
                 "prompt_template": "document_template.txt",
@@ -84,7 +190,14 @@ def default_config():
             "transform": {
                 "prompt_template": "transform_template.txt",
                 "model": "gpt-3.5-turbo",
-                "rules_file": "transformation_rules.yaml"
+                "rules_file": "transformation_rules.yaml",
+                "dependency_graph": ""  # Graph file from dependency mode; enables leaf-first ordering
+            },
+            "dependency": {
+                "prompt_template": "dependency_template.txt",
+                "use_llm": True,  # False = static extraction only
+                "extract_workers": 0,  # Processes for static extraction (0 = CPU count)
+                "graph_file": ""  # Default: <output>.graph.json
             }
         }
     }
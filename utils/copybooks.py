@@ -0,0 +1,520 @@
+import os
+import re
+import threading
+from concurrent.futures import Future
+from utils.chunker import SEQUENCE_AREA, code_area, has_identification_area
+from utils.compaction import compact_lines
+from utils.manifest import hash_text
+from utils.metrics import metrics
+from utils.source_reader import SourceReader
+
+NAME = r"[A-Z0-9$#@][A-Z0-9$#@-]*"
+# A complete COPY statement, up to its closing period
+COPY_STATEMENT = re.compile(
+    rf"\bCOPY\s+(?:'([^']+)'|\"([^\"]+)\"|({NAME}))(?:\s+(?:OF|IN)\s+{NAME})?(?:\s+SUPPRESS)?"
+    r"(?:\s+REPLACING\s+(.*?))?\s*\.(?=\s|$)",
+    re.IGNORECASE | re.DOTALL
+)
+COPY_START = re.compile(r"\bCOPY\s", re.IGNORECASE)
+# One REPLACING pair: [LEADING|TRAILING] operand BY operand
+OPERAND = r"==.*?==|'[^']*'|\"[^\"]*\"|[^\s=]+"
+REPLACING_PAIR = re.compile(rf"(?:(LEADING|TRAILING)\s+)?({OPERAND})\s+BY\s+({OPERAND})", re.IGNORECASE | re.DOTALL)
+WORD_CHAR = re.compile(r"[A-Z0-9$#@-]", re.IGNORECASE)
+# Fixed-format comment line (indicator * or / in column 7)
+COMMENT_LINE = re.compile(r"^[0-9 ]{6}[*/]")
+
+# Data description entry clauses
+# Data names may still hold pseudo-text tags (:TAG:-NAME) that REPLACING fills in
+FIELD_NAME = r"[A-Z0-9$#@:][A-Z0-9$#@:-]*"
+ENTRY_PATTERN = re.compile(rf"^(\d{{1,2}})(?:\s+({FIELD_NAME}))?(.*)$", re.IGNORECASE | re.DOTALL)
+PIC_PATTERN = re.compile(r"\bPIC(?:TURE)?\s+(?:IS\s+)?(\S+)", re.IGNORECASE)
+OCCURS_PATTERN = re.compile(r"\bOCCURS\s+(\d+)(?:\s+TO\s+(\d+))?", re.IGNORECASE)
+REDEFINES_PATTERN = re.compile(rf"\bREDEFINES\s+({FIELD_NAME})", re.IGNORECASE)
+USAGE_PATTERN = re.compile(
+    r"\b(COMP(?:UTATIONAL)?-[1-5]|COMP(?:UTATIONAL)?|BINARY|PACKED-DECIMAL|INDEX|POINTER|DISPLAY)\b",
+    re.IGNORECASE
+)
+# [SIGN IS] LEADING|TRAILING [SEPARATE CHARACTER]
+SIGN_PATTERN = re.compile(r"\b(LEADING|TRAILING)\b(\s+SEPARATE\b)?", re.IGNORECASE)
+LITERAL_PATTERN = re.compile(r"'[^']*'|\"[^\"]*\"")
+DIVISION_PATTERN = re.compile(r"^[A-Z-]+\s+DIVISION\b", re.IGNORECASE)
+# A period ends an entry only when followed by a space or the end of the text
+ENTRY_END = re.compile(r"\.(?:\s+|$)")
+
+DEFAULT_EXTENSIONS = [".cpy", ".copy", ".cbk", ""]
+# COPY statements inside copybooks are followed at most this deep
+MAX_NESTING = 8
+
+class Field:
+    """One data description entry of a record layout"""
+
+    def __init__(self, level, name, pic=None, usage="DISPLAY", occurs=1, redefines=None):
+        self.level = level
+        self.name = name
+        self.pic = pic
+        self.usage = usage
+        self.occurs = occurs
+        self.redefines = redefines
+        self.sign_leading = False
+        self.sign_separate = False
+        self.offset = 0
+        self.length = 0  # Bytes of one occurrence
+        self.children = []
+
+    def to_dict(self):
+        """Plain representation for JSON output"""
+        record = {"level": self.level, "name": self.name, "offset": self.offset, "length": self.length}
+        if self.pic:
+            record["pic"] = self.pic
+        if self.usage != "DISPLAY":
+            record["usage"] = self.usage
+        if self.occurs > 1:
+            record["occurs"] = self.occurs
+        if self.redefines:
+            record["redefines"] = self.redefines
+        return record
+
+class Copybook:
+    """A copybook read and parsed once: its source lines and record layout"""
+
+    def __init__(self, name, path, text, digest, fields, lines, compacted):
+        self.name = name
+        self.path = path
+        self.text = text
+        self.digest = digest
+        self.fields = fields
+        self.lines = lines  # Source lines with nested COPY statements expanded
+        self.compacted = compacted  # The same, compacted for prompts
+
+    @property
+    def length(self):
+        """Bytes of the largest record in the copybook"""
+        if not self.fields:
+            return 0
+        top = min(field.level for field in self.fields)
+        return max(field.offset + field.length * field.occurs for field in self.fields if field.level == top)
+
+    def layout(self, replacing=None):
+        """Fields as dicts, with names changed by the REPLACING pairs of a COPY statement"""
+        fields = []
+        for field in self.fields:
+            record = field.to_dict()
+            if replacing:
+                record["name"] = apply_replacing(record["name"], replacing)
+                if "redefines" in record:
+                    record["redefines"] = apply_replacing(record["redefines"], replacing)
+            fields.append(record)
+        return fields
+
+    def summary(self, replacing=None):
+        """Compact one-line-per-field description of the layout"""
+        lines = [f"Layout of copybook {self.name} ({len(self.fields)} fields, {self.length} bytes):"]
+        for field in self.layout(replacing):
+            detail = field.get("pic", "group")
+            if "usage" in field:
+                detail += f" {field['usage']}"
+            if "occurs" in field:
+                detail += f" OCCURS {field['occurs']}"
+            if "redefines" in field:
+                detail += f" REDEFINES {field['redefines']}"
+            lines.append(f"{field['level']:02d} {field['name']} {detail} offset {field['offset']} length {field['length']}")
+        return lines
+
+class CopybookLibrary:
+    """
+    Resolves COPY statements against copybook libraries
+
+    Libraries are searched in the configured order, then the directory of
+    the program being expanded. Each directory is listed once and each
+    copybook is read and parsed once; parsed copybooks are also keyed by a
+    hash of their content, so identical members under different names share
+    one parse (each keeping its own name and path). Safe to use from several
+    threads: a thread only waits for another when both ask for the same
+    copybook, and copybooks are read and parsed outside the library lock.
+    """
+
+    def __init__(self, paths=None, extensions=None, reader=None):
+        self.reader = reader or SourceReader()
+        self.paths = [path for path in (paths or []) if path]
+        self.extensions = [ext.lower() for ext in (extensions if extensions is not None else DEFAULT_EXTENSIONS)]
+        self.reads = 0
+        self.parses = 0
+        self._listings = {}
+        self._by_path = {}
+        self._by_digest = {}
+        self._missing = set()
+        # Futures of the copybooks being loaded, by path
+        self._loading = {}
+        self._lock = threading.Lock()
+
+    def find(self, name, near=None):
+        """Path of the copybook called name, or None"""
+        directories = list(self.paths)
+        if near:
+            directories.append(os.path.dirname(os.path.abspath(near)))
+        for directory in directories:
+            listing = self._listing(directory)
+            for ext in self.extensions:
+                path = listing.get((name + ext).lower())
+                if path:
+                    return path
+        return None
+
+    def get(self, name, near=None, _depth=0):
+        """The parsed copybook called name, or None when no library has it"""
+        path = self.find(name, near)
+        if path is None:
+            with self._lock:
+                if name.upper() not in self._missing:
+                    self._missing.add(name.upper())
+                    print(f"Warning: Copybook {name} not found in {self.paths or 'the source directory'}")
+            return None
+
+        with self._lock:
+            copybook = self._by_path.get(path)
+            if copybook is not None:
+                return copybook
+            loading = self._loading.get(path)
+            owner = loading is None
+            if owner:
+                loading = self._loading[path] = Future()
+        if not owner and _depth == 0:
+            # Another thread is loading it; nested COPYs never wait, so a
+            # copybook that copies itself (or a cycle) cannot deadlock
+            return loading.result()
+
+        try:
+            copybook = self._load(name, path, _depth)
+        except BaseException as e:
+            if owner:
+                with self._lock:
+                    del self._loading[path]
+                loading.set_exception(e)
+            raise
+        with self._lock:
+            copybook = self._by_path.setdefault(path, copybook)
+            if owner:
+                del self._loading[path]
+        if owner:
+            loading.set_result(copybook)
+        return copybook
+
+    def _load(self, name, path, depth):
+        """Read and parse the copybook at path, sharing the parse of an identical one"""
+        with metrics.span("copybook", name=name):
+            text = self.reader.read(path)
+            metrics.count("copybook_reads")
+            digest = hash_text(text)
+            with self._lock:
+                self.reads += 1
+                parsed = self._by_digest.get(digest)
+            if parsed is None:
+                parsed = self._parse(name.upper(), path, text, digest, depth)
+                with self._lock:
+                    parsed = self._by_digest.setdefault(digest, parsed)
+        if parsed.path == path:
+            return parsed
+        return Copybook(name.upper(), path, text, digest, parsed.fields, parsed.lines, parsed.compacted)
+
+    def expand_lines(self, lines, mode="expand", compacted=True, near=None):
+        """
+        Replace the COPY statements in a list of source lines
+
+        lines is the per-line output of compact_lines (or raw lines when
+        compacted is False); entries may be None. mode "expand" inserts the
+        copybook text with REPLACING applied and "summary" inserts its
+        layout as comments. The result has one entry per input line, so line
+        numbers still match the source; a statement's first line holds the
+        expansion and its other lines become None.
+        """
+        return self._expand(list(lines), mode, compacted, near, 0)
+
+    def stats(self):
+        """Copybooks read and parsed so far"""
+        return {"reads": self.reads, "parses": self.parses, "missing": len(self._missing)}
+
+    def _expand(self, lines, mode, compacted, near, depth):
+        """expand_lines, following COPY statements at most MAX_NESTING deep"""
+        identification = compacted or has_identification_area(lines)
+        index = 0
+        while index < len(lines):
+            line = lines[index]
+            if line is None or not COPY_START.search(line) or (not compacted and COMMENT_LINE.match(line)):
+                index += 1
+                continue
+            area = "" if compacted else _sequence_area(line)
+
+            # A statement may continue over the next few lines
+            end = index
+            statement = _content(line, area, identification)
+            match = COPY_STATEMENT.search(statement)
+            while match is None and end + 1 < len(lines) and end - index < 20:
+                end += 1
+                if lines[end] is not None:
+                    statement += " " + _content(lines[end], area, identification)
+                match = COPY_STATEMENT.search(statement)
+            if match is None:
+                index += 1
+                continue
+
+            name = next(group for group in match.groups()[:3] if group)
+            copybook = self.get(name, near, depth) if depth < MAX_NESTING else None
+            if copybook is None:
+                index = end + 1
+                continue
+            replacing = parse_replacing(match.group(4) or "")
+            metrics.count("copybook_expansions", mode=mode)
+
+            if mode == "summary":
+                body = [f"*> {text}" for text in copybook.summary(replacing)]
+            else:
+                body = copybook.compacted if compacted else copybook.lines
+                if replacing:
+                    body_identification = compacted or has_identification_area(body)
+                    body = [_replace_line(text, replacing, compacted, body_identification) for text in body]
+            # Code sharing a line with the statement stays, in the statement's columns
+            indent = " " * (len(area) + 4) if area else ""
+            prefix = statement[:match.start()].strip()
+            suffix = statement[match.end():].strip()
+            parts = [indent + prefix if prefix else None] + body + [indent + suffix if suffix else None]
+            lines[index] = "\n".join(part for part in parts if part)
+            for position in range(index + 1, end + 1):
+                lines[position] = None
+            index = end + 1
+        return lines
+
+    def _parse(self, name, path, text, digest, depth):
+        """Parse a copybook (expanding its own COPY statements) into a Copybook"""
+        with self._lock:
+            self.parses += 1
+        metrics.count("copybook_parses")
+        raw = self._expand(text.splitlines(), "expand", False, path, depth + 1)
+        raw = [line for entry in raw if entry is not None for line in entry.split("\n")]
+        compacted = [line for line in compact_lines("\n".join(raw), path) if line is not None]
+        return Copybook(name, path, text, digest, parse_layout(compacted), raw, compacted)
+
+    def _listing(self, directory):
+        """{lowercase file name: path} for a directory, read once"""
+        listing = self._listings.get(directory)
+        if listing is None:
+            try:
+                listing = {entry.name.lower(): entry.path for entry in os.scandir(directory) if entry.is_file()}
+            except OSError:
+                listing = {}
+            self._listings[directory] = listing
+        return listing
+
+def _sequence_area(line):
+    """Columns 1-7 of a raw fixed-format line, or "" for free-format text"""
+    return line[:7] if len(line) > 6 and SEQUENCE_AREA.match(line) else ""
+
+def _content(line, area, identification=True):
+    """Code part of a line: raw fixed-format lines hold code from column 8 (to 72 with an identification area)"""
+    return code_area(line, identification) if area and _sequence_area(line) else line
+
+def parse_replacing(text):
+    """[(mode, old, new)] from the operands of a REPLACING phrase"""
+    pairs = []
+    for match in REPLACING_PAIR.finditer(text):
+        mode = (match.group(1) or "").upper()
+        pairs.append((mode, _operand(match.group(2)), _operand(match.group(3))))
+    return pairs
+
+def _operand(operand):
+    """Text of a REPLACING operand; pseudo-text loses its == delimiters and extra blanks"""
+    if operand.startswith("=="):
+        return " ".join(operand[2:-2].split())
+    return operand
+
+def _replace_line(line, replacing, compacted, identification=True):
+    """Apply REPLACING to a copybook line; raw fixed-format lines only change from column 8 (to 72)"""
+    area = "" if compacted else _sequence_area(line)
+    if not area:
+        return apply_replacing(line, replacing)
+    return (area + apply_replacing(code_area(line, identification), replacing)).rstrip()
+
+def apply_replacing(text, replacing):
+    """Apply REPLACING pairs to text in one pass, so a replacement is never replaced again"""
+    if not replacing:
+        return text
+    alternatives = []
+    for index, (mode, old, _) in enumerate(replacing):
+        if not old:
+            continue
+        # Operands match whole words unless LEADING/TRAILING, or where they start or end with punctuation (:TAG:)
+        left = r"(?<![A-Z0-9$#@-])" if mode != "TRAILING" and WORD_CHAR.match(old[0]) else ""
+        right = r"(?![A-Z0-9$#@-])" if mode != "LEADING" and WORD_CHAR.match(old[-1]) else ""
+        pattern = r"\s+".join(re.escape(word) for word in old.split())
+        alternatives.append(f"(?P<r{index}>{left}{pattern}{right})")
+    if not alternatives:
+        return text
+    regex = re.compile("|".join(alternatives), re.IGNORECASE)
+    return regex.sub(lambda match: replacing[int(match.lastgroup[1:])][2], text)
+
+def parse_layout(lines):
+    """
+    Fields with offsets and lengths from compacted data description lines
+
+    Offsets are relative to the start of each 01/77 record (or to the first
+    entry when the copybook starts at a lower level). Level 66 and 88 entries
+    are skipped. Group lengths include OCCURS of their children, and a
+    REDEFINES entry starts where the entry it redefines starts.
+    """
+    text = LITERAL_PATTERN.sub("''", " ".join(lines))
+    root = Field(0, "")
+    stack = [root]
+    cursors = {id(root): 0}
+    by_name = {}
+    fields = []
+
+    for entry in ENTRY_END.split(text):
+        match = ENTRY_PATTERN.match(entry.strip())
+        if not match:
+            continue
+        level = int(match.group(1))
+        if level in (66, 88):
+            continue
+        name = (match.group(2) or "FILLER").upper()
+        if name in ("PIC", "PICTURE"):
+            name, clauses = "FILLER", f"{match.group(2)}{match.group(3)}"
+        else:
+            clauses = match.group(3)
+        if level == 77:
+            level = 1
+
+        while len(stack) > 1 and stack[-1].level >= level:
+            _close(stack.pop(), stack[-1], cursors)
+        if level == 1:
+            cursors[id(root)] = 0
+
+        parent = stack[-1]
+        pic = PIC_PATTERN.search(clauses)
+        usage = USAGE_PATTERN.search(clauses)
+        occurs = OCCURS_PATTERN.search(clauses)
+        redefines = REDEFINES_PATTERN.search(clauses)
+        field = Field(
+            level,
+            name,
+            pic=pic.group(1).rstrip(".").upper() if pic else None,
+            usage=_normalize_usage(usage.group(1)) if usage else (parent.usage if parent is not root else "DISPLAY"),
+            occurs=int(occurs.group(2) or occurs.group(1)) if occurs else 1,
+            redefines=redefines.group(1).upper() if redefines else None
+        )
+        sign = SIGN_PATTERN.search(clauses)
+        if sign:
+            field.sign_leading = sign.group(1).upper() == "LEADING"
+            field.sign_separate = sign.group(2) is not None
+        elif parent is not root:
+            # A SIGN clause on a group applies to its numeric items
+            field.sign_leading, field.sign_separate = parent.sign_leading, parent.sign_separate
+        target = by_name.get(field.redefines) if field.redefines else None
+        field.offset = target.offset if target is not None else cursors[id(parent)]
+        by_name[name] = field
+        fields.append(field)
+        parent.children.append(field)
+
+        if field.pic or field.usage in ("COMP-1", "COMP-2", "INDEX", "POINTER"):
+            field.length = _elementary_length(field)
+            _advance(parent, field, cursors)
+        else:
+            stack.append(field)
+            cursors[id(field)] = field.offset
+
+    while len(stack) > 1:
+        _close(stack.pop(), stack[-1], cursors)
+    return fields
+
+def source_layout(code, file_path=None, library=None):
+    """Fields described in a program's data division, or in a copybook, with COPY statements expanded"""
+    lines = compact_lines(code, file_path)
+    if library is not None:
+        lines = library.expand_lines(lines, "expand", True, file_path)
+    lines = [line for entry in lines if entry is not None for line in entry.split("\n")]
+    # Procedure division paragraph names (0000-MAIN.) would read as level numbers
+    start = next((index + 1 for index, line in enumerate(lines) if DIVISION_PATTERN.match(line)
+                  and line.split()[0].upper() == "DATA"), 0)
+    end = next((index for index, line in enumerate(lines) if DIVISION_PATTERN.match(line)
+                and line.split()[0].upper() == "PROCEDURE"), len(lines))
+    return parse_layout(lines[start:end])
+
+def record_roots(fields, name=None):
+    """
+    Top-level fields of one record in a layout
+
+    With a name, that record or group alone; otherwise the first 01 record,
+    or every top-level field of a copybook without 01 levels. Returns [] when
+    no field has the name.
+    """
+    if not fields:
+        return []
+    if name:
+        stack = list(reversed(fields))
+        while stack:
+            field = stack.pop()
+            if field.name == name.upper():
+                return [field]
+            stack.extend(reversed(field.children))
+        return []
+    records = [field for field in fields if field.level == 1]
+    if len(records) > 1:
+        print(f"Warning: Layout has {len(records)} records; using {records[0].name}")
+    if records:
+        return records[:1]
+    top = min(field.level for field in fields)
+    return [field for field in fields if field.level == top]
+
+def _close(group, parent, cursors):
+    """Finish a group: its length is the extent of its children"""
+    group.length = cursors.pop(id(group)) - group.offset
+    _advance(parent, group, cursors)
+
+def _advance(parent, field, cursors):
+    """Move the parent's next free offset past field (all occurrences); REDEFINES never shrink it"""
+    cursors[id(parent)] = max(cursors[id(parent)], field.offset + field.length * field.occurs)
+
+def _normalize_usage(usage):
+    """Canonical usage name"""
+    usage = usage.upper().replace("COMPUTATIONAL", "COMP")
+    if usage in ("COMP", "COMP-4", "COMP-5", "BINARY"):
+        return "COMP"
+    if usage == "PACKED-DECIMAL":
+        return "COMP-3"
+    return usage
+
+def expand_picture(pic):
+    """Expand repeat counts: 9(5)V99 -> 99999V99"""
+    return re.sub(r"(.)\((\d+)\)", lambda match: match.group(1) * int(match.group(2)), pic.upper())
+
+def _elementary_length(field):
+    """Storage bytes of one occurrence of an elementary item"""
+    if field.usage == "COMP-1":
+        return 4
+    if field.usage == "COMP-2":
+        return 8
+    if field.usage in ("INDEX", "POINTER"):
+        return 4
+    picture = expand_picture(field.pic or "")
+    digits = sum(picture.count(symbol) for symbol in "9")
+    if field.usage == "COMP-3":
+        return digits // 2 + 1
+    if field.usage == "COMP":
+        return 2 if digits <= 4 else 4 if digits <= 9 else 8
+    # DISPLAY: every symbol but S, V and P takes a byte (CR and DB take two); N takes two
+    length = len(picture) - sum(picture.count(symbol) for symbol in "SVP")
+    length += picture.count("N")
+    if field.sign_separate and "S" in picture:
+        length += 1
+    return length
+
+_libraries = {}
+_libraries_lock = threading.Lock()
+
+def shared_library(paths=None, extensions=None, reader=None):
+    """One CopybookLibrary per configuration, shared by every agent in the process"""
+    reader = reader or SourceReader()
+    key = (tuple(paths or []), tuple(extensions) if extensions is not None else None, reader.settings)
+    with _libraries_lock:
+        library = _libraries.get(key)
+        if library is None:
+            library = _libraries[key] = CopybookLibrary(paths, extensions, reader)
+        return library
@@ -0,0 +1,512 @@
+import json
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from utils.copybooks import expand_picture
+from utils.metrics import metrics
+
+# Records decoded per batch are sized to about this many bytes of input
+DEFAULT_BATCH_BYTES = 64 * 1024 * 1024
+# int64 holds any 18-digit number; longer ones are kept as two int64 halves
+# (high * 10**18 + low, both carrying the sign)
+MAX_EXACT_DIGITS = 18
+WIDE_DTYPE = np.dtype([("high", "<i8"), ("low", "<i8")])
+# Binary items may hold any value their storage does (COMP-5, TRUNC(BIN))
+BINARY_DIGITS = {2: 5, 4: 10, 8: 20}
+
+NUMERIC_PICTURE = re.compile(r"^S?[9VP]+$")
+QUOTE = ord('"')
+
+class Column:
+    """One output column: an elementary item (or one occurrence of it) in the record"""
+
+    def __init__(self, name, kind, offset, length, digits=0, scale=0, signed=False,
+                 sign_leading=False, sign_separate=False):
+        self.name = name
+        self.kind = kind  # text, zoned, packed, binary, float
+        self.offset = offset
+        self.length = length
+        self.digits = digits
+        self.scale = scale
+        self.signed = signed
+        self.sign_leading = sign_leading
+        self.sign_separate = sign_separate
+
+    @property
+    def wide(self):
+        """Whether values may not fit an int64 and are decoded as WIDE_DTYPE halves"""
+        if self.kind == "binary":
+            return self.length == 8 and not self.signed
+        return self.kind in ("zoned", "packed") and self.digits > MAX_EXACT_DIGITS
+
+    @property
+    def dtype(self):
+        """numpy type of the decoded values"""
+        if self.kind == "text":
+            return np.dtype(f"S{self.length}")
+        if self.kind == "float":
+            return np.dtype(np.float64)
+        return WIDE_DTYPE if self.wide else np.dtype(np.int64)
+
+    def to_dict(self):
+        """Schema entry for the columnar output"""
+        record = {"name": self.name, "type": self.kind, "dtype": np.lib.format.dtype_to_descr(self.dtype), "offset": self.offset,
+                  "length": self.length}
+        if self.kind != "text":
+            # Integer columns hold unscaled values: divide by 10**scale
+            # (a negative scale multiplies); wide ones hold high * 10**18 + low
+            record["scale"] = self.scale
+        return record
+
+def layout_columns(roots, skip_redefines=True):
+    """
+    Columns for the elementary items under the record roots (Field objects)
+
+    Offsets become relative to the first root. OCCURS are flattened into one
+    column per occurrence (NAME_1, NAME_2, ...), FILLER items are skipped,
+    and REDEFINES items too unless skip_redefines is False.
+    """
+    columns = []
+    base = min(root.offset for root in roots) if roots else 0
+    for root in roots:
+        _add_columns(root, root.offset - base, "", columns, skip_redefines)
+    return columns
+
+def _add_columns(field, offset, suffix, columns, skip_redefines):
+    """Append the columns of field (at offset) and everything under it"""
+    if field.redefines and skip_redefines:
+        return
+    for occurrence in range(field.occurs):
+        position = offset + occurrence * field.length
+        name_suffix = f"{suffix}_{occurrence + 1}" if field.occurs > 1 else suffix
+        if field.children:
+            for child in field.children:
+                _add_columns(child, position + child.offset - field.offset, name_suffix, columns, skip_redefines)
+        elif field.name != "FILLER":
+            column = _column(field, field.name + name_suffix, position)
+            if column:
+                columns.append(column)
+
+def _column(field, name, offset):
+    """Column for an elementary item, or None when its usage cannot be converted"""
+    if field.usage in ("COMP-1", "COMP-2"):
+        return Column(name, "float", offset, field.length)
+    picture = expand_picture(field.pic or "")
+    if not NUMERIC_PICTURE.match(picture):
+        if field.usage != "DISPLAY" or not picture:
+            print(f"Warning: Skipping {name}: usage {field.usage} with PIC {field.pic} is not supported")
+            return None
+        # Alphanumeric and numeric-edited items are converted as text
+        return Column(name, "text", offset, field.length)
+
+    digits = picture.count("9")
+    # P positions scale the value: left of the digits (PP99, VPP99) they are
+    # decimal places ahead of the digits, right of them (99PP) trailing zeros
+    # (a negative scale)
+    body = picture.lstrip("S")
+    if body.startswith(("P", "VP")):
+        scale = body.count("P") + digits
+    elif "V" in body:
+        scale = len(body.split("V")[1])
+    else:
+        scale = -(len(body) - len(body.rstrip("P")))
+    kind = {"DISPLAY": "zoned", "COMP-3": "packed", "COMP": "binary"}.get(field.usage)
+    if kind is None:
+        print(f"Warning: Skipping {name}: usage {field.usage} is not supported")
+        return None
+    if kind == "binary":
+        digits = max(digits, BINARY_DIGITS.get(field.length, digits))
+    return Column(name, kind, offset, field.length, digits, scale, picture.startswith("S"),
+                  field.sign_leading, field.sign_separate)
+
+class DataConverter:
+    """
+    Converts fixed-length binary records to CSV or columnar files with NumPy
+
+    Records are read in large batches as a (records, lrecl) byte matrix and
+    every column is decoded for the whole batch at once: EBCDIC text through
+    a 256-byte translation table, zoned and packed decimals nibble by
+    nibble, binary and hexadecimal floating point items by reinterpreting
+    their bytes. CSV rows are assembled the same way, as one byte matrix
+    per batch, so no Python code runs per record.
+    """
+
+    def __init__(self, columns, lrecl, codepage="cp037", batch_bytes=DEFAULT_BATCH_BYTES):
+        self.columns = columns
+        self.lrecl = lrecl
+        self.codepage = codepage
+        self.batch_records = max(1, batch_bytes // max(lrecl, 1))
+        self.ebcdic = " ".encode(codepage, errors="replace") == b"\x40"
+        # Text bytes -> Latin-1 bytes (U+0000-U+00FF); anything else becomes ?
+        self.translation = bytes(range(256)).decode(codepage, errors="replace").encode("latin-1", errors="replace")
+        self.has_text = any(column.kind == "text" for column in columns)
+        self.zone = 0xF if self.ebcdic else 0x3
+        self.negative_zones = (0xD, 0xB) if self.ebcdic else (0x7,)
+        self.minus = "-".encode(codepage)[0]
+
+    def convert(self, dataset, output, output_format="csv", workers=1):
+        """
+        Convert a dataset; returns record, byte and invalid value counts and the throughput
+
+        With several workers the records are split into contiguous ranges
+        converted in parallel processes: columnar ranges fill the same
+        preallocated arrays, CSV ranges go to part files appended in order.
+        """
+        size = os.path.getsize(dataset)
+        records = size // self.lrecl
+        if size % self.lrecl:
+            print(f"Warning: {dataset} is {size} bytes, not a multiple of LRECL {self.lrecl}; "
+                  f"ignoring the last {size % self.lrecl} bytes")
+
+        start = time.monotonic()
+        ranges = _split_records(records, self.batch_records, workers or os.cpu_count() or 1)
+        if output_format == "columnar":
+            ColumnarWriter.create(output, self.columns, records)
+            targets = [output] * len(ranges)
+        else:
+            CsvWriter.create(output, self.columns)
+            targets = [output] if len(ranges) == 1 else [f"{output}.part{index}" for index in range(len(ranges))]
+        jobs = [(dataset, first, count, target, output_format) for (first, count), target in zip(ranges, targets)]
+
+        if len(jobs) == 1:
+            results = [self.convert_range(*jobs[0])]
+        else:
+            with ProcessPoolExecutor(max_workers=len(jobs)) as executor:
+                results = list(executor.map(self.convert_range, *zip(*jobs)))
+            if output_format != "columnar":
+                with open(output, 'ab') as f:
+                    for part in targets:
+                        with open(part, 'rb') as source:
+                            shutil.copyfileobj(source, f)
+                        os.unlink(part)
+
+        invalid = {}
+        for result in results:
+            for name, count in result.items():
+                invalid[name] = invalid.get(name, 0) + count
+        if output_format == "columnar":
+            ColumnarWriter.write_schema(output, self.columns, records, invalid)
+
+        seconds = time.monotonic() - start
+        if metrics.enabled:
+            metrics.count("records_converted", records)
+            metrics.count("bytes_converted", records * self.lrecl)
+        if invalid:
+            print(f"Warning: {sum(invalid.values())} invalid numeric values in {dataset} were left empty")
+        return {
+            "records": records,
+            "bytes": records * self.lrecl,
+            "seconds": round(seconds, 3),
+            "mb_per_second": round(records * self.lrecl / seconds / 1e6, 1) if seconds else None,
+            "workers": len(jobs),
+            "invalid_values": invalid
+        }
+
+    def convert_range(self, dataset, first, records, target, output_format):
+        """Convert records [first, first + records) into a created output; returns invalid value counts"""
+        invalid = dict.fromkeys((column.name for column in self.columns), 0)
+        writer = (ColumnarWriter(target, self.columns) if output_format == "columnar"
+                  else CsvWriter(target, self.columns))
+        try:
+            with open(dataset, 'rb') as f:
+                f.seek(first * self.lrecl)
+                done = 0
+                while done < records:
+                    count = min(self.batch_records, records - done)
+                    with metrics.span("convert_batch", records=count):
+                        batch = np.fromfile(f, dtype=np.uint8, count=count * self.lrecl).reshape(count, self.lrecl)
+                        # bytes.translate is several times faster than a NumPy lookup table
+                        text = np.frombuffer(batch.tobytes().translate(self.translation), dtype=np.uint8).reshape(
+                            count, self.lrecl) if self.has_text else None
+                        values = []
+                        for column in self.columns:
+                            decoded, valid = self.decode(batch, column, text)
+                            if valid is not None:
+                                invalid[column.name] += int(count - np.count_nonzero(valid))
+                            values.append((decoded, valid))
+                        writer.write(first + done, values)
+                    done += count
+        finally:
+            writer.close()
+        return {name: count for name, count in invalid.items() if count}
+
+    def decode(self, batch, column, text=None):
+        """
+        Values of a column for every record in the batch, and a validity mask
+        (None when every value is valid); text is the batch translated to Latin-1
+        """
+        if column.kind == "text":
+            data = text[:, column.offset:column.offset + column.length]
+            # Trailing blanks become the NUL padding of an S array
+            return np.char.rstrip(np.ascontiguousarray(data).view(column.dtype)[:, 0], b" "), None
+        data = batch[:, column.offset:column.offset + column.length]
+        if column.kind == "zoned":
+            values, valid = self._decode_zoned(data, column)
+        elif column.kind == "packed":
+            values, valid = self._decode_packed(data, column)
+        elif column.kind == "binary":
+            dtype = f">{'i' if column.signed else 'u'}{column.length}"
+            values, valid = np.ascontiguousarray(data).view(dtype)[:, 0], None
+            if column.wide:
+                wide = np.empty(len(values), dtype=WIDE_DTYPE)
+                wide["high"] = values // np.uint64(10 ** MAX_EXACT_DIGITS)
+                wide["low"] = values % np.uint64(10 ** MAX_EXACT_DIGITS)
+                values = wide
+            else:
+                values = values.astype(np.int64)
+        else:
+            return self._decode_float(data, column), None
+        # Values stay unscaled; a negative scale (trailing P) is applied when formatting
+        return values, valid
+
+    def _decode_zoned(self, data, column):
+        """Zoned decimal: one digit per byte, sign in a zone nibble or a separate byte"""
+        if column.sign_separate:
+            sign = data[:, 0] if column.sign_leading else data[:, -1]
+            data = data[:, 1:] if column.sign_leading else data[:, :-1]
+            negative = sign == self.minus
+        digits = data & 0x0F
+        zones = data >> 4
+        sign_position = 0 if column.sign_leading else -1
+        valid = (digits <= 9).all(axis=1)
+        if column.signed and not column.sign_separate:
+            negative = np.isin(zones[:, sign_position], self.negative_zones)
+            others = np.delete(zones, sign_position % zones.shape[1], axis=1)
+            valid &= (others == self.zone).all(axis=1)
+        else:
+            valid &= (zones == self.zone).all(axis=1)
+            if not column.signed:
+                negative = None
+        values = self._accumulate(digits.T, column)
+        if negative is not None:
+            values = _negate(values, negative)
+        return values, valid
+
+    def _decode_packed(self, data, column):
+        """Packed decimal (COMP-3): two digits per byte, sign in the last nibble"""
+        nibbles = np.empty((data.shape[0], data.shape[1] * 2), dtype=np.uint8)
+        nibbles[:, 0::2] = data >> 4
+        nibbles[:, 1::2] = data & 0x0F
+        digits, sign = nibbles[:, :-1], nibbles[:, -1]
+        valid = (digits <= 9).all(axis=1) & (sign >= 0xA)
+        values = self._accumulate(digits.T, column)
+        return _negate(values, (sign == 0xB) | (sign == 0xD)), valid
+
+    def _accumulate(self, digit_columns, column):
+        """Combine digit columns (most significant first) into numbers; wide ones into two halves"""
+        if not column.wide:
+            return _combine(digit_columns)
+        values = np.empty(digit_columns.shape[1], dtype=WIDE_DTYPE)
+        values["high"] = _combine(digit_columns[:-MAX_EXACT_DIGITS])
+        values["low"] = _combine(digit_columns[-MAX_EXACT_DIGITS:])
+        return values
+
+    def _decode_float(self, data, column):
+        """COMP-1/COMP-2: hexadecimal floating point on EBCDIC data, IEEE big-endian otherwise"""
+        data = np.ascontiguousarray(data)
+        if not self.ebcdic:
+            return data.view(f">f{column.length}")[:, 0].astype(np.float64)
+        bits = column.length * 8
+        raw = data.view(f">u{column.length}")[:, 0].astype(np.uint64)
+        fraction_bits = bits - 8
+        fraction = (raw & np.uint64((1 << fraction_bits) - 1)).astype(np.float64) / float(1 << fraction_bits)
+        exponent = ((raw >> np.uint64(fraction_bits)) & np.uint64(0x7F)).astype(np.int64) - 64
+        values = fraction * np.power(16.0, exponent)
+        return np.where(raw >> np.uint64(bits - 1), -values, values)
+
+def _combine(digit_columns):
+    """int64 values of at most 18 digit columns"""
+    values = np.zeros(digit_columns.shape[1], dtype=np.int64)
+    for digits in digit_columns:
+        values *= 10
+        values += digits
+    return values
+
+def _negate(values, negative):
+    """Values with the sign flipped where negative is set (both halves of wide values)"""
+    if values.dtype != WIDE_DTYPE:
+        return np.where(negative, -values, values)
+    for part in ("high", "low"):
+        values[part] = np.where(negative, -values[part], values[part])
+    return values
+
+class CsvWriter:
+    """Appends decoded batches as CSV rows; text values are quoted"""
+
+    def __init__(self, path, columns):
+        self.columns = columns
+        self.file = open(path, 'ab')
+
+    @staticmethod
+    def create(path, columns):
+        """Start a CSV file with its header row"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write((",".join(column.name for column in columns) + "\n").encode("utf-8"))
+
+    def write(self, start, values):
+        """Write one batch; start is the index of its first record"""
+        if any(column.kind == "text" and _needs_escaping(decoded) for column, (decoded, _) in zip(self.columns, values)):
+            self._write_rows(values)
+            return
+        count = len(values[0][0]) if values else 0
+        parts = []
+        for column, (decoded, valid) in zip(self.columns, values):
+            if column.kind == "text":
+                quote = np.full((count, 1), QUOTE, dtype=np.uint8)
+                parts.extend([quote, decoded.view(np.uint8).reshape(count, -1), quote])
+            elif column.kind != "float":
+                parts.append(_format_decimal(decoded, valid, column))
+            else:
+                parts.append(_format_float(decoded, valid))
+            parts.append(np.full((count, 1), ord(","), dtype=np.uint8))
+        parts[-1] = np.full((count, 1), ord("\n"), dtype=np.uint8)
+        rows = np.concatenate(parts, axis=1)
+        # NUL marks padding and dropped characters; deleting them with
+        # bytes.translate is faster than boolean indexing
+        self.file.write(rows.tobytes().translate(None, b"\0"))
+
+    def _write_rows(self, values):
+        """Write a batch row by row, for text with quotes to double or non-ASCII characters"""
+        columns = []
+        for column, (decoded, valid) in zip(self.columns, values):
+            if column.kind == "text":
+                columns.append(['"' + value.decode("latin-1").replace('"', '""') + '"' for value in decoded.tolist()])
+            else:
+                formatted = [_format_value(value, column) for value in decoded.tolist()]
+                if valid is not None:
+                    formatted = [value if ok else "" for value, ok in zip(formatted, valid.tolist())]
+                columns.append(formatted)
+        self.file.write("".join(",".join(row) + "\n" for row in zip(*columns)).encode("utf-8"))
+
+    def close(self):
+        self.file.close()
+
+class ColumnarWriter:
+    """
+    Writes one .npy file per column plus schema.json
+
+    The arrays are preallocated for every record by create() and filled
+    batch by batch, so parallel writers can share them. Integer columns hold
+    unscaled values (see the schema's scale); invalid numbers are stored as
+    0 and counted in the schema.
+    """
+
+    def __init__(self, directory, columns):
+        self.arrays = [np.load(_column_path(directory, column), mmap_mode="r+") for column in columns]
+
+    @staticmethod
+    def create(directory, columns, records):
+        """Preallocate the column files for records values each"""
+        os.makedirs(directory, exist_ok=True)
+        for column in columns:
+            array = np.lib.format.open_memmap(_column_path(directory, column), mode="w+", dtype=column.dtype,
+                                              shape=(records,))
+            del array
+
+    @staticmethod
+    def write_schema(directory, columns, records, invalid):
+        """Describe the column files in schema.json"""
+        with open(os.path.join(directory, "schema.json"), 'w') as f:
+            json.dump({
+                "records": records,
+                "columns": [dict(column.to_dict(), file=os.path.basename(_column_path(directory, column)),
+                                 invalid=invalid.get(column.name, 0)) for column in columns]
+            }, f, indent=2)
+
+    def write(self, start, values):
+        """Write one batch; start is the index of its first record"""
+        for array, (decoded, valid) in zip(self.arrays, values):
+            if valid is not None:
+                decoded = decoded.copy()
+                decoded[~valid] = 0
+            array[start:start + len(decoded)] = decoded
+
+    def close(self):
+        for array in self.arrays:
+            array.flush()
+        self.arrays = []
+
+def _column_path(directory, column):
+    """Path of the .npy file holding a column"""
+    return os.path.join(directory, f"{column.name}.npy")
+
+def _split_records(records, batch_records, workers):
+    """Contiguous (first, count) ranges for the workers, each at least one batch"""
+    if not records:
+        return [(0, 0)]
+    parts = max(1, min(workers, -(-records // batch_records)))
+    size = -(-records // parts)
+    return [(first, min(size, records - first)) for first in range(0, records, size)]
+
+def _needs_escaping(text):
+    """Whether any value in an S array holds a quote or non-ASCII bytes"""
+    data = text.view(np.uint8)
+    return bool((data == QUOTE).any() or (data >= 0x80).any())
+
+def _format_decimal(values, valid, column):
+    """Decimal text of unscaled integers (int64 or wide halves) as a NUL-padded byte matrix; invalid values are empty"""
+    count = len(values)
+    scale = max(column.scale, 0)
+    # Room for every digit, and a units digit ahead of the decimal places
+    width = max(column.digits, scale + 1, 1)
+    if values.dtype == WIDE_DTYPE:
+        negative = (values["high"] < 0) | (values["low"] < 0)
+        halves = [(np.abs(values["low"]).astype(np.uint64), MAX_EXACT_DIGITS),
+                  (np.abs(values["high"]).astype(np.uint64), width)]
+    else:
+        negative = values < 0
+        halves = [(np.abs(values).astype(np.uint64), width)]
+    chars = np.zeros((count, width), dtype=np.uint8)
+    position = width
+    for magnitude, digits in halves:
+        for _ in range(min(digits, position)):
+            position -= 1
+            chars[:, position] = magnitude % np.uint64(10)
+            magnitude //= np.uint64(10)
+    # Drop leading zeros but keep the units digit and every decimal place
+    nonzero = chars != 0
+    first = np.where(nonzero.any(axis=1), nonzero.argmax(axis=1), width)
+    keep = np.arange(width) >= np.minimum(first, width - scale - 1)[:, None]
+    chars += ord("0")
+    chars[~keep] = 0
+
+    parts = [np.where(negative, ord("-"), 0).astype(np.uint8)[:, None]]
+    if scale:
+        parts.extend([chars[:, :width - scale], np.full((count, 1), ord("."), dtype=np.uint8), chars[:, width - scale:]])
+    else:
+        parts.append(chars)
+        if column.scale < 0:
+            # Trailing P positions: zeros after any non-zero value
+            zeros = np.where(nonzero.any(axis=1), ord("0"), 0).astype(np.uint8)[:, None]
+            parts.append(np.repeat(zeros, -column.scale, axis=1))
+    text = np.concatenate(parts, axis=1)
+    if valid is not None:
+        text[~valid] = 0
+    return text
+
+def _format_float(values, valid):
+    """repr-style text of floats as a NUL-padded byte matrix"""
+    text = values.astype("S24").view(np.uint8).reshape(len(values), -1).copy()
+    if valid is not None:
+        text[~valid] = 0
+    return text
+
+def _format_value(value, column):
+    """Text of one decoded number (slow path); wide values arrive as (high, low)"""
+    if column.kind == "float":
+        return str(value)
+    if isinstance(value, tuple):
+        value = value[0] * 10 ** MAX_EXACT_DIGITS + value[1]
+    if column.scale < 0:
+        return str(value * 10 ** -column.scale)
+    if not column.scale:
+        return str(value)
+    sign = "-" if value < 0 else ""
+    whole, fraction = divmod(abs(value), 10 ** column.scale)
+    return f"{sign}{whole}.{fraction:0{column.scale}d}"
@@ -0,0 +1,188 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from utils.chunker import code_area, has_identification_area
+from utils.source_reader import SourceReader
+
+# Fixed-format COBOL: sequence area (1-6), indicator (7), code (8-72)
+SEQUENCE_AREA = re.compile(r"^[0-9 ]{6}")
+
+NAME = r"[A-Z0-9$#@][A-Z0-9$#@-]*"
+QUOTED = r"(?:'([^']+)'|\"([^\"]+)\")"
+
+COPY_PATTERN = re.compile(rf"\bCOPY\s+(?:{QUOTED}|({NAME}))", re.IGNORECASE)
+CALL_PATTERN = re.compile(rf"\bCALL\s+(?:{QUOTED}|({NAME}))", re.IGNORECASE)
+SELECT_PATTERN = re.compile(
+    rf"\bSELECT\s+(?:OPTIONAL\s+)?({NAME})\s+ASSIGN\s+(?:TO\s+)?(?:{QUOTED}|({NAME}))",
+    re.IGNORECASE
+)
+EXEC_BLOCK_PATTERN = re.compile(r"\bEXEC\s+(SQL|CICS)\b(.*?)\bEND-EXEC\b", re.IGNORECASE | re.DOTALL)
+VALUE_PATTERN = re.compile(rf"\b({NAME})\s+PIC(?:TURE)?\s+\S+\s+VALUE\s+{QUOTED}", re.IGNORECASE)
+
+SQL_INCLUDE_PATTERN = re.compile(rf"^\s*INCLUDE\s+({NAME})", re.IGNORECASE)
+SQL_TABLE_PATTERN = re.compile(
+    rf"\b(?:FROM|JOIN|UPDATE|INTO|TABLE)\s+((?:{NAME}\.)?{NAME})",
+    re.IGNORECASE
+)
+SQL_KEYWORDS = {"SELECT", "WHERE", "VALUES", "SET", "TABLE", "LATERAL", "FINAL", "NEW", "OLD"}
+
+CICS_OPTION_PATTERN = re.compile(rf"\b(PROGRAM|MAPSET|MAP|FILE|DATASET|TRANSID)\s*\(\s*(?:{QUOTED}|({NAME}))\s*\)",
+                                 re.IGNORECASE)
+CICS_TYPES = {
+    "PROGRAM": "cics_program",
+    "MAP": "cics_map",
+    "MAPSET": "cics_mapset",
+    "FILE": "cics_file",
+    "DATASET": "cics_file",
+    "TRANSID": "cics_transaction"
+}
+
+JCL_EXEC_PATTERN = re.compile(rf"^//({NAME})?\s+EXEC\s+(?:PGM=({NAME})|(?:PROC=)?({NAME}))", re.IGNORECASE)
+JCL_DD_PATTERN = re.compile(rf"^//({NAME})?\s+DD\s+.*?\bDSN(?:AME)?=([A-Z0-9$#@.&()+-]+)", re.IGNORECASE)
+
+def extract_dependencies(code, file_path=None):
+    """
+    Extract dependencies from COBOL or JCL source without an LLM
+
+    Returns a list of {"type", "name"} records (some with extra detail such
+    as the ASSIGN name or JCL DD name), de-duplicated, in source order.
+    """
+    first_line = next((line for line in code.splitlines() if line.strip()), "")
+    is_jcl = first_line.startswith("//") or (
+        file_path is not None and os.path.splitext(file_path)[1].lower() in (".jcl", ".proc")
+    )
+    records = _extract_jcl(code) if is_jcl else _extract_cobol(_strip_cobol(code))
+
+    seen = set()
+    unique = []
+    for record in records:
+        key = tuple(sorted(record.items()))
+        if key not in seen:
+            seen.add(key)
+            unique.append(record)
+    return unique
+
+def extract_file(file_path, reader=None):
+    """Read a file and extract its dependencies; returns (file_path, records)"""
+    code = (reader or SourceReader()).read(file_path)
+    return file_path, extract_dependencies(code, file_path)
+
+def extract_all(file_paths, workers=None, reader=None):
+    """
+    Extract dependencies for many files across a process pool
+
+    Returns {file_path: [records]}. Small inputs, or workers <= 1, are
+    processed in this process to avoid pool start-up cost. reader (a
+    SourceReader) decodes the files; it is sent to each worker process.
+    """
+    file_paths = list(file_paths)
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(file_paths) < 2:
+        return dict(extract_file(path, reader) for path in file_paths)
+
+    chunksize = max(1, len(file_paths) // (workers * 8))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return dict(executor.map(partial(extract_file, reader=reader), file_paths, chunksize=chunksize))
+
+def _strip_cobol(code):
+    """Drop sequence areas and comment lines so statements can span lines"""
+    lines = []
+    raw_lines = code.splitlines()
+    identification = has_identification_area(raw_lines)
+    for line in raw_lines:
+        if len(line) > 6 and SEQUENCE_AREA.match(line):
+            if line[6] in "*/":
+                continue
+            lines.append(code_area(line, identification))
+        elif line.lstrip().startswith("*>"):
+            continue
+        else:
+            lines.append(line)
+    return "\n".join(lines)
+
+def _first(*groups):
+    """First non-empty regex group"""
+    return next(group for group in groups if group)
+
+def _extract_cobol(code):
+    """Dependencies of a (comment-stripped) COBOL program"""
+    records = []
+    literals = {match.group(1).upper(): _first(match.group(2), match.group(3))
+                for match in VALUE_PATTERN.finditer(code)}
+
+    for match in COPY_PATTERN.finditer(code):
+        records.append({"type": "copybook", "name": _first(*match.groups()).upper()})
+
+    for match in CALL_PATTERN.finditer(code):
+        quoted = match.group(1) or match.group(2)
+        if quoted:
+            records.append({"type": "program", "name": quoted.upper(), "call": "static"})
+        else:
+            variable = match.group(3).upper()
+            record = {"type": "dynamic_call", "name": variable}
+            if variable in literals:
+                # Dynamic call through a field initialised with a program name
+                record["resolved"] = literals[variable].strip().upper()
+            records.append(record)
+
+    for match in SELECT_PATTERN.finditer(code):
+        records.append({
+            "type": "file",
+            "name": match.group(1).upper(),
+            "assign": _first(match.group(2), match.group(3), match.group(4)).upper()
+        })
+
+    for match in EXEC_BLOCK_PATTERN.finditer(code):
+        kind, body = match.group(1).upper(), match.group(2)
+        if kind == "SQL":
+            records.extend(_extract_sql(body))
+        else:
+            records.extend(_extract_cics(body))
+
+    return records
+
+def _extract_sql(body):
+    """Tables and INCLUDE members referenced by an EXEC SQL block"""
+    include = SQL_INCLUDE_PATTERN.match(body)
+    if include:
+        name = include.group(1).upper()
+        # SQLCA/SQLDA are precompiler-provided, not library members
+        return [] if name in ("SQLCA", "SQLDA") else [{"type": "copybook", "name": name}]
+
+    records = []
+    for match in SQL_TABLE_PATTERN.finditer(body):
+        name = match.group(1).upper()
+        if name not in SQL_KEYWORDS:
+            records.append({"type": "db2_table", "name": name})
+    return records
+
+def _extract_cics(body):
+    """Programs, maps, files and transactions referenced by an EXEC CICS block"""
+    records = []
+    for match in CICS_OPTION_PATTERN.finditer(body):
+        option = match.group(1).upper()
+        name = _first(match.group(2), match.group(3), match.group(4)).upper()
+        records.append({"type": CICS_TYPES[option], "name": name})
+    return records
+
+def _extract_jcl(code):
+    """Programs, procedures and datasets referenced by JCL"""
+    records = []
+    for line in code.splitlines():
+        if line.startswith("//*"):
+            continue
+        match = JCL_EXEC_PATTERN.match(line)
+        if match:
+            if match.group(2):
+                records.append({"type": "program", "name": match.group(2).upper()})
+            else:
+                records.append({"type": "jcl_proc", "name": match.group(3).upper()})
+            continue
+        match = JCL_DD_PATTERN.match(line)
+        if match:
+            record = {"type": "dataset", "name": match.group(2).upper()}
+            if match.group(1):
+                record["dd"] = match.group(1).upper()
+            records.append(record)
+    return records
@@ -0,0 +1,345 @@
+import json
+import os
+from collections import deque
+
+# Edge type for each static dependency record type
+EDGE_TYPES = {
+    "program": "calls",
+    "dynamic_call": "calls",
+    "cics_program": "calls",
+    "copybook": "copies",
+    "file": "uses_dataset",
+    "dataset": "uses_dataset",
+    "cics_file": "uses_dataset",
+    "db2_table": "uses_table",
+    "cics_map": "uses_map",
+    "cics_mapset": "uses_map",
+    "cics_transaction": "starts",
+    "jcl_proc": "runs_proc"
+}
+
+# Node kind for the target of each edge type
+TARGET_KINDS = {
+    "calls": "program",
+    "copies": "copybook",
+    "uses_dataset": "dataset",
+    "uses_table": "table",
+    "uses_map": "map",
+    "starts": "transaction",
+    "runs_proc": "proc"
+}
+
+# Dependencies on these kinds order the levels; datasets, tables, maps and
+# transactions are not sources to convert first, so edges to them do not
+ORDERING_KINDS = {"program", "copybook", "proc"}
+
+COPYBOOK_EXTENSIONS = {".cpy", ".copy", ".cbk"}
+JCL_EXTENSIONS = {".jcl", ".proc"}
+
+def member_name(file_path):
+    """Mainframe member name for a source file: CUSTUPDT for src/custupdt.cbl"""
+    return os.path.splitext(os.path.basename(file_path))[0].upper()
+
+class DependencyGraph:
+    """
+    Program / copybook / dataset dependency graph with compact persistence
+
+    Nodes are (kind, name) pairs numbered 0..n-1. Edges are stored in
+    compressed sparse row form in both directions (offsets into flat target
+    and edge-type arrays), so "what does X use" and "who uses X" are both a
+    slice lookup. The same arrays are what gets written to disk.
+    """
+
+    def __init__(self):
+        self.kinds = []
+        self.names = []
+        self.files = []
+        self.edge_types = sorted(set(EDGE_TYPES.values()))
+        self._ids = {}
+        # Node ids by name across kinds, for find() without a kind
+        self._by_name = {}
+        self._pending_edges = set()
+        self.out_offsets = [0]
+        self.out_targets = []
+        self.out_types = []
+        self.in_offsets = [0]
+        self.in_sources = []
+        self.in_types = []
+
+    @classmethod
+    def from_static_dependencies(cls, static_dependencies):
+        """Build a graph from {file_path: [{type, name, ...}]} extractor output"""
+        graph = cls()
+        for file_path, records in static_dependencies.items():
+            ext = os.path.splitext(file_path)[1].lower()
+            kind = "copybook" if ext in COPYBOOK_EXTENSIONS else "job" if ext in JCL_EXTENSIONS else "program"
+            source = graph._add_node(kind, member_name(file_path), file_path)
+
+            for record in records:
+                edge_type = EDGE_TYPES.get(record["type"])
+                if edge_type is None:
+                    continue
+                name = record["name"]
+                if record["type"] == "dynamic_call":
+                    if "resolved" not in record:
+                        continue  # target unknown until run time
+                    name = record["resolved"]
+                target = graph._add_node(TARGET_KINDS[edge_type], name)
+                graph._pending_edges.add((source, target, graph.edge_types.index(edge_type)))
+
+        graph._finalize()
+        return graph
+
+    @classmethod
+    def load(cls, path):
+        """Load a graph saved with save()"""
+        with open(path, 'r') as f:
+            data = json.load(f)
+        graph = cls()
+        graph.edge_types = data["edge_types"]
+        graph.kinds = data["kinds"]
+        graph.names = data["names"]
+        graph.files = data["files"]
+        graph.out_offsets = data["out_offsets"]
+        graph.out_targets = data["out_targets"]
+        graph.out_types = data["out_types"]
+        graph._ids = {(kind, name): node for node, (kind, name) in enumerate(zip(graph.kinds, graph.names))}
+        for node, name in enumerate(graph.names):
+            graph._by_name.setdefault(name, []).append(node)
+        graph._build_reverse()
+        return graph
+
+    def save(self, path):
+        """Write the graph's node table and forward adjacency arrays"""
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                "version": 1,
+                "edge_types": self.edge_types,
+                "kinds": self.kinds,
+                "names": self.names,
+                "files": self.files,
+                "out_offsets": self.out_offsets,
+                "out_targets": self.out_targets,
+                "out_types": self.out_types
+            }, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    def __len__(self):
+        return len(self.names)
+
+    def find(self, name, kind=None):
+        """Node ids with the given name (optionally restricted to one kind)"""
+        name = name.upper()
+        if kind:
+            node = self._ids.get((kind, name))
+            return [] if node is None else [node]
+        return list(self._by_name.get(name, []))
+
+    def describe(self, node):
+        """Node as a {kind, name, file} dict"""
+        return {"kind": self.kinds[node], "name": self.names[node], "file": self.files[node]}
+
+    def successors(self, node, edge_type=None):
+        """Nodes that node depends on directly"""
+        return self._slice(self.out_offsets, self.out_targets, self.out_types, node, edge_type)
+
+    def predecessors(self, node, edge_type=None):
+        """Nodes that depend on node directly"""
+        return self._slice(self.in_offsets, self.in_sources, self.in_types, node, edge_type)
+
+    def callers(self, program):
+        """Names of programs that call program"""
+        return self._names_of(self.predecessors, program, "program", "calls")
+
+    def callees(self, program):
+        """Names of programs that program calls"""
+        return self._names_of(self.successors, program, None, "calls")
+
+    def copied_by(self, copybook):
+        """Names of members that COPY copybook"""
+        return self._names_of(self.predecessors, copybook, "copybook", "copies")
+
+    def fan_in(self, node):
+        """Number of direct dependents"""
+        return self.in_offsets[node + 1] - self.in_offsets[node]
+
+    def fan_out(self, node):
+        """Number of direct dependencies"""
+        return self.out_offsets[node + 1] - self.out_offsets[node]
+
+    def transitive_dependencies(self, node):
+        """Every node reachable from node (excluding node itself unless on a cycle)"""
+        return self._reach(node, self.successors)
+
+    def transitive_dependents(self, node):
+        """Every node that can reach node"""
+        return self._reach(node, self.predecessors)
+
+    def strongly_connected_components(self):
+        """Strongly connected components (iterative Tarjan), each a list of node ids"""
+        index_of = [-1] * len(self)
+        lowlink = [0] * len(self)
+        on_stack = [False] * len(self)
+        stack = []
+        components = []
+        counter = 0
+
+        for root in range(len(self)):
+            if index_of[root] != -1:
+                continue
+            work = [(root, 0)]
+            while work:
+                node, edge_pos = work.pop()
+                if edge_pos == 0:
+                    index_of[node] = lowlink[node] = counter
+                    counter += 1
+                    stack.append(node)
+                    on_stack[node] = True
+
+                start = self.out_offsets[node]
+                end = self.out_offsets[node + 1]
+                recursed = False
+                for pos in range(start + edge_pos, end):
+                    target = self.out_targets[pos]
+                    if index_of[target] == -1:
+                        work.append((node, pos - start + 1))
+                        work.append((target, 0))
+                        recursed = True
+                        break
+                    if on_stack[target]:
+                        lowlink[node] = min(lowlink[node], index_of[target])
+                if recursed:
+                    continue
+
+                if lowlink[node] == index_of[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = False
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+
+        return components
+
+    def topological_levels(self):
+        """
+        Group nodes into dependency levels, leaves first
+
+        Level 0 holds nodes with no dependencies; every other node sits one
+        level above its deepest dependency. Only programs, copybooks and
+        procs count as dependencies (ORDERING_KINDS): a program that just
+        reads a dataset or table stays at level 0. Nodes in a cycle share a
+        level. Nodes within a level are independent of each other.
+        """
+        components = self.strongly_connected_components()
+        component_of = [0] * len(self)
+        for component_id, component in enumerate(components):
+            for node in component:
+                component_of[node] = component_id
+
+        # Tarjan emits components in reverse topological order (dependencies
+        # first), so one pass assigns every component its level
+        levels_of = [0] * len(components)
+        for component_id, component in enumerate(components):
+            level = 0
+            for node in component:
+                for target in self.successors(node):
+                    other = component_of[target]
+                    if other != component_id and self.kinds[target] in ORDERING_KINDS:
+                        level = max(level, levels_of[other] + 1)
+            levels_of[component_id] = level
+
+        levels = []
+        for component_id, component in enumerate(components):
+            level = levels_of[component_id]
+            while len(levels) <= level:
+                levels.append([])
+            levels[level].extend(component)
+        return levels
+
+    def file_levels(self):
+        """Map each source file in the graph to its topological level"""
+        result = {}
+        for level, nodes in enumerate(self.topological_levels()):
+            for node in nodes:
+                if self.files[node]:
+                    result[os.path.abspath(self.files[node])] = level
+        return result
+
+    def _add_node(self, kind, name, file_path=None):
+        """Return the id of (kind, name), creating the node if needed"""
+        key = (kind, name.upper())
+        node = self._ids.get(key)
+        if node is None:
+            node = len(self.names)
+            self._ids[key] = node
+            self._by_name.setdefault(key[1], []).append(node)
+            self.kinds.append(kind)
+            self.names.append(key[1])
+            self.files.append(None)
+        if file_path and not self.files[node]:
+            self.files[node] = file_path
+        return node
+
+    def _finalize(self):
+        """Turn the pending edge set into forward and reverse CSR arrays"""
+        edges = sorted(self._pending_edges)
+        self._pending_edges = set()
+        self.out_offsets = [0] * (len(self) + 1)
+        for source, _, _ in edges:
+            self.out_offsets[source + 1] += 1
+        for node in range(len(self)):
+            self.out_offsets[node + 1] += self.out_offsets[node]
+        self.out_targets = [target for _, target, _ in edges]
+        self.out_types = [edge_type for _, _, edge_type in edges]
+        self._build_reverse()
+
+    def _build_reverse(self):
+        """Derive the reverse (incoming edge) CSR arrays from the forward ones"""
+        incoming = []
+        for source in range(len(self)):
+            for pos in range(self.out_offsets[source], self.out_offsets[source + 1]):
+                incoming.append((self.out_targets[pos], source, self.out_types[pos]))
+        incoming.sort()
+        self.in_offsets = [0] * (len(self) + 1)
+        for target, _, _ in incoming:
+            self.in_offsets[target + 1] += 1
+        for node in range(len(self)):
+            self.in_offsets[node + 1] += self.in_offsets[node]
+        self.in_sources = [source for _, source, _ in incoming]
+        self.in_types = [edge_type for _, _, edge_type in incoming]
+
+    def _slice(self, offsets, nodes, types, node, edge_type):
+        """Neighbours of node from one CSR direction, optionally filtered by edge type"""
+        start, end = offsets[node], offsets[node + 1]
+        if edge_type is None:
+            return nodes[start:end]
+        type_id = self.edge_types.index(edge_type)
+        return [nodes[pos] for pos in range(start, end) if types[pos] == type_id]
+
+    def _names_of(self, neighbours, name, kind, edge_type):
+        """Sorted names of neighbours of every node called name"""
+        result = set()
+        for node in self.find(name, kind):
+            result.update(self.names[other] for other in neighbours(node, edge_type))
+        return sorted(result)
+
+    def _reach(self, node, neighbours):
+        """Breadth-first closure from node"""
+        seen = set()
+        queue = deque(neighbours(node))
+        while queue:
+            other = queue.popleft()
+            if other in seen:
+                continue
+            seen.add(other)
+            queue.extend(neighbours(other))
+        return seen
@@ -0,0 +1,161 @@
+import fnmatch
+import json
+import os
+import re
+from utils.metrics import metrics
+
+DEFAULT_EXTENSIONS = ['.cbl', '.cob', '.jcl', '.asm', '.pli', '.cobol']
+
+# PDS member names as downloaded without an extension: CUSTUPDT, PAY$01
+PDS_MEMBER_PATTERN = re.compile(r"^[A-Z$#@][A-Z0-9$#@]{0,7}$")
+
+class SourceDiscovery:
+    """
+    Finds mainframe source files under a path
+
+    Directories are read with os.scandir and files are yielded as soon as
+    their directory has been read, so callers can start work before a large
+    tree has been fully walked. Supports include/exclude globs (matched
+    against the path relative to the source root), extensionless PDS member
+    names, and protection against symlink loops. An optional cache file
+    stores each directory's listing with its mtime so unchanged directories
+    are not re-read on the next run.
+    """
+
+    def __init__(self, extensions=None, include=None, exclude=None,
+                 include_members=False, follow_symlinks=True, cache_file=None):
+        self.extensions = {ext.lower() for ext in (extensions or DEFAULT_EXTENSIONS)}
+        self.include = list(include or [])
+        self.exclude = list(exclude or [])
+        self.include_members = include_members
+        self.follow_symlinks = follow_symlinks
+        self.cache_file = cache_file or None
+        self._cache = None
+
+    @classmethod
+    def from_config(cls, config):
+        """Build a discovery service from the `discovery` config section"""
+        return cls(
+            extensions=config.get("extensions"),
+            include=config.get("include"),
+            exclude=config.get("exclude"),
+            include_members=config.get("include_members", False),
+            follow_symlinks=config.get("follow_symlinks", True),
+            cache_file=config.get("cache_file")
+        )
+
+    def iter_files(self, source, extensions=None):
+        """Lazily yield matching file paths under source, in a stable order"""
+        if os.path.isfile(source):
+            yield source
+            return
+
+        extensions = {ext.lower() for ext in extensions} if extensions is not None else self.extensions
+        self._load_cache()
+        visited = set()
+        stack = [(source, "")]
+        try:
+            while stack:
+                directory, relative_dir = stack.pop()
+                try:
+                    stat = os.stat(directory)
+                except OSError:
+                    continue
+                # Symlinked directories can point back up the tree
+                identity = (stat.st_dev, stat.st_ino)
+                if identity in visited:
+                    continue
+                visited.add(identity)
+
+                with metrics.span("discovery", directory=directory):
+                    subdirs, files = self._list_directory(directory, stat.st_mtime_ns)
+                for name, _, _ in files:
+                    if self._matches_file(name, relative_dir + name, extensions):
+                        yield os.path.join(directory, name)
+
+                # Reversed so the stack pops directories in name order
+                for name in reversed(subdirs):
+                    if not self._is_excluded(relative_dir + name):
+                        stack.append((os.path.join(directory, name), relative_dir + name + "/"))
+        finally:
+            self._save_cache()
+
+    def list_files(self, source, extensions=None):
+        """Return all matching file paths under source"""
+        return list(self.iter_files(source, extensions))
+
+    def _list_directory(self, directory, mtime_ns):
+        """Return (subdirectory names, [(file name, mtime_ns, size)]) for a directory"""
+        key = os.path.abspath(directory)
+        if self._cache is not None:
+            cached = self._cache.get(key)
+            if cached and cached["mtime"] == mtime_ns:
+                return cached["dirs"], [tuple(entry) for entry in cached["files"]]
+
+        subdirs = []
+        files = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=self.follow_symlinks):
+                            subdirs.append(entry.name)
+                        elif entry.is_file(follow_symlinks=self.follow_symlinks):
+                            stat = entry.stat(follow_symlinks=self.follow_symlinks)
+                            files.append((entry.name, stat.st_mtime_ns, stat.st_size))
+                    except OSError:
+                        continue  # dangling symlink or entry removed mid-walk
+        except OSError as e:
+            print(f"Warning: Cannot read directory {directory}: {e}")
+            return [], []
+
+        subdirs.sort()
+        files.sort()
+        if self._cache is not None:
+            self._cache[key] = {"mtime": mtime_ns, "dirs": subdirs, "files": files}
+        return subdirs, files
+
+    def _matches_file(self, name, relative_path, extensions):
+        """Check extension (or PDS member name) and include/exclude globs"""
+        ext = os.path.splitext(name)[1].lower()
+        if ext:
+            if ext not in extensions:
+                return False
+        elif not (self.include_members and PDS_MEMBER_PATTERN.match(name)):
+            return False
+
+        if self._is_excluded(relative_path):
+            return False
+        if self.include:
+            return any(fnmatch.fnmatch(relative_path, pattern) or fnmatch.fnmatch(name, pattern)
+                       for pattern in self.include)
+        return True
+
+    def _is_excluded(self, relative_path):
+        """Check a relative path (forward slashes) against the exclude globs"""
+        if not self.exclude:
+            return False
+        name = relative_path.rsplit("/", 1)[-1]
+        return any(fnmatch.fnmatch(relative_path, pattern) or fnmatch.fnmatch(name, pattern)
+                   for pattern in self.exclude)
+
+    def _load_cache(self):
+        """Load the listing cache if one is configured"""
+        if not self.cache_file or self._cache is not None:
+            return
+        try:
+            with open(self.cache_file, 'r') as f:
+                self._cache = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self._cache = {}
+
+    def _save_cache(self):
+        """Persist the listing cache if one is configured"""
+        if not self.cache_file or self._cache is None:
+            return
+        if os.path.dirname(self.cache_file):
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+        tmp_path = self.cache_file + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self._cache, f)
+        os.replace(tmp_path, self.cache_file)
@@ -0,0 +1,269 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+from utils.metrics import metrics
+
+# queued -> leased -> done, or back to queued after a failure, or dead once
+# max_attempts leases have failed or expired
+STATES = ("queued", "leased", "done", "dead")
+
+class JobQueue:
+    """
+    Persistent work queue of agent jobs in a SQLite database
+
+    Each job runs one agent on one source (usually a single file) with its
+    own output. Workers lease a job for visibility_timeout seconds and keep
+    extending the lease while they work; a job whose lease runs out (its
+    worker crashed or lost the host) becomes available to other workers.
+    Failed jobs are retried with exponential backoff and moved to the dead
+    state after max_attempts. Enqueueing the same mode, source and output
+    again in the same wave is a no-op, so an interrupted enqueue can simply
+    be repeated; a new wave runs them again.
+
+    Jobs carry a level: a job is only leased once every job of a lower level
+    in its wave is done or dead (transform uses the dependency graph levels).
+    """
+
+    def __init__(self, path, journal_mode="wal", max_attempts=3, retry_delay=30):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Transactions are managed explicitly so a lease is one BEGIN IMMEDIATE
+        self._conn = sqlite3.connect(path, timeout=60, check_same_thread=False, isolation_level=None)
+        # WAL needs shared memory, so it only works for workers on one host;
+        # use "delete" when hosts share the database over NFS
+        self._conn.execute(f"PRAGMA journal_mode={journal_mode}")
+        self._conn.execute("PRAGMA busy_timeout=60000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY,"
+            " wave TEXT NOT NULL,"
+            " mode TEXT NOT NULL,"
+            " source TEXT NOT NULL,"
+            " output TEXT NOT NULL,"
+            " options TEXT NOT NULL,"
+            " level INTEGER NOT NULL DEFAULT 0,"
+            " state TEXT NOT NULL DEFAULT 'queued',"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " max_attempts INTEGER NOT NULL,"
+            " available_at REAL NOT NULL,"
+            " lease_owner TEXT,"
+            " lease_expires REAL,"
+            " enqueued_at REAL NOT NULL,"
+            " finished_at REAL,"
+            " result TEXT,"
+            " error TEXT,"
+            " UNIQUE (wave, mode, source, output))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, level, id)")
+
+    def enqueue(self, mode, tasks, options=None, wave="default"):
+        """
+        Add jobs for (source, output, level, options) tasks of an agent mode
+
+        options are extra keyword arguments for the agent's process(), with
+        each task's own options on top. Paths are stored absolute, so workers
+        started from any directory find them. Returns the number of jobs
+        added; tasks already in the wave are skipped.
+        """
+        now = time.time()
+        rows = [(wave, mode, os.path.abspath(source), os.path.abspath(output) if output else "",
+                 json.dumps({**(options or {}), **task_options}, sort_keys=True),
+                 level, self.max_attempts, now, now)
+                for source, output, level, task_options in tasks]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                before = self._conn.total_changes
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO jobs (wave, mode, source, output, options, level, max_attempts,"
+                    " available_at, enqueued_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+                )
+                added = self._conn.total_changes - before
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return added
+
+    def lease(self, owner, visibility_timeout):
+        """Lease the next available job for owner; returns it as a dict, or None"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Expired leases whose last attempt was used up are dead letters
+                self._conn.execute(
+                    "UPDATE jobs SET state = 'dead', finished_at = ?, lease_owner = NULL,"
+                    " error = COALESCE(error || '\n', '') || 'Lease expired on attempt ' || attempts"
+                    " WHERE state = 'leased' AND lease_expires < ? AND attempts >= max_attempts",
+                    (now, now)
+                )
+                row = self._conn.execute(
+                    "SELECT id, wave, mode, source, output, options, attempts FROM jobs AS job"
+                    " WHERE ((state = 'queued' AND available_at <= ?) OR (state = 'leased' AND lease_expires < ?))"
+                    " AND level <= (SELECT MIN(level) FROM jobs WHERE wave = job.wave"
+                    "               AND state IN ('queued', 'leased'))"
+                    " ORDER BY level, id LIMIT 1",
+                    (now, now)
+                ).fetchone()
+                if row:
+                    self._conn.execute(
+                        "UPDATE jobs SET state = 'leased', lease_owner = ?, lease_expires = ?,"
+                        " attempts = attempts + 1 WHERE id = ?",
+                        (owner, now + visibility_timeout, row[0])
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        if not row:
+            return None
+        job_id, wave, mode, source, output, options, attempts = row
+        return {"id": job_id, "wave": wave, "mode": mode, "source": source, "output": output or None,
+                "options": json.loads(options), "attempt": attempts + 1}
+
+    def heartbeat(self, job_id, owner, visibility_timeout):
+        """Extend a lease; False when owner no longer holds it"""
+        return self._finish_update(
+            "UPDATE jobs SET lease_expires = ? WHERE id = ? AND state = 'leased' AND lease_owner = ?",
+            (time.time() + visibility_timeout, job_id, owner)
+        )
+
+    def complete(self, job_id, owner, result):
+        """Record a job's result; False when its lease had already been lost"""
+        return self._finish_update(
+            "UPDATE jobs SET state = 'done', finished_at = ?, result = ?, lease_owner = NULL"
+            " WHERE id = ? AND state = 'leased' AND lease_owner = ?",
+            (time.time(), json.dumps(result, default=str), job_id, owner)
+        )
+
+    def fail(self, job_id, owner, error):
+        """Queue a failed job again after a backoff, or make it a dead letter after its last attempt"""
+        now = time.time()
+        return self._finish_update(
+            "UPDATE jobs SET error = COALESCE(error || '\n', '') || ?, lease_owner = NULL,"
+            " state = CASE WHEN attempts >= max_attempts THEN 'dead' ELSE 'queued' END,"
+            " finished_at = CASE WHEN attempts >= max_attempts THEN ? END,"
+            " available_at = ? + ? * (1 << (attempts - 1))"
+            " WHERE id = ? AND state = 'leased' AND lease_owner = ?",
+            (error, now, now, self.retry_delay, job_id, owner)
+        )
+
+    def retry_dead(self, wave=None):
+        """Queue dead jobs (of one wave, or all) again with fresh attempts; returns how many"""
+        query = ("UPDATE jobs SET state = 'queued', attempts = 0, available_at = ?, finished_at = NULL"
+                 " WHERE state = 'dead'")
+        params = [time.time()]
+        if wave:
+            query += " AND wave = ?"
+            params.append(wave)
+        with self._lock:
+            return self._conn.execute(query, params).rowcount
+
+    def stats(self, wave=None):
+        """Number of jobs in each state"""
+        query = "SELECT state, COUNT(*) FROM jobs"
+        params = []
+        if wave:
+            query += " WHERE wave = ?"
+            params.append(wave)
+        with self._lock:
+            counts = dict(self._conn.execute(query + " GROUP BY state", params).fetchall())
+        return {state: counts.get(state, 0) for state in STATES}
+
+    def close(self):
+        """Close the underlying database"""
+        with self._lock:
+            self._conn.close()
+
+    def _finish_update(self, query, params):
+        """Run a single-row update; True when the row matched"""
+        with self._lock:
+            return self._conn.execute(query, params).rowcount == 1
+
+class _Heartbeat:
+    """Extends a job's lease from a background thread while the job runs"""
+
+    def __init__(self, queue, job_id, owner, visibility_timeout, interval):
+        self.queue = queue
+        self.job_id = job_id
+        self.owner = owner
+        self.visibility_timeout = visibility_timeout
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if not self.queue.heartbeat(self.job_id, self.owner, self.visibility_timeout):
+                    print(f"Warning: Lost the lease on job {self.job_id}; another worker may rerun it")
+                    return
+            except sqlite3.Error as e:
+                # The database may be busy; the lease lasts several intervals
+                print(f"Warning: Heartbeat for job {self.job_id} failed: {e}")
+
+def worker_id():
+    """Lease owner name: host and process"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def run_worker(queue, create_agent, visibility_timeout=600, heartbeat_interval=60, poll_interval=5,
+               exit_when_empty=True, max_jobs=0):
+    """
+    Lease and run jobs until the queue is drained (or max_jobs have run)
+
+    create_agent(mode) returns the agent for a job's mode. A job fails when
+    its agent raises or returns an "error"; its result dict is stored
+    otherwise. With exit_when_empty off, the worker keeps polling for new
+    jobs. Returns counts of the jobs this worker completed and failed.
+    """
+    owner = worker_id()
+    completed = failed = 0
+    while not max_jobs or completed + failed < max_jobs:
+        job = queue.lease(owner, visibility_timeout)
+        if job is None:
+            stats = queue.stats()
+            # Leased jobs may still come back if their worker dies
+            if exit_when_empty and not stats["queued"] and not stats["leased"]:
+                break
+            time.sleep(poll_interval)
+            continue
+
+        print(f"[{owner}] Job {job['id']} (attempt {job['attempt']}): {job['mode']} {job['source']}")
+        with metrics.span("job", mode=job["mode"], job=job["id"]) as span:
+            with _Heartbeat(queue, job["id"], owner, visibility_timeout, heartbeat_interval):
+                try:
+                    result = create_agent(job["mode"]).process(job["source"], job["output"], **job["options"])
+                    error = result.get("error") if isinstance(result, dict) else None
+                except Exception:
+                    result, error = None, traceback.format_exc()
+            span.set(result="failed" if error else "done")
+
+        if error:
+            failed += 1
+            print(f"[{owner}] Job {job['id']} failed: {error.strip().splitlines()[-1]}")
+        else:
+            completed += 1
+        recorded = queue.fail(job["id"], owner, error) if error else queue.complete(job["id"], owner, result)
+        if not recorded:
+            print(f"Warning: Job {job['id']} finished after its lease was lost; its outcome was not recorded")
+        if metrics.enabled:
+            metrics.count("jobs", 1, result="failed" if error else "done")
+    return {"completed": completed, "failed": failed}
@@ -0,0 +1,110 @@
+import json
+import os
+import threading
+
+class JsonlWriter:
+    """
+    Appends JSON records to a file, one per line
+
+    Records are flushed to the OS every `flush_every` writes and on close, so
+    an interrupted run keeps everything written up to the last flush.
+    """
+
+    def __init__(self, path, flush_every=10, append=True):
+        self.path = path
+        self.flush_every = max(1, flush_every)
+        self.count = 0
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(path, 'a' if append else 'w')
+
+    def write(self, record):
+        """Append a single record"""
+        line = json.dumps(record) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self.count += 1
+            if self.count % self.flush_every == 0:
+                self._file.flush()
+
+    def close(self):
+        """Flush and close the file"""
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+def iter_jsonl(path):
+    """Lazily yield records from a JSONL file, skipping blank or truncated lines"""
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # A crash can leave a partial last line behind
+                continue
+
+class JsonlIndex:
+    """
+    Maps a key field of a JSONL file to the byte offset of its latest record
+
+    Only offsets are kept in memory; records are read back on demand.
+    """
+
+    def __init__(self, path, key="file"):
+        self.path = path
+        self.offsets = {}
+        if not os.path.exists(path):
+            return
+
+        with open(path, 'rb') as f:
+            offset = 0
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    self.offsets[record[key]] = offset
+                except (json.JSONDecodeError, UnicodeDecodeError, KeyError, TypeError):
+                    pass
+                offset += len(line)
+
+    def __contains__(self, key):
+        return key in self.offsets
+
+    def __getitem__(self, key):
+        with open(self.path, 'rb') as f:
+            f.seek(self.offsets[key])
+            return json.loads(f.readline())
+
+    def __len__(self):
+        return len(self.offsets)
+
+def compact_jsonl(path, keys, key="file"):
+    """
+    Rewrite a JSONL file keeping only the latest record for each of keys, in that order
+
+    Records for keys that are not listed (e.g. deleted sources) are dropped.
+    The file is streamed, so memory use is proportional to the number of keys.
+    """
+    index = JsonlIndex(path, key)
+    tmp_path = path + ".tmp"
+    with open(path, 'rb') as src, open(tmp_path, 'wb') as dst:
+        for name in keys:
+            offset = index.offsets.get(name)
+            if offset is None:
+                continue
+            src.seek(offset)
+            line = src.readline()
+            dst.write(line if line.endswith(b"\n") else line + b"\n")
+    os.replace(tmp_path, path)
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking
+    fcntl = None
+
+MANIFEST_NAME = ".mainframe_manifest.json"
+
+def hash_text(text):
+    """Content hash used for sources, templates and rules"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class RunManifest:
+    """
+    Records which inputs produced each output of a mode
+
+    The manifest lives in the output directory as .mainframe_manifest.json,
+    with one section per mode. Each source file maps to the hash of its
+    content, the other inputs that shaped its output (template, rules, model)
+    and the output paths written for it. A later run can skip any file whose
+    entry still matches and whose outputs still exist.
+    """
+
+    def __init__(self, output_dir, mode, autosave_every=50):
+        self.path = os.path.join(output_dir or ".", MANIFEST_NAME)
+        self.mode = mode
+        self.autosave_every = autosave_every
+        self.skipped = 0
+        self._pending = 0
+        # Entries recorded by this process since the last write
+        self._changed = set()
+        self._lock = threading.Lock()
+        self._data = self._load()
+        self._entries = self._data.setdefault("modes", {}).setdefault(mode, {})
+
+    def is_current(self, file_path, source_hash, inputs, outputs):
+        """Check whether file_path was already processed with the same inputs"""
+        entry = self._entries.get(os.path.abspath(file_path))
+        current = (
+            entry is not None
+            and entry.get("source_hash") == source_hash
+            and entry.get("inputs") == inputs
+            and entry.get("outputs") == list(outputs)
+            and all(os.path.exists(path) for path in outputs)
+        )
+        if current:
+            with self._lock:
+                self.skipped += 1
+        return current
+
+    def record(self, file_path, source_hash, inputs, outputs):
+        """Record the inputs and outputs for a processed file"""
+        with self._lock:
+            self._entries[os.path.abspath(file_path)] = {
+                "source_hash": source_hash,
+                "inputs": inputs,
+                "outputs": list(outputs)
+            }
+            self._changed.add(os.path.abspath(file_path))
+            self._pending += 1
+            if self.autosave_every and self._pending >= self.autosave_every:
+                self._write()
+
+    def save(self):
+        """Write the manifest to disk"""
+        with self._lock:
+            self._write()
+
+    def _write(self):
+        """
+        Atomically replace the manifest file (caller holds the lock)
+
+        Queue workers may update one manifest from several processes or
+        hosts, so the file is locked, read again, and only the entries this
+        process recorded are merged into it.
+        """
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        with open(self.path + ".lock", 'a') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            data = self._load()
+            entries = data.setdefault("modes", {}).setdefault(self.mode, {})
+            for key in self._changed:
+                entries[key] = self._entries[key]
+            self._data, self._entries = data, entries
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(self.path) + ".", suffix=".tmp")
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, self.path)
+        self._changed = set()
+        self._pending = 0
+
+    def _load(self):
+        """Load an existing manifest, starting fresh if it is missing or unreadable"""
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            if data.get("version") == 1:
+                return data
+        except (FileNotFoundError, json.JSONDecodeError, AttributeError):
+            pass
+        return {"version": 1, "modes": {}}
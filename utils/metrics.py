@@ -0,0 +1,181 @@
+import json
+import os
+import threading
+import time
+
+class _NullSpan:
+    """Span returned while metrics are disabled; does nothing"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+_NULL_SPAN = _NullSpan()
+
+class _Span:
+    """Times one stage and records it on exit"""
+
+    def __init__(self, metrics, stage, attrs):
+        self.metrics = metrics
+        self.stage = stage
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.metrics._record(self.stage, self.start, time.perf_counter(), self.attrs)
+        return False
+
+    def set(self, **attrs):
+        """Attach attributes known only once the stage has started (token counts, cache hits)"""
+        self.attrs.update(attrs)
+
+class Metrics:
+    """
+    Per-stage timings and counters for a run
+
+    Disabled by default: span() then returns a shared no-op context manager
+    and count() returns immediately, so instrumented code pays almost
+    nothing. When enabled, every span is kept as a trace event (up to
+    max_events) and aggregated per stage, and counters are summed per name
+    and labels.
+    """
+
+    def __init__(self, max_events=200000):
+        self.enabled = False
+        self.max_events = max_events
+        self._lock = threading.Lock()
+        self.reset()
+
+    def enable(self, enabled=True):
+        """Turn recording on (or off)"""
+        self.enabled = enabled
+
+    def reset(self):
+        """Drop everything recorded so far"""
+        with self._lock:
+            self._origin = time.perf_counter()
+            self._events = []
+            self._dropped = 0
+            self._stages = {}
+            self._counters = {}
+
+    def span(self, stage, **attrs):
+        """Context manager timing one occurrence of stage"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, stage, attrs)
+
+    def count(self, name, value=1, **labels):
+        """Add value to the counter name (optionally split by labels)"""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def summary(self):
+        """Aggregates as {"stages": {stage: {count, seconds, max_seconds}}, "counters": {...}}"""
+        with self._lock:
+            stages = {stage: dict(values) for stage, values in self._stages.items()}
+            counters = {_counter_label(name, labels): value
+                        for (name, labels), value in sorted(self._counters.items())}
+        return {"stages": stages, "counters": counters}
+
+    def write(self, prefix):
+        """
+        Write <prefix>.trace.json and <prefix>.prom
+
+        The trace uses the Chrome trace event format (viewable in Perfetto or
+        chrome://tracing); the .prom file is a Prometheus text exposition of
+        the per-stage and counter aggregates.
+        """
+        if prefix.endswith(".json"):
+            prefix = prefix[:-len(".json")]
+        if os.path.dirname(prefix):
+            os.makedirs(os.path.dirname(prefix), exist_ok=True)
+
+        with self._lock:
+            events = list(self._events)
+            dropped = self._dropped
+        trace_path = f"{prefix}.trace.json"
+        with open(trace_path, 'w') as f:
+            json.dump({
+                "traceEvents": events,
+                "displayTimeUnit": "ms",
+                "otherData": dict(self.summary(), dropped_events=dropped)
+            }, f)
+
+        prom_path = f"{prefix}.prom"
+        with open(prom_path, 'w') as f:
+            f.write(self.prometheus_text())
+        return trace_path, prom_path
+
+    def prometheus_text(self):
+        """Aggregates in the Prometheus text exposition format"""
+        summary = self.summary()
+        lines = [
+            "# HELP mainframe_stage_duration_seconds Time spent per pipeline stage",
+            "# TYPE mainframe_stage_duration_seconds summary"
+        ]
+        for stage, values in sorted(summary["stages"].items()):
+            lines.append(f'mainframe_stage_duration_seconds_sum{{stage="{stage}"}} {values["seconds"]:.6f}')
+            lines.append(f'mainframe_stage_duration_seconds_count{{stage="{stage}"}} {values["count"]}')
+        lines.append("# HELP mainframe_stage_duration_seconds_max Longest single occurrence per stage")
+        lines.append("# TYPE mainframe_stage_duration_seconds_max gauge")
+        for stage, values in sorted(summary["stages"].items()):
+            lines.append(f'mainframe_stage_duration_seconds_max{{stage="{stage}"}} {values["max_seconds"]:.6f}')
+
+        with self._lock:
+            counters = sorted(self._counters.items())
+        declared = set()
+        for (name, labels), value in counters:
+            metric = f"mainframe_{name}_total"
+            if metric not in declared:
+                declared.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            label_text = ",".join(f'{key}="{label}"' for key, label in labels)
+            lines.append(f"{metric}{{{label_text}}} {value}" if label_text else f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+    def _record(self, stage, start, end, attrs):
+        """Store a finished span"""
+        duration = end - start
+        with self._lock:
+            values = self._stages.get(stage)
+            if values is None:
+                values = self._stages[stage] = {"count": 0, "seconds": 0.0, "max_seconds": 0.0}
+            values["count"] += 1
+            values["seconds"] += duration
+            values["max_seconds"] = max(values["max_seconds"], duration)
+
+            if len(self._events) < self.max_events:
+                self._events.append({
+                    "name": stage,
+                    "ph": "X",
+                    "ts": round((start - self._origin) * 1e6, 1),
+                    "dur": round(duration * 1e6, 1),
+                    "pid": os.getpid(),
+                    "tid": threading.get_ident(),
+                    "args": attrs
+                })
+            else:
+                self._dropped += 1
+
+def _counter_label(name, labels):
+    """Readable counter key: name or name{key=value,...}"""
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{key}={value}" for key, value in labels) + "}"
+
+# Process-wide instance used by the agents, LLM service, retriever and discovery
+metrics = Metrics()
@@ -0,0 +1,77 @@
+import os
+import re
+from utils.tokens import CHARS_PER_TOKEN
+
+# Section delimiter used in packed prompts and expected back in responses.
+# Models often decorate headings, so leading markdown is tolerated.
+MARKER_PATTERN = re.compile(r"^[#*>\s]*=====\s*MEMBER\s+(\d+)\b[^\n]*$", re.MULTILINE)
+
+PACK_INSTRUCTIONS = (
+    "The following contains {count} separate source members. Treat each member "
+    "independently and answer for every one of them, in order. Begin each "
+    "member's answer with its marker line exactly as shown (for example "
+    "\"===== MEMBER 1 =====\") and do not use marker lines anywhere else."
+)
+
+def member_marker(index, name=None):
+    """Delimiter line for the index-th (1-based) member of a pack"""
+    return f"===== MEMBER {index}: {name} =====" if name else f"===== MEMBER {index} ====="
+
+def pack_files(file_paths, max_pack_tokens, max_file_tokens, max_files):
+    """
+    Group consecutive small files into packs
+
+    Yields lists of file paths. Files estimated (from their size) at no more
+    than max_file_tokens are collected until the pack would exceed
+    max_pack_tokens or max_files; any other file is yielded on its own and
+    closes the current pack, so the overall file order is preserved.
+    """
+    pack = []
+    pack_tokens = 0
+    for file_path in file_paths:
+        try:
+            tokens = (os.path.getsize(file_path) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+        except OSError:
+            tokens = max_file_tokens + 1  # let the single-file path report the error
+
+        if tokens > max_file_tokens:
+            if pack:
+                yield pack
+                pack, pack_tokens = [], 0
+            yield [file_path]
+            continue
+
+        if pack and (pack_tokens + tokens > max_pack_tokens or len(pack) >= max_files):
+            yield pack
+            pack, pack_tokens = [], 0
+        pack.append(file_path)
+        pack_tokens += tokens
+    if pack:
+        yield pack
+
+def format_pack(entries):
+    """Combine [(file_path, code)] into one delimited block for a prompt's {code}"""
+    parts = [PACK_INSTRUCTIONS.format(count=len(entries))]
+    for index, (file_path, code) in enumerate(entries, 1):
+        parts.append(f"{member_marker(index, os.path.basename(file_path))}\n{code.rstrip()}")
+    return "\n\n".join(parts) + "\n"
+
+def split_pack(response, count):
+    """
+    Split a packed response into per-member texts
+
+    Returns a list of count strings, or None when the response does not
+    contain exactly one non-empty section for each member in order.
+    """
+    matches = list(MARKER_PATTERN.finditer(response))
+    if [int(match.group(1)) for match in matches] != list(range(1, count + 1)):
+        return None
+
+    sections = []
+    for position, match in enumerate(matches):
+        end = matches[position + 1].start() if position + 1 < len(matches) else len(response)
+        section = response[match.end():end].strip()
+        if not section:
+            return None
+        sections.append(section)
+    return sections
@@ -0,0 +1,251 @@
+import re
+
+# Characters that end a literal run in a regular expression
+_REGEX_META = set(".^$*+?{}[]()|")
+
+# Above this many distinct keywords the prefilter scans the file once
+SCAN_THRESHOLD = 64
+
+def required_literal(pattern):
+    """
+    Return a literal prefix every match of pattern must contain, or None
+
+    Only the leading literal run is considered, which covers keyword-led rules
+    such as "MOVE\\s+(\\S+)..." or "PROGRAM-ID\\s+...". Patterns with
+    alternation or a leading group/anchor/flag get no literal and are always run.
+    """
+    if "|" in pattern:
+        return None
+
+    literal = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\":
+            # Escaped punctuation is a literal; \s, \w, \1 ... are not
+            if i + 1 >= len(pattern) or pattern[i + 1].isalnum():
+                break
+            char = pattern[i + 1]
+            step = 2
+        elif char in _REGEX_META:
+            break
+        else:
+            step = 1
+
+        following = pattern[i + step] if i + step < len(pattern) else ""
+        if following in ("*", "?", "{"):
+            # The character may be absent or its count is unknown
+            break
+        literal.append(char)
+        if following == "+":
+            # The character repeats, so nothing after it is contiguous
+            break
+        i += step
+
+    return "".join(literal) or None
+
+def _trie_pattern(literals):
+    """
+    Build a regex matching any of the literals, factored as a prefix trie
+
+    Alternations over thousands of keywords are slow in the re module because
+    each alternative is tried in turn; sharing prefixes keeps the work per
+    position proportional to the keyword length instead. Longer continuations
+    are tried first, so each match is the longest keyword at its position.
+    """
+    trie = {}
+    for literal in literals:
+        node = trie
+        for char in literal:
+            node = node.setdefault(char, {})
+        node[""] = None
+
+    def render(node):
+        branches = []
+        for char in sorted(key for key in node if key):
+            branches.append(re.escape(char) + render(node[char]))
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if "" in node:
+            # This position already ends a keyword; extending it is optional
+            return "(?:" + body + ")?"
+        return body
+
+    return render(trie)
+
+class CompiledRule:
+    """A simple_rules entry with its regex compiled and its prefilter literal"""
+
+    def __init__(self, pattern, replacement):
+        self.pattern = pattern
+        self.replacement = replacement
+        self.regex = re.compile(pattern)
+        self.literal = required_literal(pattern)
+
+def _substitute(rule, code, separators):
+    """
+    rule.regex.subn on code, also moving the line separator offsets
+
+    Returns (code, separators, count). Separators inside a match become None.
+    """
+    pieces = []
+    moved = []
+    position = shift = count = 0
+    remaining = iter(separators)
+    separator = next(remaining, -1)
+    for match in rule.regex.finditer(code):
+        start, end = match.span()
+        while separator != -1 and (separator is None or separator < start):
+            moved.append(None if separator is None else separator + shift)
+            separator = next(remaining, -1)
+        while separator != -1 and (separator is None or separator < end):
+            moved.append(None)
+            separator = next(remaining, -1)
+        replacement = match.expand(rule.replacement)
+        pieces.append(code[position:start])
+        pieces.append(replacement)
+        position = end
+        shift += len(replacement) - (end - start)
+        count += 1
+    if not count:
+        return code, separators, 0
+    while separator != -1:
+        moved.append(None if separator is None else separator + shift)
+        separator = next(remaining, -1)
+    pieces.append(code[position:])
+    return "".join(pieces), moved, count
+
+class RuleEngine:
+    """
+    Applies an ordered list of regex rewrite rules with a literal prefilter
+
+    Rules are compiled once. Before a rule's regex runs, its leading keyword
+    is checked against the file (with a single trie-shaped scan for large
+    rule sets), and rules whose keyword is absent are skipped. Rules still run in their configured order on the output of
+    the previous rule, so the result is identical to calling re.sub for each
+    rule in turn.
+    """
+
+    def __init__(self, rules):
+        self.rules = [CompiledRule(rule["pattern"], rule["replacement"]) for rule in rules or []]
+        self.literals = sorted(
+            {rule.literal for rule in self.rules if rule.literal},
+            key=len,
+            reverse=True
+        )
+        # Small rule sets are cheapest to prefilter with one substring check
+        # per keyword; large ones share a single trie-shaped regex scan
+        self._scanner = None
+        self._straddling = []
+        if len(self.literals) > SCAN_THRESHOLD:
+            self._scanner = re.compile(_trie_pattern(self.literals))
+            # A non-overlapping scan can hide a keyword that starts inside another
+            # match and runs past its end; those few are checked directly instead
+            self._straddling = self._find_straddling(self.literals)
+        self._contained = {}
+
+    def apply(self, code):
+        """Apply every rule in order and return the rewritten code"""
+        present = self._present_literals(code)
+        changed = False
+
+        for rule in self.rules:
+            literal = rule.literal
+            if literal is not None:
+                # Once a rule has rewritten the code, new keywords may have
+                # appeared, so fall back to checking the current text directly
+                if changed or present is None:
+                    if literal not in code:
+                        continue
+                elif literal not in present:
+                    continue
+
+            code, count = rule.regex.subn(rule.replacement, code)
+            if count:
+                changed = True
+
+        return code
+
+    def apply_lines(self, lines):
+        """
+        Apply every rule to lines joined by newlines, keeping one entry per line
+
+        None entries are left out of the text and stay None. A match that
+        runs over several lines goes into the entry of the line it starts
+        on, and the lines it swallowed become None, so joining the non-None
+        entries gives exactly apply() of the joined text.
+        """
+        kept = [index for index, line in enumerate(lines) if line is not None]
+        if not kept:
+            return list(lines)
+        code = "\n".join(lines[index] for index in kept)
+        # Offset of the newline before each kept line after the first, or
+        # None once a match has swallowed it
+        separators = []
+        offset = -1
+        for index in kept:
+            if offset >= 0:
+                separators.append(offset)
+            offset += len(lines[index]) + 1
+        present = self._present_literals(code)
+        changed = False
+
+        for rule in self.rules:
+            literal = rule.literal
+            if literal is not None:
+                if changed or present is None:
+                    if literal not in code:
+                        continue
+                elif literal not in present:
+                    continue
+
+            code, separators, count = _substitute(rule, code, separators)
+            if count:
+                changed = True
+
+        result = list(lines)
+        start, owner = 0, kept[0]
+        for index, separator in zip(kept[1:], separators):
+            if separator is None:
+                result[index] = None
+                continue
+            result[owner] = code[start:separator]
+            start, owner = separator + 1, index
+        result[owner] = code[start:]
+        return result
+
+    def _present_literals(self, code):
+        """Find all rule literals occurring in code with one scan, or None if not scanning"""
+        if self._scanner is None:
+            return None
+
+        present = {literal for literal in self._straddling if literal in code}
+        for match in self._scanner.finditer(code):
+            literal = match.group(0)
+            if literal in present:
+                continue
+            # The scanner reports the longest keyword at each position, so
+            # add the shorter keywords it contains (IF inside END-IF)
+            contained = self._contained.get(literal)
+            if contained is None:
+                contained = [other for other in self.literals if other in literal]
+                self._contained[literal] = contained
+            present.update(contained)
+            if len(present) == len(self.literals):
+                break
+        return present
+
+    @staticmethod
+    def _find_straddling(literals):
+        """Literals whose prefix equals a proper suffix of another literal"""
+        by_prefix = {}
+        for literal in literals:
+            for end in range(1, len(literal) + 1):
+                by_prefix.setdefault(literal[:end], []).append(literal)
+
+        straddling = set()
+        for literal in literals:
+            for start in range(1, len(literal)):
+                straddling.update(by_prefix.get(literal[start:], ()))
+        return sorted(straddling)
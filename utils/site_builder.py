@@ -0,0 +1,275 @@
+import html
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from utils.manifest import hash_text
+from utils.metrics import metrics
+from utils.streaming import write_stream
+
+SITE_STATE_NAME = ".site_manifest.json"
+STYLE_NAME = "style.css"
+INDEX_NAME = "index.html"
+SEARCH_NAME = "search.json"
+
+# Fewer changed pages than this are rendered in this process, avoiding pool start-up
+MIN_POOL_PAGES = 32
+
+# LLM responses use fenced code blocks and tables
+MARKDOWN_EXTENSIONS = ["fenced_code", "tables"]
+
+HEADING_PATTERN = re.compile(r"^(#{1,3})\s+(.+?)\s*#*\s*$", re.MULTILINE)
+SUMMARY_LENGTH = 200
+
+SITE_CSS = """body { font-family: Arial, sans-serif; margin: 40px; line-height: 1.6; }
+pre { background-color: #f4f4f4; padding: 10px; border-radius: 5px; overflow-x: auto; }
+h1 { color: #333; }
+nav { margin-bottom: 20px; font-size: 0.9em; }
+table { border-collapse: collapse; }
+td, th { border: 1px solid #ddd; padding: 4px 8px; }
+#search { width: 100%; max-width: 480px; padding: 6px; margin-bottom: 20px; }
+.group { margin-top: 24px; }
+"""
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<link rel="stylesheet" href="{root}{style}">
+</head>
+<body>
+<nav><a href="{root}{index}">{site_title}</a></nav>
+{body}
+</body>
+</html>
+"""
+
+INDEX_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{site_title}</title>
+<link rel="stylesheet" href="{style}">
+</head>
+<body>
+<h1>{site_title}</h1>
+<p>{count} documented programs. Full-text search manifest: <a href="{search}">{search}</a></p>
+<input id="search" type="search" placeholder="Filter by name, title or heading">
+{groups}
+<script>
+document.getElementById("search").addEventListener("input", function (event) {{
+  var terms = event.target.value.toLowerCase().split(/\\s+/).filter(Boolean);
+  document.querySelectorAll("li[data-search]").forEach(function (item) {{
+    var text = item.getAttribute("data-search");
+    item.style.display = terms.every(function (term) {{ return text.indexOf(term) >= 0; }}) ? "" : "none";
+  }});
+}});
+</script>
+</body>
+</html>
+"""
+
+def build_site(docs_dir, site_dir=None, workers=0, title="Mainframe documentation", pages=None):
+    """
+    Render every markdown page under docs_dir into a static HTML site
+
+    With pages (markdown paths under docs_dir), only those pages and the
+    ones an earlier build published are part of the site, so other
+    markdown in docs_dir (a README, say) is left alone.
+
+    Pages go to site_dir (docs_dir by default) under the same relative
+    path, with .html in place of .md, next to one shared style.css, an
+    index.html listing every page and a search.json manifest (title, URL,
+    headings and summary per page). A page is only rendered again when its markdown hash or the
+    page template changed; files whose size and mtime are unchanged are not
+    even read. Changed pages are rendered across a process pool. Returns
+    counts of rendered, unchanged and removed pages.
+    """
+    site_dir = site_dir or docs_dir
+    os.makedirs(site_dir, exist_ok=True)
+    state_path = os.path.join(site_dir, SITE_STATE_NAME)
+    template_hash = hash_text(PAGE_TEMPLATE + SITE_CSS + title)
+    state = _load_state(state_path, template_hash)
+    if pages is None:
+        md_paths = _markdown_files(docs_dir)
+    else:
+        md_paths = sorted({os.path.abspath(md_path) for md_path in pages}
+                          | {os.path.abspath(os.path.join(docs_dir, rel_path)) for rel_path in state["pages"]})
+    pages = state["pages"]
+
+    # Find the pages that changed since the last build
+    jobs = []
+    found = set()
+    unchanged = 0
+    with metrics.span("site_scan", directory=docs_dir):
+        for md_path in md_paths:
+            if not os.path.isfile(md_path):
+                continue
+            rel_path = os.path.relpath(md_path, docs_dir).replace(os.sep, "/")
+            found.add(rel_path)
+            stat = os.stat(md_path)
+            html_path = os.path.join(site_dir, _page_url(rel_path))
+            entry = pages.get(rel_path)
+            if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns \
+                    and os.path.exists(html_path):
+                unchanged += 1
+                continue
+            with open(md_path, 'r', errors='replace') as f:
+                text = f.read()
+            digest = hash_text(text)
+            if entry and entry["hash"] == digest and os.path.exists(html_path):
+                entry["size"], entry["mtime_ns"] = stat.st_size, stat.st_mtime_ns
+                state["dirty"] = True
+                unchanged += 1
+                continue
+            jobs.append((rel_path, text, digest, stat.st_size, stat.st_mtime_ns, html_path, title))
+
+    removed = [rel_path for rel_path in pages if rel_path not in found]
+    for rel_path in removed:
+        del pages[rel_path]
+        html_path = os.path.join(site_dir, _page_url(rel_path))
+        if os.path.exists(html_path):
+            os.unlink(html_path)
+
+    with metrics.span("site_render", pages=len(jobs)):
+        for rel_path, entry in _render_all(jobs, workers):
+            pages[rel_path] = entry
+    if metrics.enabled:
+        metrics.count("site_pages", len(jobs), result="rendered")
+        metrics.count("site_pages", unchanged, result="unchanged")
+
+    # The shared files only change when pages do
+    style_path = os.path.join(site_dir, STYLE_NAME)
+    if not _has_content(style_path, SITE_CSS):
+        write_stream(style_path, SITE_CSS)
+    index_path = os.path.join(site_dir, INDEX_NAME)
+    search_path = os.path.join(site_dir, SEARCH_NAME)
+    if jobs or removed or not os.path.exists(index_path) or not os.path.exists(search_path):
+        with metrics.span("site_index", pages=len(pages)):
+            ordered = sorted(pages.items())
+            write_stream(search_path, json.dumps(
+                [{"url": _page_url(rel_path), "title": entry["title"], "headings": entry["headings"],
+                  "summary": entry["summary"]} for rel_path, entry in ordered],
+                indent=1
+            ))
+            write_stream(index_path, _render_index(ordered, title))
+    if jobs or removed or state.get("dirty"):
+        state.pop("dirty", None)
+        write_stream(state_path, json.dumps(state))
+
+    return {"pages": len(pages), "rendered": len(jobs), "unchanged": unchanged, "removed": len(removed),
+            "index": index_path}
+
+_converter = None
+
+def _markdown_to_html(text):
+    """Render markdown with one converter per process; building a converter costs more than most pages"""
+    global _converter
+    if _converter is None:
+        import markdown
+        _converter = markdown.Markdown(extensions=MARKDOWN_EXTENSIONS)
+    return _converter.reset().convert(text)
+
+def render_page(job):
+    """Render one markdown page to its HTML file; returns (rel_path, state entry)"""
+    rel_path, text, digest, size, mtime_ns, html_path, site_title = job
+    headings = [match.group(2) for match in HEADING_PATTERN.finditer(text)]
+    page_title = headings[0] if headings else os.path.basename(rel_path)[:-3]
+    root = "../" * rel_path.count("/")
+    write_stream(html_path, PAGE_TEMPLATE.format(
+        title=html.escape(page_title),
+        root=root,
+        style=STYLE_NAME,
+        index=INDEX_NAME,
+        site_title=html.escape(site_title),
+        body=_markdown_to_html(text)
+    ))
+    return rel_path, {
+        "hash": digest,
+        "size": size,
+        "mtime_ns": mtime_ns,
+        "title": page_title,
+        "headings": headings[1:],
+        "summary": _summary(text)
+    }
+
+def _render_all(jobs, workers=0):
+    """Render pages across a process pool; small batches stay in this process"""
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(jobs) < MIN_POOL_PAGES:
+        return [render_page(job) for job in jobs]
+
+    chunksize = max(1, len(jobs) // (workers * 8))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(render_page, jobs, chunksize=chunksize))
+
+def _render_index(ordered, site_title):
+    """Index page listing every page, grouped by directory"""
+    groups = {}
+    for rel_path, entry in ordered:
+        groups.setdefault(os.path.dirname(rel_path), []).append((rel_path, entry))
+
+    sections = []
+    for directory, entries in sorted(groups.items()):
+        items = []
+        for rel_path, entry in entries:
+            name = os.path.basename(rel_path)[:-3]
+            keywords = " ".join([name, entry["title"]] + entry["headings"]).lower()
+            items.append(
+                f'<li data-search="{html.escape(keywords)}"><a href="{html.escape(_page_url(rel_path))}">{html.escape(name)}</a>'
+                f' - {html.escape(entry["title"])}</li>'
+            )
+        heading = f"<h2>{html.escape(directory)}</h2>\n" if directory else ""
+        sections.append(f'<div class="group">\n{heading}<ul>\n' + "\n".join(items) + "\n</ul>\n</div>")
+
+    return INDEX_TEMPLATE.format(
+        site_title=html.escape(site_title),
+        style=STYLE_NAME,
+        search=SEARCH_NAME,
+        count=len(ordered),
+        groups="\n".join(sections)
+    )
+
+def _page_url(rel_path):
+    """Site-relative URL of the page for a markdown file (docs/X.cbl.md -> docs/X.cbl.html)"""
+    return rel_path[:-3] + ".html"
+
+def _summary(text):
+    """First paragraph of plain text, shortened for the search manifest"""
+    for block in text.split("\n\n"):
+        block = block.strip()
+        if block and not block.startswith(("#", "```", "|", "-", "*")):
+            summary = " ".join(block.split())
+            return summary[:SUMMARY_LENGTH] + ("..." if len(summary) > SUMMARY_LENGTH else "")
+    return ""
+
+def _markdown_files(directory):
+    """Yield the .md files under directory"""
+    stack = [directory]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.endswith(".md"):
+                    yield entry.path
+
+def _has_content(path, text):
+    """Check whether path exists and holds exactly text"""
+    try:
+        with open(path, 'r') as f:
+            return f.read() == text
+    except OSError:
+        return False
+
+def _load_state(path, template_hash):
+    """Load the page state of the last build, starting fresh if the template changed"""
+    try:
+        with open(path, 'r') as f:
+            state = json.load(f)
+        if state.get("version") == 1 and state.get("template") == template_hash:
+            return state
+    except (OSError, ValueError):
+        pass
+    return {"version": 1, "template": template_hash, "pages": {}}
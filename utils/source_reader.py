@@ -0,0 +1,187 @@
+import codecs
+import mmap
+import os
+
+# Bytes inspected to tell EBCDIC from ASCII-family text
+DETECT_BYTES = 4096
+
+# Printable ASCII plus tab, newline and carriage return
+ASCII_TEXT_BYTES = bytes([9, 10, 13]) + bytes(range(0x20, 0x7F))
+# EBCDIC space, punctuation, letters, digits and the NL/LF record separators
+EBCDIC_TEXT_BYTES = bytes(
+    [0x15, 0x25, 0x40] + list(range(0x4B, 0x51)) + list(range(0x5A, 0x62)) + list(range(0x6B, 0x70))
+    + list(range(0x7A, 0x80)) + list(range(0x81, 0x8A)) + list(range(0x91, 0x9A)) + list(range(0xA2, 0xAA))
+    + list(range(0xC1, 0xCA)) + list(range(0xD1, 0xDA)) + list(range(0xE2, 0xEA)) + list(range(0xF0, 0xFA))
+)
+# Record separators of EBCDIC text transfers (NL, LF)
+EBCDIC_SEPARATORS = (b"\x15", b"\x25")
+
+class SourceReader:
+    """
+    Reads sources as text, whatever form they were downloaded in
+
+    Files are memory-mapped rather than read. The encoding is detected from
+    the first bytes unless configured: ASCII-family text is decoded as
+    UTF-8 (Latin-1 when it is not valid UTF-8), EBCDIC with the configured
+    code page. Files without record separators whose size is a multiple of
+    the record length are split into fixed-length records (RECFM=FB), so raw
+    PDS unloads can be read without a conversion pass.
+    """
+
+    def __init__(self, encoding="auto", ebcdic_codepage="cp037", recfm="auto", lrecl=80):
+        self.encoding = encoding
+        self.ebcdic_codepage = ebcdic_codepage
+        self.recfm = recfm.upper()
+        self.lrecl = lrecl
+
+    @property
+    def settings(self):
+        """The options that determine how files are decoded"""
+        return (self.encoding, self.ebcdic_codepage, self.recfm, self.lrecl)
+
+    @classmethod
+    def from_config(cls, config):
+        """Build a reader from the sources section of the configuration"""
+        return cls(
+            encoding=config.get("encoding", "auto"),
+            ebcdic_codepage=config.get("ebcdic_codepage", "cp037"),
+            recfm=config.get("recfm", "auto"),
+            lrecl=config.get("lrecl", 80)
+        )
+
+    def open(self, path):
+        """Map a source file; use as a context manager or close() it"""
+        return SourceFile(path, self)
+
+    def read(self, path):
+        """Whole text of a source file, one line per record"""
+        with self.open(path) as source:
+            return source.text()
+
+class SourceFile:
+    """A memory-mapped source whose records are decoded on demand"""
+
+    def __init__(self, path, reader):
+        self.path = path
+        self._file = open(path, 'rb')
+        self.size = os.fstat(self._file.fileno()).st_size
+        # Empty files cannot be mapped
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+        self.encoding = self._detect_encoding(reader)
+        # Any code page with the EBCDIC space (cp037, cp1140, cp500, cp1047...)
+        self.ebcdic = " ".encode(self.encoding, errors="replace") == b"\x40"
+        self.lrecl = reader.lrecl
+        self.separator = self._find_separator()
+        self.fixed = self._is_fixed(reader)
+        self._offsets = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Unmap and close the file"""
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
+
+    @property
+    def record_count(self):
+        """Number of records (lines); free for fixed-length files"""
+        if self.fixed:
+            return self.size // self.lrecl
+        return len(self._line_offsets()) - 1
+
+    def text(self, start=0, stop=None):
+        """Text of records [start, stop), each ending in a newline"""
+        if not self.fixed and start == 0 and stop is None:
+            return self._decode_text(self._data[:])
+        return "".join(record + "\n" for record in self.records(start, stop))
+
+    def records(self, start=0, stop=None):
+        """Yield the decoded records [start, stop), without line ends"""
+        stop = self.record_count if stop is None else min(stop, self.record_count)
+        if start >= stop:
+            return
+        if self.fixed:
+            # Single-byte code pages keep record boundaries after decoding, so
+            # the whole range is decoded at once
+            data = self._data[start * self.lrecl:stop * self.lrecl]
+            if self.encoding != "utf-8":
+                text = self._decode(data)
+                for position in range(0, len(text), self.lrecl):
+                    yield text[position:position + self.lrecl]
+            else:
+                for position in range(0, len(data), self.lrecl):
+                    yield self._decode(data[position:position + self.lrecl])
+            return
+
+        offsets = self._line_offsets()
+        lines = self._decode_text(self._data[offsets[start]:offsets[stop]]).split("\n")
+        if lines[-1] == "":
+            lines.pop()
+        yield from lines
+
+    def _decode(self, data):
+        """Decode bytes in the file's encoding"""
+        return data.decode(self.encoding, errors="replace")
+
+    def _decode_text(self, data):
+        """Decode a run of whole lines, with line ends normalized to \\n"""
+        text = self._decode(data)
+        if self.ebcdic:
+            # cp037 decodes NL (0x15) to U+0085
+            text = text.replace("\x85", "\n")
+        if "\r" in text:
+            text = text.replace("\r\n", "\n").replace("\r", "\n")
+        return text
+
+    def _line_offsets(self):
+        """Start offset of every line, plus the end of the file"""
+        if self._offsets is None:
+            offsets = [0]
+            position = self._data.find(self.separator)
+            while position >= 0:
+                offsets.append(position + 1)
+                position = self._data.find(self.separator, position + 1)
+            if offsets[-1] != self.size:
+                offsets.append(self.size)
+            self._offsets = offsets
+        return self._offsets
+
+    def _detect_encoding(self, reader):
+        """Configured encoding, or EBCDIC vs UTF-8/Latin-1 judged from the first bytes"""
+        if reader.encoding.lower() not in ("", "auto"):
+            return reader.encoding.lower()
+        sample = self._data[:DETECT_BYTES]
+        if not sample:
+            return "utf-8"
+        ascii_bytes = len(sample) - len(sample.translate(None, ASCII_TEXT_BYTES))
+        ebcdic_bytes = len(sample) - len(sample.translate(None, EBCDIC_TEXT_BYTES))
+        if ebcdic_bytes > ascii_bytes:
+            return reader.ebcdic_codepage.lower()
+        try:
+            # Not final: a multi-byte character may straddle the end of the sample
+            codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+            return "utf-8"
+        except UnicodeDecodeError:
+            return "latin-1"
+
+    def _find_separator(self):
+        """Record separator: newline, or whichever of NL and LF an EBCDIC file uses"""
+        if not self.ebcdic:
+            return b"\n"
+        for separator in EBCDIC_SEPARATORS:
+            if self._data.find(separator) >= 0:
+                return separator
+        return EBCDIC_SEPARATORS[0]
+
+    def _is_fixed(self, reader):
+        """Whether the file is fixed-length records without separators"""
+        if reader.recfm == "FB":
+            return True
+        if reader.recfm != "AUTO" or not self.size or not self.lrecl or self.size % self.lrecl:
+            return False
+        return self._data.find(self.separator) < 0
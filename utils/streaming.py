@@ -0,0 +1,47 @@
+import os
+import threading
+import time
+from utils.metrics import metrics
+
+def write_stream(path, chunks):
+    """
+    Write text to path atomically
+
+    chunks is a string or an iterable of strings (such as a streaming LLM
+    response). Each piece is written to a temporary file in the target
+    directory as it arrives, and the file is renamed into place only once
+    the whole text has been written, so readers never see partial output.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    if isinstance(chunks, str):
+        chunks = [chunks]
+
+    # Unique per writer so concurrent workers never share a temp file
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with metrics.span("write", file=path):
+            with open(tmp_path, 'w') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    f.flush()
+            os.replace(tmp_path, path)
+        if metrics.enabled:
+            metrics.count("bytes_written", os.path.getsize(path))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+def report_progress(chunks, label):
+    """Pass chunks through, printing the time to the first one and a summary at the end"""
+    start = time.monotonic()
+    size = 0
+    first = True
+    for chunk in chunks:
+        if first:
+            first = False
+            print(f"{label}: first output after {time.monotonic() - start:.2f}s")
+        size += len(chunk)
+        yield chunk
+    print(f"{label}: {size} characters in {time.monotonic() - start:.2f}s")
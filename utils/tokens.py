@@ -0,0 +1,6 @@
+# Rough characters-per-token ratio for English text and source code
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text):
+    """Estimate the number of LLM tokens in text without loading a tokenizer"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN